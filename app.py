@@ -3,10 +3,31 @@ Interactive Study Tool - Inspired by NotebookLM
 Smart AI-like system with comprehensive knowledge base
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Blueprint, Flask, g, render_template, request, jsonify
+import asyncio
+import contextvars
+import json
+import os
+import time
 import re
 import random
-from difflib import SequenceMatcher
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from caching import QuestionEmbedder, ResponseCache, SemanticCache, normalize_query
+from coalescing import FileFlight, SingleFlight, StreamFlight
+from content_db import ContentDB, ContentDBError
+from hybrid import HybridRanker
+from intents import IntentClassifier
+from llm import CircuitOpenError, DeadlineExceeded, LLMError, TransientLLMError, client_from_environ
+from index_snapshot import DEFAULT_SNAPSHOT, SearchIndexes, SnapshotError, content_fingerprint
+from ingest import DEFAULT_STORE, load_transcript_store
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, SIZE_BUCKETS, MetricsRegistry
+from notebooks import (DEFAULT_NOTEBOOK_DIR, Notebook, NotebookInvalid, NotebookNotFound, NotebookStore, active_notebook,
+                       activate as activate_notebook, deactivate as deactivate_notebook, study_items, video_listing)
+from rag import SYSTEM_PROMPT, Source, build_prompt, citations, format_timestamp, interleave, pack_context
+from retrieval import flatten_text, index_terms
+from timing import RequestTimer, StageMetrics, activate, deactivate, stage
+from vector_index import DEFAULT_VECTOR_SNAPSHOT, KINDS as VECTOR_KINDS, VectorStore, vector_fingerprint
 
 app = Flask(__name__)
 
@@ -429,89 +450,444 @@ YOUTUBE_VIDEOS = [
     }
 ]
 
+# Transcripts written by ingest.py add to or replace the embedded ones
+TRANSCRIPT_STORE = os.environ.get("TRANSCRIPT_STORE", DEFAULT_STORE)
+
+# Optional SQLite content store written by content_db.py: when set, it replaces the
+# content above and the transcript store, and lexical retrieval runs as FTS5 queries
+CONTENT_DB = None
+if os.environ.get("CONTENT_DB"):
+    try:
+        CONTENT_DB = ContentDB(os.environ["CONTENT_DB"], pool_size=int(os.environ.get("CONTENT_DB_POOL_SIZE", 4)))
+    except ContentDBError as e:
+        print(f"⚠️ Ignoring content database: {e}")
+
+def load_content_db():
+    """Replace the module-level content with CONTENT_DB's"""
+    content = CONTENT_DB.content()
+    for target, loaded in zip((KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS), content[:2]):
+        target.clear()
+        target.update(loaded)
+    YOUTUBE_VIDEOS[:], QUIZ_QUESTIONS[:], FLASHCARDS[:] = content[2:]
+
+def content_db_search():
+    """Indexes of a CONTENT_DB app: ranking runs as FTS5 queries and passages are read
+    from the database, so no in-process index is built and no transcript text is held"""
+    return SearchIndexes(None, None, None, None, CONTENT_DB.passages(), {})
+
+if CONTENT_DB is not None:
+    load_content_db()
+    TRANSCRIPT_STORE = ""
+    print(f"🗄️ Content loaded from {CONTENT_DB.path}")
+
+# Prepared search indexes: memory-mapped from the snapshot written by
+# index_snapshot.py when it matches the current content, otherwise built here
+INDEX_SNAPSHOT = os.environ.get("INDEX_SNAPSHOT", DEFAULT_SNAPSHOT)
+SEARCH = None
+if CONTENT_DB is not None:
+    SOURCE_FINGERPRINT = CONTENT_DB.meta()["fingerprint"]
+    SEARCH = content_db_search()
+else:
+    SOURCE_FINGERPRINT = content_fingerprint(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS, TRANSCRIPT_STORE)
+if SEARCH is None and INDEX_SNAPSHOT and os.path.exists(INDEX_SNAPSHOT):
+    try:
+        SEARCH = SearchIndexes.load(INDEX_SNAPSHOT, SOURCE_FINGERPRINT)
+        if SEARCH is None:
+            print(f"⚠️ {INDEX_SNAPSHOT} is stale, building indexes in-process (run python index_snapshot.py)")
+    except SnapshotError as e:
+        print(f"⚠️ Ignoring index snapshot: {e}")
+
+if SEARCH is None:
+    VIDEO_TRANSCRIPTS.update(load_transcript_store(TRANSCRIPT_STORE))
+    # Moved off the Python heap so workers forked from a preloading master share the pages
+    SEARCH = SearchIndexes.build(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS).share()
+else:
+    # Stored transcripts are served from the snapshot; only their metadata is needed here
+    for _video_id, _video_meta in SEARCH.videos.items():
+        VIDEO_TRANSCRIPTS[_video_id] = {**VIDEO_TRANSCRIPTS.get(_video_id, {"content": ""}), **_video_meta}
+
+# Every video with a transcript is listed, embedded or ingested
+YOUTUBE_VIDEOS[:] = video_listing(YOUTUBE_VIDEOS, VIDEO_TRANSCRIPTS)
+
+def use_search_indexes(search):
+    """Point the request path at a set of prepared indexes"""
+    global SEARCH, PASSAGES
+    SEARCH = search
+    
+    # Timestamped transcript passages of every video
+    PASSAGES = search.passages
+
+def reload_content():
+    """Rebuild the indexes after KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS or the transcript store change
+
+    With CONTENT_DB set the database is the content, so it is read again instead.
+    """
+    global SOURCE_FINGERPRINT, INTENT_CLASSIFIER, QUESTION_EMBEDDER, VECTOR_FINGERPRINT, DEFAULT_NOTEBOOK
+    # A new fingerprint also invalidates every cached response
+    if CONTENT_DB is not None:
+        load_content_db()
+        SOURCE_FINGERPRINT = CONTENT_DB.meta()["fingerprint"]
+        use_search_indexes(content_db_search())
+    else:
+        VIDEO_TRANSCRIPTS.update(load_transcript_store(TRANSCRIPT_STORE))
+        SOURCE_FINGERPRINT = content_fingerprint(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS, TRANSCRIPT_STORE)
+        use_search_indexes(SearchIndexes.build(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS).share())
+    INTENT_CLASSIFIER = IntentClassifier(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS)
+    if SEMANTIC_CACHE is not None:
+        QUESTION_EMBEDDER = build_question_embedder()
+    VECTOR_FINGERPRINT = vector_fingerprint(SOURCE_FINGERPRINT, FLASHCARDS, QUIZ_QUESTIONS, VECTOR_EMBEDDER)
+    DEFAULT_NOTEBOOK = builtin_notebook()
+
+def build_question_embedder():
+    """Question embeddings for the semantic cache, with IDF taken from the knowledge base"""
+    return QuestionEmbedder(f"{topic_key.replace('_', ' ')} {flatten_text(topic)}" for topic_key, topic in KNOWLEDGE_BASE.items())
+
+use_search_indexes(SEARCH)
+
+# Intent phrases, answer cues and topic keywords compiled into one automaton
+INTENT_CLASSIFIER = IntentClassifier(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS)
+
+# Dense embeddings of topics, flashcards, quiz questions and passages, loaded on first use
+VECTOR_EMBEDDER = os.environ.get("VECTOR_EMBEDDER", "lsa")
+VECTOR_SNAPSHOT = os.environ.get("VECTOR_SNAPSHOT", DEFAULT_VECTOR_SNAPSHOT)
+VECTOR_FINGERPRINT = vector_fingerprint(SOURCE_FINGERPRINT, FLASHCARDS, QUIZ_QUESTIONS, VECTOR_EMBEDDER)
+
+def load_vectors():
+    """Memory-map the snapshot written by vector_index.py when it matches, otherwise embed here"""
+    if VECTOR_SNAPSHOT and os.path.exists(VECTOR_SNAPSHOT):
+        try:
+            vectors = VectorStore.load(VECTOR_SNAPSHOT, VECTOR_FINGERPRINT)
+            if vectors is not None:
+                return vectors
+            print(f"⚠️ {VECTOR_SNAPSHOT} is stale, embedding in-process (run python vector_index.py)")
+        except SnapshotError as e:
+            print(f"⚠️ Ignoring vector snapshot: {e}")
+    return VectorStore.build(study_items(KNOWLEDGE_BASE, FLASHCARDS, QUIZ_QUESTIONS, PASSAGES), VECTOR_EMBEDDER).share()
+
+def builtin_notebook():
+    """The embedded course as a notebook over the module-level content and indexes"""
+    return Notebook(BUILTIN_NOTEBOOK_ID, "Oligopoly & Game Theory", KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS, YOUTUBE_VIDEOS,
+                    QUIZ_QUESTIONS, FLASHCARDS, SEARCH, SOURCE_FINGERPRINT, INTENT_CLASSIFIER, load_vectors, VECTOR_EMBEDDER,
+                    SYSTEM_PROMPT, CONTENT_DB)
+
+# The embedded course: served by the unscoped /api/* routes and as notebook "oligopoly"
+BUILTIN_NOTEBOOK_ID = "oligopoly"
+DEFAULT_NOTEBOOK = builtin_notebook()
+
+# Other courses, one directory each under NOTEBOOK_DIR (see notebooks.py), at most NOTEBOOK_CACHE_SIZE resident per worker
+NOTEBOOKS = NotebookStore(
+    os.environ.get("NOTEBOOK_DIR", DEFAULT_NOTEBOOK_DIR),
+    capacity=int(os.environ.get("NOTEBOOK_CACHE_SIZE", 16)),
+    vector_embedder=VECTOR_EMBEDDER
+)
+
+def current_notebook():
+    """The notebook a /api/notebooks/<id> route activated, else the embedded course"""
+    return active_notebook() or DEFAULT_NOTEBOOK
+
+def get_notebook(notebook_id):
+    """A notebook by id; NotebookNotFound if there is none"""
+    return DEFAULT_NOTEBOOK if notebook_id == BUILTIN_NOTEBOOK_ID else NOTEBOOKS.get(notebook_id)
+
+# Answers to repeated questions, keyed on the normalized question and video
+RESPONSE_CACHE = ResponseCache(
+    max_size=int(os.environ.get("RESPONSE_CACHE_SIZE", 2048)),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 3600))
+)
+
+# Leading candidates rescored with exact SequenceMatcher similarity (0 disables)
+SIMILARITY_RERANK_DEPTH = 3
+
+# Bonus per multi-word keyword or topic-name phrase found verbatim in the question
+PHRASE_MATCH_BONUS = 3
+
+# Per-stage latency histograms of the chat endpoints, served by /api/metrics/stages
+STAGE_METRICS = StageMetrics()
+TIMED_ENDPOINTS = {"chat", "ask_video_question", "notebook.chat", "notebook.ask_video_question"}
+
+# Prometheus metrics served by /metrics; set METRICS_DIR to aggregate across gunicorn workers
+METRICS = MetricsRegistry(os.environ.get("METRICS_DIR") or None)
+HTTP_REQUESTS = METRICS.counter("study_http_requests_total", "HTTP requests by route, method and status")
+HTTP_ERRORS = METRICS.counter("study_http_request_errors_total", "HTTP requests that returned a 5xx status, by route")
+HTTP_DURATION = METRICS.histogram("study_http_request_duration_seconds", "HTTP request latency by route")
+HTTP_RESPONSE_SIZE = METRICS.histogram("study_http_response_size_bytes", "HTTP response body size by route", SIZE_BUCKETS)
+STAGE_DURATION = METRICS.histogram("study_stage_duration_seconds", "Chat pipeline stage latency by endpoint and stage")
+CACHE_LOOKUPS = METRICS.counter("study_response_cache_lookups_total", "Response cache lookups by result")
+STREAM_FIRST_CHUNK = METRICS.histogram("study_stream_first_chunk_seconds", "Time from request to the first streamed answer chunk")
+
+def cache_hit_ratio(samples):
+    """Hit ratio of the response cache across every worker"""
+    lookups = {dict(labels).get("result"): value for (name, _, labels), value in samples.items()
+               if name == "study_response_cache_lookups_total"}
+    total = sum(lookups.values())
+    return {(): lookups.get("hit", 0.0) / total if total else 0.0}
+
+METRICS.gauge_function("study_response_cache_hit_ratio", "Share of response cache lookups that hit", cache_hit_ratio)
+
+# Replayable requests are appended to this JSONL file for benchmarks/loadtest.py
+TRAFFIC_LOG = os.environ.get("TRAFFIC_LOG")
+RECORDED_ENDPOINTS = {"chat", "ask_video_question", "get_quiz", "get_flashcards",
+                      "notebook.chat", "notebook.ask_video_question", "notebook.get_quiz", "notebook.get_flashcards"}
+
+# Optional LLM answer backend (LLM_PROVIDER, see llm.py); the local engine answers when it is off or failing
+LLM_CALLS = METRICS.counter("study_llm_calls_total", "LLM backend attempts by provider and outcome")
+LLM_DURATION = METRICS.histogram("study_llm_call_duration_seconds", "LLM backend attempt latency by provider")
+LLM_FALLBACKS = METRICS.counter("study_llm_fallbacks_total", "Answers left to the local engine after an LLM failure, by reason")
+
+def record_llm_call(outcome, seconds):
+    LLM_CALLS.inc(provider=LLM.name, outcome=outcome)
+    LLM_DURATION.observe(seconds, provider=LLM.name)
+
+LLM = client_from_environ(on_call=record_llm_call)
+
+# LLM answers reused for near-duplicate questions ("define oligopoly" / "what's an oligopoly?");
+# off without an LLM, where answers are cheap, or with SEMANTIC_CACHE_THRESHOLD=0
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.9))
+QUESTION_EMBEDDER = None
+SEMANTIC_CACHE = None
+if LLM is not None and SEMANTIC_CACHE_THRESHOLD > 0:
+    QUESTION_EMBEDDER = build_question_embedder()
+    SEMANTIC_CACHE = SemanticCache(
+        dim=QUESTION_EMBEDDER.dim,
+        max_size=int(os.environ.get("SEMANTIC_CACHE_SIZE", 2048)),
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 3600))
+    )
+SEMANTIC_LOOKUPS = METRICS.counter("study_semantic_cache_lookups_total", "Semantic answer cache lookups by result")
+
+# Concurrent requests for the same question share one answer; COALESCE_DIR extends this across gunicorn workers
+COALESCE_DIR = os.environ.get("COALESCE_DIR")
+# Only cacheable answers are handed to other workers; a fallback stays with the worker that produced it
+SINGLE_FLIGHT = SingleFlight(FileFlight(COALESCE_DIR, publish=lambda result: result[1]) if COALESCE_DIR else None)
+# Concurrent streamed requests for the same question share one LLM stream
+STREAM_FLIGHT = StreamFlight()
+COALESCED_ANSWERS = METRICS.counter("study_coalesced_answers_total", "Uncached answers by single-flight role: leader, follower or shared")
+
+# Sources retrieved for each LLM answer, packed into a context of at most RAG_CONTEXT_TOKENS
+RAG_TOPICS = 3
+RAG_PASSAGES = 4
+RAG_CONTEXT_TOKENS = int(os.environ.get("RAG_CONTEXT_TOKENS", 1200))
+
+# Retrieval arms ranking topics and passages: "lexical" (BM25), "vector" (vector_index.py) or both,
+# run in parallel within their budgets and fused by reciprocal rank
+RETRIEVAL_ARMS = [arm for arm in os.environ.get("RETRIEVAL_ARMS", "lexical").split(",") if arm in ("lexical", "vector")] or ["lexical"]
+RETRIEVAL_BUDGETS = {
+    "lexical": float(os.environ.get("LEXICAL_BUDGET_MS", 200)) / 1000,
+    "vector": float(os.environ.get("VECTOR_BUDGET_MS", 100)) / 1000
+}
+
+# Candidates each arm contributes to the fusion
+HYBRID_DEPTH = 20
+
+# Vector matches less similar than this are left out, so off-topic questions add no noise
+VECTOR_MIN_SIMILARITY = float(os.environ.get("VECTOR_MIN_SIMILARITY", 0.6))
+
+RETRIEVAL_ARM_RESULTS = METRICS.counter("study_retrieval_arm_results_total", "Retrieval arm runs by arm and outcome: ok, timeout, error or skipped")
+RETRIEVAL_ARM_DURATION = METRICS.histogram("study_retrieval_arm_duration_seconds", "Retrieval arm latency by arm")
+
+def record_retrieval_arm(arm, outcome, seconds):
+    RETRIEVAL_ARM_RESULTS.inc(arm=arm, outcome=outcome)
+    if outcome == "ok":
+        RETRIEVAL_ARM_DURATION.observe(seconds, arm=arm)
+
+HYBRID = HybridRanker(RETRIEVAL_BUDGETS, on_arm=record_retrieval_arm)
+
+# The vector arm needs the embeddings on every request: load them now, so a
+# preloading gunicorn master shares them with its workers
+if "vector" in RETRIEVAL_ARMS:
+    DEFAULT_NOTEBOOK.vectors
+
+# Set SEMANTIC_SEARCH=0 to turn off /api/search
+SEMANTIC_SEARCH = os.environ.get("SEMANTIC_SEARCH", "1") != "0"
+
+def preload_vectors():
+    """Load the embedded course's vectors if any route can use them; a preloading
+    gunicorn master calls this so its workers share one copy instead of embedding their own"""
+    if SEMANTIC_SEARCH or "vector" in RETRIEVAL_ARMS:
+        DEFAULT_NOTEBOOK.vectors
+
+# Most passages a video question may ask for with top_k
+MAX_VIDEO_PASSAGES = 10
+
+# Bulk answers for /api/chat/batch: at most BATCH_MAX_QUESTIONS per call, generated on BATCH_WORKERS threads
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", 500))
+BATCH_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("BATCH_WORKERS", 8)), thread_name_prefix="batch")
+
+# Retrieval for the ASGI handlers runs on RETRIEVAL_WORKERS threads: the hybrid ranker
+# waits on its arms for up to their budgets, which must not block the event loop
+RETRIEVAL_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("RETRIEVAL_WORKERS", 8)), thread_name_prefix="retrieval")
+
 # =============================================================================
 # SMART AI RESPONSE SYSTEM
 # =============================================================================
 
-def calculate_similarity(str1, str2):
-    """Calculate similarity between two strings"""
-    return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
-
-def find_relevant_topics(query):
+def find_relevant_topics(query, analysis=None, top_k=3):
     """Find relevant topics from knowledge base based on query"""
-    query_lower = query.lower()
-    relevant = []
+    notebook = current_notebook()
+    if notebook.content_db is not None:
+        return [(topic_key, notebook.knowledge_base[topic_key], score)
+                for topic_key, score in notebook.content_db.search_topics(query, top_k)]
+    topic_index = notebook.topic_index
+    definition_index = notebook.definition_index
+    analysis = analysis or notebook.intent_classifier.analyze(query)
+    if analysis.topic_scores is not None:
+        # Scored together with the rest of its batch
+        scores = analysis.topic_scores.copy()
+        similarity = analysis.definition_similarity
+    else:
+        scores = topic_index.score(analysis.terms)
+        similarity = definition_index.similarity(query)
     
-    for topic_key, topic_data in KNOWLEDGE_BASE.items():
-        score = 0
-        
-        # Check keywords
-        for keyword in topic_data.get("keywords", []):
-            if keyword in query_lower:
-                score += 10
-        
-        # Check topic name
-        if topic_key.replace("_", " ") in query_lower:
-            score += 15
-        
-        # Calculate text similarity
-        if "definition" in topic_data:
-            similarity = calculate_similarity(query, topic_data["definition"][:200])
-            score += similarity * 5
-        
-        if score > 0:
-            relevant.append((topic_key, topic_data, score))
+    # Reward exact phrases ("game theory", "dominant strategy") that bag-of-words scoring misses
+    for topic_key, phrase_count in analysis.topic_phrases.items():
+        scores[topic_index.doc_positions[topic_key]] += PHRASE_MATCH_BONUS * phrase_count
     
-    # Sort by relevance score
-    relevant.sort(key=lambda x: x[2], reverse=True)
-    return relevant[:3]  # Return top 3 relevant topics
+    # Add approximate text similarity for topics that matched at least one term
+    matched = np.flatnonzero(scores > 0)
+    scores[matched] += similarity[matched] * 5
+    
+    # Rescore only the leading candidates exactly
+    if SIMILARITY_RERANK_DEPTH:
+        for topic_idx, _ in topic_index.top_k(scores, SIMILARITY_RERANK_DEPTH):
+            scores[topic_idx] += (definition_index.exact_similarity(query, topic_idx) - similarity[topic_idx]) * 5
+    
+    relevant = []
+    for topic_idx, score in topic_index.top_k(scores, top_k):
+        topic_key = topic_index.doc_keys[topic_idx]
+        relevant.append((topic_key, notebook.knowledge_base[topic_key], score))
+    return relevant
+
+def vector_matches(query, kind, keys=None):
+    """[(item id, similarity)] of a kind most similar to the query, best first, down to VECTOR_MIN_SIMILARITY"""
+    vectors = current_notebook().vectors
+    if keys is None:
+        matches = vectors.search(query, [kind], HYBRID_DEPTH)
+    else:
+        matches = vectors.search_among(query, keys, HYBRID_DEPTH)
+    return [(key.split(":", 1)[1], score) for key, score in matches if score >= VECTOR_MIN_SIMILARITY]
+
+def find_topics(query, analysis=None):
+    """The top 3 topics by the configured retrieval arms, with BM25 or fused scores"""
+    if RETRIEVAL_ARMS == ["lexical"]:
+        return find_relevant_topics(query, analysis)
+    notebook = current_notebook()
+    analysis = analysis or notebook.intent_classifier.analyze(query)
+    arms = {
+        "lexical": lambda: [(topic_key, score) for topic_key, _, score in find_relevant_topics(query, analysis, HYBRID_DEPTH)],
+        "vector": lambda: vector_matches(query, "topic")
+    }
+    fused = HYBRID.rank({arm: arms[arm] for arm in RETRIEVAL_ARMS})
+    return [(topic_key, notebook.knowledge_base[topic_key], score) for topic_key, score, _ in fused[:3]]
 
-def find_video_content(query, video_id=None):
+def find_video_content(query, video_id=None, analysis=None):
     """Find relevant content from video transcripts"""
-    query_lower = query.lower()
-    results = []
-    
-    videos_to_search = {video_id: VIDEO_TRANSCRIPTS[video_id]} if video_id and video_id in VIDEO_TRANSCRIPTS else VIDEO_TRANSCRIPTS
+    notebook = current_notebook()
+    if notebook.content_db is not None:
+        return [(vid_id, notebook.video_transcripts[vid_id], score)
+                for vid_id, score in notebook.content_db.search_transcripts(query, video_id, len(notebook.video_transcripts))]
+    transcript_index = notebook.transcript_index
+    terms = analysis.terms if analysis else index_terms(query)
+    scores = transcript_index.score(terms)
     
-    for vid_id, video_data in videos_to_search.items():
-        score = 0
-        
-        # Check topics
-        for topic in video_data.get("topics", []):
-            if topic in query_lower:
-                score += 10
-        
-        # Check content
-        content_lower = video_data["content"].lower()
-        query_words = query_lower.split()
-        for word in query_words:
-            if len(word) > 3 and word in content_lower:
-                score += 2
-        
-        if score > 0:
-            results.append((vid_id, video_data, score))
+    # Restrict ranking to a single video when one is requested
+    if video_id and video_id in notebook.video_transcripts:
+        mask = np.zeros_like(scores)
+        mask[transcript_index.doc_positions[video_id]] = 1
+        scores *= mask
     
-    results.sort(key=lambda x: x[2], reverse=True)
+    results = []
+    for vid_idx, score in transcript_index.top_k(scores, len(transcript_index)):
+        vid_id = transcript_index.doc_keys[vid_idx]
+        results.append((vid_id, notebook.video_transcripts[vid_id], score))
     return results
 
-def generate_ai_response(query, context="general", video_id=None):
+def lexical_passages(query, video_id=None, top_k=3):
+    """(passage index, BM25 score) of the best passages of one video, or of every video"""
+    notebook = current_notebook()
+    if notebook.content_db is not None:
+        return notebook.content_db.search_passages(query, video_id, top_k)
+    scores = notebook.passage_index.score(index_terms(query))
+    if not video_id:
+        return notebook.passage_index.top_k(scores, top_k)
+    start, end = notebook.passages.ranges[video_id]
+    return [(start + idx, score) for idx, score in notebook.passage_index.top_k(scores[start:end], top_k)]
+
+def find_passages(query, video_id=None, top_k=3):
+    """Find the best timestamped transcript passages of one video, or of every video, by the configured arms
+
+    Returns [(passage, {arm: the arm's own score}, fused score)]; the fused
+    score is None when keyword ranking is the only arm.
+    """
+    passages = current_notebook().passages
+    if video_id and video_id not in passages.ranges:
+        return []
+    if RETRIEVAL_ARMS == ["lexical"]:
+        return [(passages[idx], {"lexical": score}, None) for idx, score in lexical_passages(query, video_id, top_k)]
+    # Restricted to one video, the vector arm scans just that video's passages
+    keys = [f"passage:{idx}" for idx in range(*passages.ranges[video_id])] if video_id else None
+    arms = {
+        "lexical": lambda: lexical_passages(query, video_id, HYBRID_DEPTH),
+        "vector": lambda: [(int(idx), score) for idx, score in vector_matches(query, "passage", keys)]
+    }
+    fused = HYBRID.rank({arm: arms[arm] for arm in RETRIEVAL_ARMS})
+    return [(passages[idx], scores, score) for idx, score, scores in fused[:top_k]]
+
+def passage_result(passage, scores, fused):
+    """API form of a found passage: its BM25 `score`, vector `similarity` and fused `rrf_score` as the arms allow"""
+    result = passage.to_dict()
+    if "lexical" in RETRIEVAL_ARMS:
+        result["score"] = scores.get("lexical", 0.0)
+    if "vector" in scores:
+        result["similarity"] = scores["vector"]
+    if fused is not None:
+        result["rrf_score"] = fused
+    return result
+
+def generate_ai_response(query, context="general", video_id=None, analysis=None):
     """Generate intelligent AI-like response based on knowledge base"""
-    query_lower = query.lower()
+    # One automaton pass finds every intent, answer cue and topic phrase
+    with stage("intent"):
+        analysis = analysis or current_notebook().intent_classifier.analyze(query)
     
     # Find relevant topics
-    relevant_topics = find_relevant_topics(query)
-    video_results = find_video_content(query, video_id)
+    with stage("find_relevant_topics"):
+        relevant_topics = find_topics(query, analysis)
+    
+    with stage("assembly"):
+        return assemble_response(query, analysis, relevant_topics, video_id)
+
+def topic_menu(notebook):
+    """What a notebook other than the embedded course can explain, for greetings and unmatched questions"""
+    topics = "\n".join(f"• {topic_key.replace('_', ' ').title()}" for topic_key in list(notebook.knowledge_base)[:8])
+    return f"""I'd be happy to help you learn about {notebook.title}!
+
+Here are some topics I can explain in detail:
+
+{topics}
+
+Just ask me about any of these topics, or ask your own question!"""
+
+def assemble_response(query, analysis, relevant_topics, video_id=None):
+    """Build the answer text from the detected intents and ranked topics"""
+    intents = analysis.intents
+    cues = analysis.cues
+    # The written-out greeting, help and suggestions below are about the embedded course
+    notebook = current_notebook()
+    builtin = notebook is DEFAULT_NOTEBOOK
     
     # Build response
     response_parts = []
     
     # Greeting detection
-    greetings = ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"]
-    if any(greet in query_lower for greet in greetings):
+    if "greeting" in intents:
+        if not builtin:
+            return f"Hello! I'm your AI study assistant for {notebook.title}. What would you like to learn about?"
         return "Hello! I'm your AI study assistant specializing in Oligopoly and Game Theory. I can help you understand market structures, the prisoner's dilemma, Nash equilibrium, collusion, and much more. What would you like to learn about?"
     
     # Help/capability questions
-    if any(word in query_lower for word in ["what can you", "help me", "what do you know", "capabilities"]):
+    if "help" in intents:
+        if not builtin:
+            return topic_menu(notebook)
         return """I'm an AI tutor specialized in Oligopoly and Game Theory! I can help you with:
 
 📚 **Market Structures**: Understanding oligopoly characteristics, concentration ratios, and barriers to entry
@@ -527,7 +903,7 @@ def generate_ai_response(query, context="general", video_id=None):
 Just ask me anything about these topics!"""
 
     # Check for specific question types
-    if "what is" in query_lower or "define" in query_lower or "explain" in query_lower:
+    if "definition" in intents:
         if relevant_topics:
             topic_key, topic_data, _ = relevant_topics[0]
             response = f"**{topic_key.replace('_', ' ').title()}**\n\n{topic_data['definition']}"
@@ -545,8 +921,8 @@ Just ask me anything about these topics!"""
             return response
     
     # Example questions
-    if "example" in query_lower:
-        if "oligopoly" in query_lower:
+    if "example" in intents:
+        if "oligopoly" in cues:
             return """**Real-World Examples of Oligopolies:**
 
 🍎 **Smartphones**: Apple and Samsung dominate the global market
@@ -558,7 +934,7 @@ Just ask me anything about these topics!"""
 
 These industries all share oligopoly characteristics: few dominant firms, high barriers to entry, and interdependent decision-making."""
         
-        if "prisoner" in query_lower or "dilemma" in query_lower:
+        if "prisoner" in cues or "dilemma" in cues:
             return """**Prisoner's Dilemma - Business Example:**
 
 Imagine two competing firms (Firm A and Firm B) deciding on prices:
@@ -576,8 +952,8 @@ Imagine two competing firms (Firm A and Firm B) deciding on prices:
 This shows why maintaining collusion is difficult - there's always an incentive to cheat!"""
 
     # Why questions
-    if "why" in query_lower:
-        if "rigid" in query_lower or "stable" in query_lower:
+    if "why" in intents:
+        if "rigid" in cues or "stable" in cues:
             return """**Why Prices Are Rigid in Oligopolies:**
 
 The kinked demand curve model explains this:
@@ -592,7 +968,7 @@ The kinked demand curve model explains this:
 
 This means neither raising nor lowering prices increases profits significantly, so prices remain stable!"""
         
-        if "collusion" in query_lower and ("fail" in query_lower or "unstable" in query_lower or "difficult" in query_lower):
+        if "collusion" in cues and ("fail" in cues or "unstable" in cues or "difficult" in cues):
             return """**Why Collusion Often Fails:**
 
 🎯 **The Cheating Incentive**: Each firm can increase profits by secretly cutting prices while others maintain high prices
@@ -613,8 +989,8 @@ This means neither raising nor lowering prices increases profits significantly,
 This is the Prisoner's Dilemma in action - individual rationality leads to collective suboptimality!"""
 
     # How questions
-    if "how" in query_lower:
-        if "measure" in query_lower or "concentration" in query_lower:
+    if "how" in intents:
+        if "measure" in cues or "concentration" in cues:
             return """**How to Measure Market Concentration:**
 
 **1. Concentration Ratio (CR)**
@@ -632,8 +1008,8 @@ This is the Prisoner's Dilemma in action - individual rationality leads to colle
 • Lower values = more competitive market structure"""
 
     # Comparison questions
-    if "difference" in query_lower or "compare" in query_lower or "vs" in query_lower:
-        if "monopoly" in query_lower:
+    if "comparison" in intents:
+        if "monopoly" in cues:
             return """**Oligopoly vs Monopoly:**
 
 | Feature | Oligopoly | Monopoly |
@@ -647,7 +1023,7 @@ This is the Prisoner's Dilemma in action - individual rationality leads to colle
 
 **Key Difference**: In oligopoly, firms must consider rivals' reactions. In monopoly, there are no rivals to consider."""
 
-        if "competition" in query_lower or "perfect" in query_lower:
+        if "competition" in cues or "perfect" in cues:
             return """**Oligopoly vs Perfect Competition:**
 
 | Feature | Oligopoly | Perfect Competition |
@@ -662,15 +1038,15 @@ This is the Prisoner's Dilemma in action - individual rationality leads to colle
 **Key Difference**: Oligopolists have market power and make strategic decisions; perfectly competitive firms simply accept market prices."""
 
     # Video-specific questions
-    if video_id and video_id in VIDEO_TRANSCRIPTS:
-        video = VIDEO_TRANSCRIPTS[video_id]
-        video_content = video["content"].lower()
+    knowledge_base = notebook.knowledge_base
+    if video_id and video_id in notebook.video_transcripts:
+        video = notebook.video_transcripts[video_id]
+        
+        # Timestamped passages of this video that best match the question
+        passages = find_passages(query, video_id)
         
         # Check if query relates to video content
-        matched_topics = []
-        for topic in video["topics"]:
-            if topic in query_lower or any(word in query_lower for word in topic.split()):
-                matched_topics.append(topic)
+        matched_topics = [topic for topic in video["topics"] if topic in analysis.video_topics]
         
         if matched_topics:
             # Build response based on matched topics
@@ -679,46 +1055,39 @@ This is the Prisoner's Dilemma in action - individual rationality leads to colle
             for topic in matched_topics[:2]:
                 # Clean topic name for lookup
                 topic_key = topic.replace(" ", "_").replace("'", "").replace("-", "_")
-                if topic_key in KNOWLEDGE_BASE:
-                    topic_data = KNOWLEDGE_BASE[topic_key]
+                if topic_key in knowledge_base:
+                    topic_data = knowledge_base[topic_key]
                     response_parts.append(f"\n**{topic.title()}:**\n{topic_data['definition']}")
-                elif topic == "prisoner's dilemma" or "prisoner" in topic:
-                    response_parts.append(f"\n**Prisoner's Dilemma:**\n{KNOWLEDGE_BASE['prisoners_dilemma']['definition']}")
-                elif topic == "nash equilibrium" or "nash" in topic:
-                    response_parts.append(f"\n**Nash Equilibrium:**\n{KNOWLEDGE_BASE['nash_equilibrium']['definition']}")
+                elif (topic == "prisoner's dilemma" or "prisoner" in topic) and "prisoners_dilemma" in knowledge_base:
+                    response_parts.append(f"\n**Prisoner's Dilemma:**\n{knowledge_base['prisoners_dilemma']['definition']}")
+                elif (topic == "nash equilibrium" or "nash" in topic) and "nash_equilibrium" in knowledge_base:
+                    response_parts.append(f"\n**Nash Equilibrium:**\n{knowledge_base['nash_equilibrium']['definition']}")
             
-            # Add relevant excerpt from video
-            response_parts.append(f"\n\n📺 *This is covered in detail in the video at various points.*")
+            # Point to the moment in the video that covers it
+            if passages:
+                response_parts.append(f"\n\n📺 *This is covered in the video at {format_timestamp(passages[0][0].start_ms)}.*")
+            else:
+                response_parts.append(f"\n\n📺 *This is covered in detail in the video at various points.*")
             
             return "\n".join(response_parts)
         
-        # Search video content for query words
-        query_words = [w for w in query_lower.split() if len(w) > 3]
-        matches_in_content = sum(1 for word in query_words if word in video_content)
-        
-        if matches_in_content > 0:
-            # Extract relevant portion from video content
-            content_lines = video["content"].strip().split('\n')
-            relevant_lines = []
-            for line in content_lines:
-                line_lower = line.lower()
-                if any(word in line_lower for word in query_words if len(word) > 3):
-                    if line.strip():
-                        relevant_lines.append(line.strip())
-            
-            if relevant_lines:
-                return f"""**Based on the video '{video['title']}':**
+        if passages:
+            # Quote the matching passages with their timestamps
+            excerpts = "\n\n".join(f"⏱️ **{format_timestamp(passage.start_ms)}** {passage.text}" for passage, _ in passages)
+            return f"""**Based on the video '{video['title']}':**
 
-{chr(10).join(relevant_lines[:5])}
+{excerpts}
 
 📺 The video covers: {', '.join(video['topics'][:5])}
 
 Is there a specific concept you'd like me to explain in more detail?"""
         
-        # General video question - return video summary
+        # General video question - return the opening passage
+        start, end = notebook.passages.ranges[video_id]
+        opening = notebook.passages[start].text if end > start else video.get('content', '').strip()[:800]
         return f"""**From the video "{video['title']}":**
 
-{video['content'][:800]}...
+⏱️ **0:00** {opening}
 
 📚 **Topics covered:** {', '.join(video['topics'])}
 
@@ -745,6 +1114,8 @@ Feel free to ask about any specific topic from this video!"""
         return response
     
     # Default response with suggestions
+    if not builtin:
+        return topic_menu(notebook)
     return """I'd be happy to help you learn about Oligopoly and Game Theory! 
 
 Here are some topics I can explain in detail:
@@ -766,6 +1137,448 @@ Here are some topics I can explain in detail:
 
 Just ask me about any of these topics, or ask your own question!"""
 
+# =============================================================================
+# LLM ANSWERS
+# =============================================================================
+
+def local_answer(query, video_id=None, analysis=None):
+    """The local knowledge engine's answer, which cites no sources"""
+    response = generate_ai_response(query, context="video" if video_id else "general", video_id=video_id, analysis=analysis)
+    return {"response": response, "citations": []}
+
+def retrieve_sources(query, video_id=None, analysis=None):
+    """Topic and transcript sources for a question, best first"""
+    notebook = current_notebook()
+    with stage("retrieve"):
+        analysis = analysis or notebook.intent_classifier.analyze(query)
+        topics = [Source.from_topic(topic_key, topic)
+                  for topic_key, topic, score in find_topics(query, analysis)[:RAG_TOPICS] if score > 0]
+        passages = [Source.from_passage(passage, notebook.video_transcripts[passage.video_id]["title"])
+                    for passage, scores, fused in find_passages(query, video_id, RAG_PASSAGES)
+                    if (scores["lexical"] if fused is None else fused) > 0]
+        return interleave(topics, passages)
+
+def rag_prompt(query, video_id=None, analysis=None):
+    """(prompt, sources): the retrieved sources packed into the context budget"""
+    sources = retrieve_sources(query, video_id, analysis)
+    with stage("pack_context"):
+        sources = pack_context(sources, RAG_CONTEXT_TOKENS)
+        return build_prompt(query, sources), sources
+
+def citation_root(notebook):
+    """API root that a notebook's topic citations link under"""
+    return "/api" if notebook.id == BUILTIN_NOTEBOOK_ID else f"/api/notebooks/{notebook.id}"
+
+def llm_answer(text, sources):
+    return {"response": text, "citations": citations(text, sources, citation_root(current_notebook()))}
+
+def llm_fallback(query, video_id, error, analysis=None):
+    """The local engine's answer to a question the LLM failed on"""
+    if isinstance(error, CircuitOpenError):
+        reason = "circuit_open"
+    elif isinstance(error, DeadlineExceeded):
+        reason = "timeout"
+    elif isinstance(error, TransientLLMError):
+        reason = "transient"
+    else:
+        reason = "error"
+    LLM_FALLBACKS.inc(reason=reason)
+    return local_answer(query, video_id, analysis)
+
+def answer_question(query, video_id=None, analysis=None):
+    """(answer, cacheable): a grounded LLM answer with citations when configured, else the local engine's
+
+    Fallback answers are not cacheable, so the LLM answers the question again
+    once it recovers. analysis, when given, is the question's prepared QueryAnalysis.
+    """
+    if LLM is None:
+        return local_answer(query, video_id, analysis), True
+    try:
+        prompt, sources = rag_prompt(query, video_id, analysis)
+        with stage("llm"):
+            text = LLM.complete(current_notebook().system_prompt, prompt)
+        return llm_answer(text, sources), True
+    except LLMError as e:
+        return llm_fallback(query, video_id, e, analysis), False
+
+async def run_retrieval(fn, *args):
+    """fn(*args) on RETRIEVAL_POOL in a copy of the caller's context, so stage timings and the notebook carry over"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(RETRIEVAL_POOL, context.run, fn, *args)
+
+async def answer_question_async(query, video_id=None):
+    """answer_question for the ASGI handlers; neither retrieval nor waiting on the LLM blocks the event loop"""
+    if LLM is None:
+        return await run_retrieval(local_answer, query, video_id), True
+    try:
+        prompt, sources = await run_retrieval(rag_prompt, query, video_id)
+        with stage("llm"):
+            text = await LLM.acomplete(current_notebook().system_prompt, prompt)
+        return llm_answer(text, sources), True
+    except LLMError as e:
+        return await run_retrieval(llm_fallback, query, video_id, e), False
+
+# =============================================================================
+# RESPONSE CACHE
+# =============================================================================
+
+def response_cache_key(query, video_id=None):
+    """Cache key of a question in the current notebook, or None when nothing but stopwords and punctuation is left to key on"""
+    normalized = normalize_query(query)
+    return (normalized, video_id, current_notebook().cache_scope) if normalized else None
+
+def lookup_response(query, video_id=None):
+    """(cached answer or None, cache key, question vector): the exact cache first, then the semantic cache"""
+    key = response_cache_key(query, video_id)
+    answer = None
+    if key is not None:
+        with stage("cache_lookup"):
+            answer = RESPONSE_CACHE.get(key, SOURCE_FINGERPRINT)
+        CACHE_LOOKUPS.inc(result="miss" if answer is None else "hit")
+    if answer is not None or SEMANTIC_CACHE is None:
+        return answer, key, None
+    
+    with stage("semantic_lookup"):
+        vector = QUESTION_EMBEDDER.embed(query)
+        scope = (current_notebook().cache_scope, video_id)
+        match = SEMANTIC_CACHE.get(vector, scope, SOURCE_FINGERPRINT) if vector is not None else None
+    SEMANTIC_LOOKUPS.inc(result="miss" if match is None else "hit")
+    if match is None:
+        return None, key, vector
+    # Exact repeats of this wording skip the embedding from now on
+    store_response(key, match[0])
+    return match[0], key, vector
+
+def store_response(key, answer, vector=None, video_id=None):
+    if key is not None:
+        RESPONSE_CACHE.put(key, answer, SOURCE_FINGERPRINT)
+    if vector is not None:
+        SEMANTIC_CACHE.put(vector, answer, (current_notebook().cache_scope, video_id), SOURCE_FINGERPRINT)
+
+def answer_once(query, video_id, key, vector, analysis=None):
+    """answer_question and cache the answer; concurrent calls for the same key share one run"""
+    def compute():
+        answer, cacheable = answer_question(query, video_id, analysis)
+        if cacheable:
+            store_response(key, answer, vector, video_id)
+        return answer, cacheable
+    
+    if key is None:
+        return compute()[0]
+    (answer, cacheable), role = SINGLE_FLIGHT.do(key, compute)
+    COALESCED_ANSWERS.inc(role=role)
+    if role == "shared" and cacheable:
+        # Computed by another worker, so this worker's caches have not seen it
+        store_response(key, answer, vector, video_id)
+    return answer
+
+async def answer_once_async(query, video_id, key, vector):
+    async def compute():
+        answer, cacheable = await answer_question_async(query, video_id)
+        if cacheable:
+            store_response(key, answer, vector, video_id)
+        return answer, cacheable
+    
+    if key is None:
+        return (await compute())[0]
+    (answer, cacheable), role = await SINGLE_FLIGHT.ado(key, compute)
+    COALESCED_ANSWERS.inc(role=role)
+    if role == "shared" and cacheable:
+        store_response(key, answer, vector, video_id)
+    return answer
+
+def cached_answer(query, video_id=None, analysis=None):
+    """{'response', 'citations'} for a question, through the response caches"""
+    answer, key, vector = lookup_response(query, video_id)
+    if answer is None:
+        answer = answer_once(query, video_id, key, vector, analysis)
+    return answer
+
+async def cached_answer_async(query, video_id=None):
+    answer, key, vector = lookup_response(query, video_id)
+    if answer is None:
+        answer = await answer_once_async(query, video_id, key, vector)
+    return answer
+
+# Streamed answers are sent in line-aligned chunks of about this many characters
+STREAM_CHUNK_CHARS = 200
+
+def answer_events(query, video_id=None):
+    """Yield ("chunk", {"text"}) events as the answer is produced, then ("done", {"citations"})
+
+    LLM tokens are passed on as they arrive, and concurrent requests for the
+    same question share one LLM stream. A failure before the first token
+    falls back to the local engine; after it, the error reaches the caller.
+    """
+    answer, key, vector = lookup_response(query, video_id)
+    if answer is None and LLM is not None:
+        if key is None:
+            yield from llm_events(query, video_id, key, vector)
+        else:
+            yield from STREAM_FLIGHT.stream(key, lambda: llm_events(query, video_id, key, vector))
+        return
+    if answer is None:
+        answer = answer_once(query, video_id, key, vector)
+    yield from finished_answer_events(answer)
+
+def llm_events(query, video_id, key, vector):
+    """answer_events for a question no cache could answer, from the LLM backend"""
+    parts = []
+    try:
+        prompt, sources = rag_prompt(query, video_id)
+        for chunk in LLM.stream(current_notebook().system_prompt, prompt):
+            parts.append(chunk)
+            yield "chunk", {"text": chunk}
+    except LLMError as e:
+        if parts:
+            raise
+        yield from finished_answer_events(llm_fallback(query, video_id, e))
+        return
+    answer = llm_answer("".join(parts), sources)
+    store_response(key, answer, vector, video_id)
+    yield "done", {"citations": answer["citations"]}
+
+async def answer_events_async(query, video_id=None):
+    """answer_events for the ASGI handlers"""
+    answer, key, vector = lookup_response(query, video_id)
+    if answer is None and LLM is not None:
+        if key is None:
+            events = llm_events_async(query, video_id, key, vector)
+        else:
+            events = STREAM_FLIGHT.astream(key, lambda: llm_events_async(query, video_id, key, vector))
+        async for event in events:
+            yield event
+        return
+    if answer is None:
+        answer = await answer_once_async(query, video_id, key, vector)
+    for event in finished_answer_events(answer):
+        yield event
+
+async def llm_events_async(query, video_id, key, vector):
+    parts = []
+    try:
+        prompt, sources = await run_retrieval(rag_prompt, query, video_id)
+        async for chunk in LLM.astream(current_notebook().system_prompt, prompt):
+            parts.append(chunk)
+            yield "chunk", {"text": chunk}
+    except LLMError as e:
+        if parts:
+            raise
+        for event in finished_answer_events(await run_retrieval(llm_fallback, query, video_id, e)):
+            yield event
+        return
+    answer = llm_answer("".join(parts), sources)
+    store_response(key, answer, vector, video_id)
+    yield "done", {"citations": answer["citations"]}
+
+def finished_answer_events(answer):
+    """Events of an answer that is already complete"""
+    for chunk in answer_chunks(answer["response"]):
+        yield "chunk", {"text": chunk}
+    yield "done", {"citations": answer["citations"]}
+
+def answer_chunks(response):
+    """Split a finished answer into line-aligned chunks"""
+    chunk = ""
+    for line in response.splitlines(keepends=True):
+        chunk += line
+        if len(chunk) >= STREAM_CHUNK_CHARS:
+            yield chunk
+            chunk = ""
+    if chunk:
+        yield chunk
+
+# Sent in the error event; the exception itself is logged, not shown to the client
+STREAM_ERROR_MESSAGE = "The answer could not be completed, please try again"
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def chat_event_stream(message, started):
+    """SSE events for one streamed chat answer: chunk..., then done (with citations) or error"""
+    # A comment line goes out before any work, so the client sees bytes immediately
+    yield ": stream open\n\n"
+    try:
+        for idx, (event, data) in enumerate(answer_events(message)):
+            if idx == 0:
+                STREAM_FIRST_CHUNK.observe(time.perf_counter() - started)
+            yield sse_event(event, data)
+    except Exception:
+        app.logger.exception("Streamed answer to %r failed", message)
+        yield sse_event("error", {"error": STREAM_ERROR_MESSAGE})
+
+async def chat_event_stream_async(message, started):
+    """chat_event_stream for the ASGI handlers"""
+    yield ": stream open\n\n"
+    try:
+        first = True
+        async for event, data in answer_events_async(message):
+            if first:
+                STREAM_FIRST_CHUNK.observe(time.perf_counter() - started)
+                first = False
+            yield sse_event(event, data)
+    except Exception:
+        app.logger.exception("Streamed answer to %r failed", message)
+        yield sse_event("error", {"error": STREAM_ERROR_MESSAGE})
+
+# Keep proxies from buffering or caching the event stream
+EVENT_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def in_request_context(iterable):
+    """Iterate a streamed body in a copy of the request's context, which is torn down before the body is sent"""
+    # Copied now, while the request is active, not on the first iteration
+    context = contextvars.copy_context()
+    iterator = iter(iterable)
+    
+    def items():
+        while True:
+            try:
+                yield context.run(next, iterator)
+            except StopIteration:
+                return
+    return items()
+
+# =============================================================================
+# BATCH ANSWERS
+# =============================================================================
+
+def parse_top_k(value, default=3):
+    """Passages to return for a video question, clamped to 1..MAX_VIDEO_PASSAGES; ValueError unless an integer"""
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("'top_k' must be an integer")
+    try:
+        top_k = int(value)
+    except ValueError:
+        raise ValueError("'top_k' must be an integer") from None
+    return max(1, min(top_k, MAX_VIDEO_PASSAGES))
+
+def parse_batch(questions):
+    """[(question, video_id)] from a list of strings or {"question", "video_id"} objects; ValueError if malformed"""
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("Provide a non-empty 'questions' list")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise ValueError(f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    items = []
+    for idx, item in enumerate(questions):
+        if isinstance(item, str):
+            item = {"question": item}
+        if not isinstance(item, dict) or not isinstance(item.get("question"), str) or not item["question"].strip():
+            raise ValueError(f"questions[{idx}] has no question")
+        video_id = item.get("video_id") or None
+        if video_id is not None and video_id not in current_notebook().video_transcripts:
+            raise ValueError(f"questions[{idx}]: video {video_id} not found")
+        items.append((item["question"], video_id))
+    return items
+
+def score_batch(notebook, analyses):
+    """Score the topics of every question in {question: analysis} at once
+
+    One BM25 and one trigram matrix operation cover the whole batch; each
+    analysis keeps its row, which find_relevant_topics uses instead of
+    scoring the question again.
+    """
+    questions = list(analyses)
+    topic_scores = notebook.topic_index.score_many([analyses[question].terms for question in questions])
+    similarity = notebook.definition_index.similarity_many(questions)
+    for row, question in enumerate(questions):
+        analyses[question].topic_scores = topic_scores[row]
+        analyses[question].definition_similarity = similarity[row]
+
+def answer_batch(items):
+    """Yield a result per (question, video_id) item as its answer finishes
+
+    Repeated items are answered once, and each distinct question is analyzed
+    once for all the items that ask it. Lexical topic scores are computed for
+    the whole batch together; answers are then generated on BATCH_POOL through
+    the response caches.
+    """
+    positions = {}
+    for idx, item in enumerate(items):
+        positions.setdefault(item, []).append(idx)
+    notebook = current_notebook()
+    analyses = {question: notebook.intent_classifier.analyze(question) for question, _ in positions}
+    if notebook.content_db is None:
+        score_batch(notebook, analyses)
+    # Each answer runs in a copy of this context, so it sees the same notebook
+    futures = {BATCH_POOL.submit(contextvars.copy_context().run, cached_answer, question, video_id, analyses[question]):
+               (question, video_id) for question, video_id in positions}
+    for future in as_completed(futures):
+        question, video_id = futures[future]
+        try:
+            outcome = future.result()
+        except Exception as e:
+            outcome = {'error': str(e)}
+        for idx in positions[(question, video_id)]:
+            yield {'index': idx, 'question': question, 'video_id': video_id, **outcome}
+
+# =============================================================================
+# REQUEST METRICS
+# =============================================================================
+
+def observe_request(route, method, status_code, seconds, size=None):
+    """Record one finished request in the route metrics"""
+    HTTP_REQUESTS.inc(route=route, method=method, status=str(status_code))
+    if status_code >= 500:
+        HTTP_ERRORS.inc(route=route)
+    HTTP_DURATION.observe(seconds, route=route)
+    if size is not None:
+        HTTP_RESPONSE_SIZE.observe(size, route=route)
+
+def finish_stage_timer(endpoint, timer):
+    """Close a request's stage timer and record its spans"""
+    spans = timer.finish()
+    STAGE_METRICS.record(endpoint, spans)
+    for stage_name, ms in spans:
+        STAGE_DURATION.observe(ms / 1000, endpoint=endpoint, stage=stage_name)
+
+def debug_timing_requested(header_value):
+    return (header_value or "").lower() in ("1", "true", "yes")
+
+def append_traffic(method, path, body):
+    """Log a request in the format benchmarks/loadtest.py replays"""
+    entry = {"t": round(time.time(), 4), "method": method, "path": path, "body": body}
+    # One short append per request, so lines from several workers do not interleave
+    with open(TRAFFIC_LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+@app.before_request
+def start_request_timer():
+    """Time every request, and the pipeline stages of the chat endpoints"""
+    g.request_started = time.perf_counter()
+    if request.endpoint in TIMED_ENDPOINTS:
+        g.request_timer = activate(RequestTimer())
+
+@app.after_request
+def finish_request_timer(response):
+    """Record route metrics and stage spans; X-Debug-Timing: 1 returns the spans as a Server-Timing header"""
+    # Label by URL rule, not path, so /api/topic/<topic_id> stays one series
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    started = g.get("request_started", time.perf_counter())
+    # Streamed bodies are left alone: measuring them would buffer the whole stream
+    size = None if response.is_streamed else response.calculate_content_length()
+    observe_request(route, request.method, response.status_code, time.perf_counter() - started, size)
+    
+    timer = g.pop("request_timer", None)
+    if timer is not None:
+        finish_stage_timer(request.endpoint, timer)
+        if debug_timing_requested(request.headers.get("X-Debug-Timing")):
+            response.headers["Server-Timing"] = timer.server_timing()
+    return response
+
+@app.after_request
+def record_traffic(response):
+    """Append replayable requests to TRAFFIC_LOG"""
+    if TRAFFIC_LOG and request.endpoint in RECORDED_ENDPOINTS:
+        append_traffic(request.method, request.full_path.rstrip("?"), request.get_json(silent=True))
+    return response
+
+@app.teardown_request
+def clear_request_timer(exc):
+    deactivate()
+
 # =============================================================================
 # FLASK ROUTES
 # =============================================================================
@@ -778,52 +1591,110 @@ def index():
 @app.route('/api/status')
 def get_status():
     """Get API status"""
+    notebook = current_notebook()
     return jsonify({
-        'gemini_enabled': True,  # We have our smart AI system
+        # The page shows "AI Online" while an LLM backend is configured and its circuit is not open
+        'gemini_enabled': LLM is not None and LLM.available(),
         'ai_enabled': True,
-        'ai_provider': 'Smart Knowledge-Based AI',
-        'videos_loaded': len(YOUTUBE_VIDEOS),
-        'topics_loaded': len(KNOWLEDGE_BASE),
-        'quiz_questions': len(QUIZ_QUESTIONS),
-        'flashcards': len(FLASHCARDS)
+        'ai_provider': f'{LLM.name}:{LLM.model}' if LLM else 'Smart Knowledge-Based AI',
+        'llm': LLM.status() if LLM else {'enabled': False},
+        'notebook': notebook.id,
+        'videos_loaded': len(notebook.videos),
+        'topics_loaded': len(notebook.knowledge_base),
+        'quiz_questions': len(notebook.quiz_questions),
+        'flashcards': len(notebook.flashcards),
+        'response_cache': RESPONSE_CACHE.stats(),
+        'semantic_cache': SEMANTIC_CACHE.stats() if SEMANTIC_CACHE else None,
+        'retrieval_arms': RETRIEVAL_ARMS,
+        'content_backend': 'sqlite' if notebook.content_db is not None else 'memory'
     })
 
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus metrics of every worker"""
+    return app.response_class(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/metrics/stages')
+def get_stage_metrics():
+    """Latency percentiles of each chat pipeline stage"""
+    return jsonify({'stages': STAGE_METRICS.summary()})
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat messages"""
     try:
-        data = request.get_json()
-        message = data.get('message', '')
+        with stage("parse"):
+            data = request.get_json()
+            message = data.get('message', '')
         
         if not message:
             return jsonify({'error': 'No message provided'}), 400
         
-        response = generate_ai_response(message)
-        return jsonify({'response': response})
+        answer = cached_answer(message)
+        with stage("serialize"):
+            return jsonify({'response': answer['response'], 'citations': answer['citations']})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer a list of questions in one call, in order or as NDJSON lines as they finish"""
+    data = request.get_json(silent=True) or {}
+    try:
+        items = parse_batch(data.get('questions'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if data.get('stream'):
+        lines = (json.dumps(result) + "\n" for result in answer_batch(items))
+        return app.response_class(in_request_context(lines), mimetype='application/x-ndjson')
+    
+    results = [None] * len(items)
+    for result in answer_batch(items):
+        results[result['index']] = result
+    return jsonify({'results': results})
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the chat answer as Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '')
+    
+    if not message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    events = chat_event_stream(message, g.get("request_started", time.perf_counter()))
+    return app.response_class(in_request_context(events), mimetype='text/event-stream', headers=EVENT_STREAM_HEADERS)
+
 @app.route('/api/videos')
 def get_videos():
     """Get list of videos"""
-    return jsonify({'videos': YOUTUBE_VIDEOS})
+    return jsonify({'videos': current_notebook().videos})
 
 @app.route('/api/video/<video_id>/ask', methods=['POST'])
 def ask_video_question(video_id):
     """Answer questions about a specific video"""
     try:
-        data = request.get_json()
-        question = data.get('question', '')
+        with stage("parse"):
+            data = request.get_json()
+            question = data.get('question', '')
+            try:
+                top_k = parse_top_k(data.get('top_k'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
         
         if not question:
             return jsonify({'error': 'No question provided'}), 400
         
-        if video_id not in VIDEO_TRANSCRIPTS:
+        if video_id not in current_notebook().video_transcripts:
             return jsonify({'error': 'Video not found'}), 404
         
-        response = generate_ai_response(question, context="video", video_id=video_id)
-        return jsonify({'response': response})
+        answer = cached_answer(question, video_id=video_id)
+        with stage("find_video_passages"):
+            passages = [passage_result(*found) for found in find_passages(question, video_id, top_k)]
+        with stage("serialize"):
+            return jsonify({'response': answer['response'], 'citations': answer['citations'], 'passages': passages})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -832,7 +1703,7 @@ def ask_video_question(video_id):
 def get_topics():
     """Get list of topics"""
     topics = []
-    for key, data in KNOWLEDGE_BASE.items():
+    for key, data in current_notebook().knowledge_base.items():
         topics.append({
             'id': key,
             'title': key.replace('_', ' ').title(),
@@ -843,8 +1714,9 @@ def get_topics():
 @app.route('/api/topic/<topic_id>')
 def get_topic(topic_id):
     """Get details for a specific topic"""
-    if topic_id in KNOWLEDGE_BASE:
-        topic = KNOWLEDGE_BASE[topic_id]
+    knowledge_base = current_notebook().knowledge_base
+    if topic_id in knowledge_base:
+        topic = knowledge_base[topic_id]
         return jsonify({
             'id': topic_id,
             'title': topic_id.replace('_', ' ').title(),
@@ -852,18 +1724,51 @@ def get_topic(topic_id):
         })
     return jsonify({'error': 'Topic not found'}), 404
 
+def describe_vector_item(notebook, key, score):
+    """JSON for one vector search result"""
+    kind, ref = key.split(":", 1)
+    item = {'type': kind, 'score': score}
+    if kind == "topic":
+        item.update(id=ref, title=ref.replace('_', ' ').title(), definition=notebook.knowledge_base[ref]['definition'])
+    elif kind == "flashcard":
+        item.update(notebook.flashcards[int(ref)])
+    elif kind == "quiz":
+        question = next(question for question in notebook.quiz_questions if str(question['id']) == ref)
+        item.update(id=question['id'], question=question['question'])
+    else:
+        passage = notebook.passages[int(ref)]
+        item.update(passage.to_dict(), title=notebook.video_transcripts[passage.video_id]['title'],
+                    timestamp=format_timestamp(passage.start_ms))
+    return item
+
+@app.route('/api/search')
+def semantic_search():
+    """Nearest topics, flashcards, quiz questions and passages to a question by meaning"""
+    if not SEMANTIC_SEARCH:
+        return jsonify({'error': 'Semantic search is disabled'}), 404
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    kinds = [kind for kind in request.args.get('types', ','.join(VECTOR_KINDS)).split(',') if kind in VECTOR_KINDS]
+    k = max(1, min(request.args.get('k', 5, type=int), 20))
+    notebook = current_notebook()
+    results = [describe_vector_item(notebook, key, score) for key, score in notebook.vectors.search(query, kinds, k)]
+    return jsonify({'query': query, 'results': results})
+
 @app.route('/api/quiz')
 def get_quiz():
     """Get quiz questions"""
     # Shuffle questions for variety
-    questions = random.sample(QUIZ_QUESTIONS, min(10, len(QUIZ_QUESTIONS)))
+    quiz_questions = current_notebook().quiz_questions
+    questions = random.sample(quiz_questions, min(10, len(quiz_questions)))
     return jsonify({'questions': questions})
 
 @app.route('/api/flashcards')
 def get_flashcards():
     """Get flashcards"""
     # Shuffle flashcards
-    cards = random.sample(FLASHCARDS, len(FLASHCARDS))
+    flashcards = current_notebook().flashcards
+    cards = random.sample(flashcards, len(flashcards))
     return jsonify({'flashcards': cards})
 
 @app.route('/api/generate-dialogue', methods=['POST'])
@@ -871,11 +1776,14 @@ def generate_dialogue():
     """Generate two-person dialogue about a topic"""
     try:
         data = request.get_json()
-        topic = data.get('topic', 'oligopoly')
+        knowledge_base = current_notebook().knowledge_base
+        # A notebook without an oligopoly topic starts from its first one
+        default_topic = 'oligopoly' if 'oligopoly' in knowledge_base else next(iter(knowledge_base), 'oligopoly')
+        topic = data.get('topic', default_topic)
         
         # Find topic in knowledge base
         topic_key = topic.lower().replace(' ', '_')
-        topic_data = KNOWLEDGE_BASE.get(topic_key, KNOWLEDGE_BASE.get('oligopoly'))
+        topic_data = knowledge_base.get(topic_key, knowledge_base.get(default_topic))
         
         # Generate educational dialogue
         dialogue = [
@@ -914,6 +1822,59 @@ def generate_dialogue():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# =============================================================================
+# NOTEBOOK ROUTES
+# =============================================================================
+
+@app.route('/api/notebooks')
+def list_notebooks():
+    """List the notebooks on disk and the ones resident in this worker"""
+    notebooks = [{'id': BUILTIN_NOTEBOOK_ID, 'title': DEFAULT_NOTEBOOK.title}]
+    notebooks.extend({'id': notebook_id} for notebook_id in NOTEBOOKS.ids() if notebook_id != BUILTIN_NOTEBOOK_ID)
+    return jsonify({'notebooks': notebooks, 'cache': NOTEBOOKS.stats()})
+
+# The course routes again under /api/notebooks/<notebook_id>, answering from that notebook
+notebook_routes = Blueprint('notebook', __name__, url_prefix='/api/notebooks/<notebook_id>')
+
+@notebook_routes.url_value_preprocessor
+def pop_notebook_id(endpoint, values):
+    g.notebook_id = values.pop('notebook_id')
+
+NOTEBOOK_INVALID_MESSAGE = "Notebook could not be loaded"
+
+@notebook_routes.before_request
+def activate_request_notebook():
+    """Load and activate the notebook of the URL; 404 if there is none, 500 if it cannot be read"""
+    try:
+        activate_notebook(get_notebook(g.notebook_id))
+    except NotebookNotFound:
+        return jsonify({'error': 'Notebook not found'}), 404
+    except NotebookInvalid as e:
+        app.logger.error("Notebook %s", e)
+        return jsonify({'error': NOTEBOOK_INVALID_MESSAGE}), 500
+
+@notebook_routes.teardown_request
+def deactivate_request_notebook(exc):
+    deactivate_notebook()
+
+for rule, view, methods in [
+    ('/status', get_status, ['GET']),
+    ('/chat', chat, ['POST']),
+    ('/chat/batch', chat_batch, ['POST']),
+    ('/chat/stream', chat_stream, ['POST']),
+    ('/videos', get_videos, ['GET']),
+    ('/video/<video_id>/ask', ask_video_question, ['POST']),
+    ('/topics', get_topics, ['GET']),
+    ('/topic/<topic_id>', get_topic, ['GET']),
+    ('/search', semantic_search, ['GET']),
+    ('/quiz', get_quiz, ['GET']),
+    ('/flashcards', get_flashcards, ['GET']),
+    ('/generate-dialogue', generate_dialogue, ['POST']),
+]:
+    notebook_routes.add_url_rule(rule, view_func=view, methods=methods)
+
+app.register_blueprint(notebook_routes)
+
 # =============================================================================
 # RUN APPLICATION
 # =============================================================================
@@ -935,6 +1896,5 @@ if __name__ == '__main__':
     print("="*60 + "\n")
     
     # Use environment port for deployment or default to 5000
-    import os
     port = int(os.environ.get("PORT", 5000))
     app.run(debug=False, host="0.0.0.0", port=port, threaded=True)
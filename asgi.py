@@ -0,0 +1,311 @@
+"""
+ASGI entry point
+/api/chat, /api/chat/stream and /api/video/<video_id>/ask, and their
+/api/notebooks/<notebook_id> variants, are served by native async handlers,
+so a request waiting on the LLM backend costs a coroutine instead of a
+worker process; every other route runs the Flask app on a small thread pool
+
+Usage:
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker --workers 4
+    uvicorn asgi:application --port 5000       # single process, for development
+"""
+
+import asyncio
+import io
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as study_app
+from notebooks import NotebookInvalid, NotebookNotFound, activate as activate_notebook, deactivate as deactivate_notebook
+from timing import RequestTimer, activate, deactivate, stage
+
+
+class Request:
+    """The parts of an ASGI HTTP request the async handlers read"""
+
+    def __init__(self, scope, body, path_params, started):
+        self.scope = scope
+        self.started = started
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query_string = scope.get("query_string", b"").decode("latin-1")
+        self.headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        self.body = body
+        self.path_params = path_params
+
+    def json(self):
+        """Parsed JSON body, or None when it is missing or malformed"""
+        try:
+            return study_app.app.json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+
+async def chat(request):
+    """Handle chat messages"""
+    try:
+        with stage("parse"):
+            data = request.json()
+            message = data.get('message', '')
+
+        if not message:
+            return 400, {'error': 'No message provided'}
+
+        answer = await study_app.cached_answer_async(message)
+        return 200, {'response': answer['response'], 'citations': answer['citations']}
+
+    except Exception as e:
+        return 500, {'error': str(e)}
+
+
+class EventStream:
+    """Handler result sent as text/event-stream, one write per item of the async iterable events"""
+
+    def __init__(self, events):
+        self.events = events
+
+
+async def chat_stream(request):
+    """Stream the chat answer as Server-Sent Events"""
+    data = request.json() or {}
+    message = data.get('message', '')
+
+    if not message:
+        return 400, {'error': 'No message provided'}
+
+    return 200, EventStream(study_app.chat_event_stream_async(message, request.started))
+
+
+async def ask_video_question(request):
+    """Answer questions about a specific video"""
+    video_id = request.path_params["video_id"]
+    try:
+        with stage("parse"):
+            data = request.json()
+            question = data.get('question', '')
+            try:
+                top_k = study_app.parse_top_k(data.get('top_k'))
+            except ValueError as e:
+                return 400, {'error': str(e)}
+
+        if not question:
+            return 400, {'error': 'No question provided'}
+
+        if video_id not in study_app.current_notebook().video_transcripts:
+            return 404, {'error': 'Video not found'}
+
+        answer = await study_app.cached_answer_async(question, video_id=video_id)
+        with stage("find_video_passages"):
+            passages = [study_app.passage_result(*found) for found in
+                        await study_app.run_retrieval(study_app.find_passages, question, video_id, top_k)]
+        return 200, {'response': answer['response'], 'citations': answer['citations'], 'passages': passages}
+
+    except Exception as e:
+        return 500, {'error': str(e)}
+
+
+# (path pattern, Flask endpoint name, route label, handler); names match the Flask views
+# so metrics from both serving modes land in the same series
+ASYNC_VIEWS = [
+    (r"/api/chat", "chat", "/api/chat", chat),
+    (r"/api/chat/stream", "chat_stream", "/api/chat/stream", chat_stream),
+    (r"/api/video/(?P<video_id>[^/]+)/ask", "ask_video_question", "/api/video/<video_id>/ask", ask_video_question),
+]
+
+# Every view again under /api/notebooks/<notebook_id>, named like the Flask blueprint's
+ASYNC_ROUTES = [(re.compile(f"^{path}$"), endpoint, route, handler) for path, endpoint, route, handler in ASYNC_VIEWS] + [
+    (re.compile(f"^/api/notebooks/(?P<notebook_id>[^/]+){path[len('/api'):]}$"), f"notebook.{endpoint}",
+     f"/api/notebooks/<notebook_id>{route[len('/api'):]}", handler)
+    for path, endpoint, route, handler in ASYNC_VIEWS
+]
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def send_event_stream(send, stream):
+    """Send each event as its own body message so it reaches the client immediately"""
+    headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+    headers.extend((name.lower().encode("latin-1"), value.encode("latin-1"))
+                   for name, value in study_app.EVENT_STREAM_HEADERS.items())
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    size = 0
+    async for event in stream.events:
+        body = event.encode("utf-8")
+        size += len(body)
+        await send({"type": "http.response.body", "body": body, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+    return size
+
+
+async def send_json(send, status, payload, extra_headers=()):
+    # Same bytes as Flask's jsonify: sorted keys, compact separators, trailing newline
+    body = (study_app.app.json.dumps(payload, separators=(",", ":")) + "\n").encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    headers.extend(extra_headers)
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+    return len(body)
+
+
+def wsgi_environ(scope, body):
+    """Build a PEP 3333 environ for an ASGI HTTP scope"""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class WsgiBridge:
+    """Serve a WSGI app from ASGI by running each request on a thread pool
+
+    The body is sent chunk by chunk as the WSGI iterable yields it, so
+    streamed responses (NDJSON batches, Server-Sent Events) reach the client
+    as they are produced. Every chunk is pulled on the pool, so a stream only
+    holds a thread while its next chunk is being produced.
+    """
+
+    def __init__(self, wsgi_app, max_threads=32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="wsgi")
+
+    def start(self, environ):
+        """Call the app; returns (status, headers, result, body iterator, chunks already produced)"""
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = headers
+            return chunks.append
+
+        result = self.wsgi_app(environ, start_response)
+        body = iter(result)
+        # PEP 3333 lets an app call start_response as late as its first chunk
+        while "status" not in response:
+            chunks.append(next(body))
+        return response["status"], response["headers"], result, body, chunks
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        environ = wsgi_environ(scope, await read_body(receive))
+        status, headers, result, body, chunks = await loop.run_in_executor(self.executor, self.start, environ)
+        try:
+            await send({"type": "http.response.start", "status": status,
+                        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]})
+            for chunk in chunks:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, body, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(self.executor, result.close)
+        await send({"type": "http.response.body", "body": b""})
+
+
+class StudyApplication:
+    """Dispatches the async routes itself and hands everything else to Flask"""
+
+    def __init__(self, flask_app):
+        self.wsgi = WsgiBridge(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http" and scope["method"] == "POST":
+            for pattern, endpoint, route, handler in ASYNC_ROUTES:
+                match = pattern.match(scope["path"])
+                if match:
+                    return await self.dispatch(scope, receive, send, match.groupdict(), endpoint, route, handler)
+        return await self.wsgi(scope, receive, send)
+
+    async def dispatch(self, scope, receive, send, path_params, endpoint, route, handler):
+        started = time.perf_counter()
+        timer = activate(RequestTimer())
+        notebook_id = path_params.pop("notebook_id", None)
+        try:
+            request = Request(scope, await read_body(receive), path_params, started)
+            if notebook_id is None:
+                status, payload = await handler(request)
+            else:
+                status, payload = await self.in_notebook(notebook_id, handler, request)
+            if isinstance(payload, EventStream):
+                size = await send_event_stream(send, payload)
+            else:
+                headers = []
+                if study_app.debug_timing_requested(request.headers.get("x-debug-timing")):
+                    # Spans so far; serialization happens after the header is built
+                    headers.append((b"server-timing", timer.server_timing().encode("latin-1")))
+                with stage("serialize"):
+                    size = await send_json(send, status, payload, headers)
+        finally:
+            deactivate()
+            deactivate_notebook()
+
+        study_app.observe_request(route, scope["method"], status, time.perf_counter() - started, size)
+        if endpoint in study_app.TIMED_ENDPOINTS:
+            study_app.finish_stage_timer(endpoint, timer)
+        if study_app.TRAFFIC_LOG and endpoint in study_app.RECORDED_ENDPOINTS:
+            path = request.path + (f"?{request.query_string}" if request.query_string else "")
+            await asyncio.to_thread(study_app.append_traffic, request.method, path, request.json())
+
+    async def in_notebook(self, notebook_id, handler, request):
+        """Run handler with the notebook of the URL active, like the Flask blueprint; 404 if there is none"""
+        try:
+            # A first request for a notebook reads and indexes it, so off the loop
+            notebook = await asyncio.to_thread(study_app.get_notebook, notebook_id)
+        except NotebookNotFound:
+            return 404, {'error': 'Notebook not found'}
+        except NotebookInvalid as e:
+            study_app.app.logger.error("Notebook %s", e)
+            return 500, {'error': study_app.NOTEBOOK_INVALID_MESSAGE}
+        activate_notebook(notebook)
+        return await handler(request)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+application = StudyApplication(study_app.app)
@@ -0,0 +1,375 @@
+"""
+Local load-testing harness
+Replays a recorded or synthetic log of /api/chat, /api/video/<id>/ask,
+/api/quiz and /api/flashcards requests against a gunicorn server it starts
+on this machine (or any --url), closed-loop at fixed concurrency or
+open-loop at fixed arrival rates, and reports latency percentiles, error
+rates, saturation throughput and per-worker memory as JSON.
+
+Record real traffic by running the app with TRAFFIC_LOG=traffic.jsonl.
+
+Usage:
+    python benchmarks/loadtest.py --workers 1,2,4 --concurrency 1,8,32
+    python benchmarks/loadtest.py --workers 2 --rates 50,100,200,400,800
+    python benchmarks/loadtest.py --log traffic.jsonl --replay-timing --speed 4
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --concurrency 16
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from run import REPO_DIR, summarize
+
+# Share of each request kind in a synthetic log
+TRAFFIC_MIX = (("chat", 0.6), ("video", 0.2), ("quiz", 0.1), ("flashcards", 0.1))
+
+CHAT_QUESTIONS = (
+    "What is an oligopoly?", "How do we measure market concentration?", "What are barriers to entry?",
+    "What is the Prisoner's Dilemma?", "What is Nash Equilibrium?", "Why is collusion unstable?",
+    "How does price leadership work?", "Why do oligopolies have rigid prices?",
+    "What is non-price competition?", "Give me examples of oligopoly", "oligopoly vs monopoly",
+    "difference between oligopoly and perfect competition", "explain the kinked demand curve",
+    "what is tacit collusion", "what is a dominant strategy", "what is OPEC", "hello",
+)
+VIDEO_QUESTIONS = (
+    "What does the video say about barriers to entry?", "Explain the payoff matrix",
+    "When does it talk about Nash equilibrium?", "What are the main points?", "price wars",
+)
+
+# Stop stepping up the arrival rate once a step breaks any of these
+MAX_ERROR_RATE = 0.01
+MIN_ACHIEVED_SHARE = 0.9
+
+VIDEO_PATH = re.compile(r"^/api/video/[^/]+/ask$")
+
+
+def route_of(path):
+    """Group /api/video/<id>/ask paths under one route label"""
+    path = path.split("?", 1)[0]
+    return "/api/video/<video_id>/ask" if VIDEO_PATH.match(path) else path
+
+
+def load_log(path):
+    """Read a JSONL traffic log of {"t", "method", "path", "body"} entries"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_log(count, video_ids, seed=0, rate=10.0):
+    """A seeded traffic log with Poisson arrivals at rate per second"""
+    rng = random.Random(seed)
+    kinds = [kind for kind, _ in TRAFFIC_MIX]
+    weights = [share for _, share in TRAFFIC_MIX]
+    log = []
+    elapsed = 0.0
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "video" and not video_ids:
+            kind = "chat"
+        if kind == "chat":
+            entry = {"method": "POST", "path": "/api/chat", "body": {"message": rng.choice(CHAT_QUESTIONS)}}
+        elif kind == "video":
+            entry = {"method": "POST", "path": f"/api/video/{rng.choice(video_ids)}/ask",
+                     "body": {"question": rng.choice(VIDEO_QUESTIONS)}}
+        else:
+            entry = {"method": "GET", "path": f"/api/{kind}", "body": None}
+        entry["t"] = round(elapsed, 4)
+        elapsed += rng.expovariate(rate)
+        log.append(entry)
+    return log
+
+
+class HttpClient:
+    """One keep-alive connection per thread, reopened whenever the server closes it"""
+
+    def __init__(self, base_url, timeout=30.0):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self):
+        if getattr(self.local, "connection", None) is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            connection.connect()
+            # http.client writes headers and body separately; without this, Nagle plus the
+            # server's delayed ACK add ~40ms to every POST on a reused connection
+            connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.local.connection = connection
+        return self.local.connection
+
+    def _close(self):
+        if getattr(self.local, "connection", None) is not None:
+            self.local.connection.close()
+            self.local.connection = None
+
+    def request(self, method, path, body=None):
+        """Return (status, body bytes); status 0 means a connection-level failure"""
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        try:
+            connection = self._connection()
+            connection.request(method, path, payload, headers)
+            response = connection.getresponse()
+            data = response.read()
+            if response.will_close:
+                self._close()
+            return response.status, data
+        except (OSError, http.client.HTTPException):
+            self._close()
+            return 0, b""
+
+    def send(self, entry):
+        return self.request(entry["method"], entry["path"], entry.get("body"))[0]
+
+
+def run_closed_loop(client, log, concurrency, duration):
+    """concurrency users each send their next request as soon as the last one answers"""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user(offset):
+        position = offset
+        local_samples = []
+        while time.perf_counter() < deadline:
+            entry = log[position % len(log)]
+            position += concurrency
+            started = time.perf_counter()
+            status = client.send(entry)
+            local_samples.append((route_of(entry["path"]), status, time.perf_counter() - started))
+        with lock:
+            samples.extend(local_samples)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(offset,)) for offset in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def poisson_arrivals(rate, duration, seed=0):
+    """Arrival offsets in seconds of a Poisson process at rate per second"""
+    rng = random.Random(seed)
+    arrivals = []
+    elapsed = rng.expovariate(rate)
+    while elapsed < duration:
+        arrivals.append(elapsed)
+        elapsed += rng.expovariate(rate)
+    return arrivals
+
+
+def run_open_loop(client, log, arrivals, max_in_flight=512):
+    """Send log entries at fixed arrival offsets, whether or not earlier requests have answered
+
+    Latency runs from the scheduled arrival, not the actual send, so time a
+    request spends queued behind a saturated server still counts.
+    """
+    samples = []
+    lock = threading.Lock()
+
+    def send(entry, scheduled):
+        status = client.send(entry)
+        with lock:
+            samples.append((route_of(entry["path"]), status, time.perf_counter() - scheduled))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for idx, offset in enumerate(arrivals):
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, log[idx % len(log)], started + offset)
+    return samples, time.perf_counter() - started
+
+
+def report(samples, elapsed, **settings):
+    """Overall and per-route latency percentiles, error rates and throughput"""
+    def stats(group):
+        errors = sum(1 for _, status, _ in group if not 200 <= status < 400)
+        result = summarize([latency for _, _, latency in group], elapsed) if group else {"calls": 0}
+        result.update(errors=errors, error_rate=round(errors / len(group), 4) if group else 0.0)
+        return result
+
+    routes = {}
+    for sample in samples:
+        routes.setdefault(sample[0], []).append(sample)
+    return dict(settings, elapsed_seconds=round(elapsed, 2), overall=stats(samples),
+                routes={route: stats(group) for route, group in sorted(routes.items())})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, port, threads=1, timeout=30.0):
+    """Start gunicorn on 127.0.0.1:port and wait until /api/status answers"""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    env.pop("TRAFFIC_LOG", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--workers", str(workers), "--threads", str(threads),
+         "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL)
+    client = HttpClient(f"http://127.0.0.1:{port}", timeout=1.0)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        if client.request("GET", "/api/status")[0] == 200:
+            return server
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"gunicorn did not answer on port {port} within {timeout:.0f}s")
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def worker_memory(server):
+    """RSS, PSS and private MB of each gunicorn worker, from /proc (empty off Linux)
+
+    PSS splits every shared page among the processes mapping it, so a worker's
+    PSS falling as workers are added shows the master's pages being shared.
+    """
+    workers = []
+    try:
+        with open(f"/proc/{server.pid}/task/{server.pid}/children") as f:
+            pids = [int(pid) for pid in f.read().split()]
+        for pid in pids:
+            fields = {}
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    if value.strip().endswith("kB"):
+                        fields[name] = int(value.split()[0])
+            workers.append({
+                "pid": pid,
+                "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+                "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+                "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+            })
+    except OSError:
+        return []
+    return workers
+
+
+def video_ids_of(client):
+    status, data = client.request("GET", "/api/videos")
+    return [video["id"] for video in json.loads(data)["videos"]] if status == 200 else []
+
+
+def run_suite(client, log, args):
+    """Every requested closed-loop and open-loop step against one running server"""
+    steps = []
+    saturation = 0.0
+    for concurrency in args.concurrency:
+        samples, elapsed = run_closed_loop(client, log, concurrency, args.duration)
+        step = report(samples, elapsed, mode="closed", concurrency=concurrency)
+        steps.append(step)
+        print(f"  closed c={concurrency}: {step['overall'].get('throughput_qps', 0)} req/s, "
+              f"p99 {step['overall'].get('p99_ms', 0)} ms", file=sys.stderr)
+        if step["overall"]["error_rate"] <= MAX_ERROR_RATE:
+            saturation = max(saturation, step["overall"].get("throughput_qps", 0.0))
+
+    for rate in args.rates:
+        samples, elapsed = run_open_loop(client, log, poisson_arrivals(rate, args.duration, args.seed))
+        step = report(samples, elapsed, mode="open", offered_rate=rate)
+        steps.append(step)
+        achieved = step["overall"].get("throughput_qps", 0.0)
+        print(f"  open {rate}/s: {achieved} req/s, p99 {step['overall'].get('p99_ms', 0)} ms", file=sys.stderr)
+        saturated = (step["overall"]["error_rate"] > MAX_ERROR_RATE or achieved < MIN_ACHIEVED_SHARE * rate
+                     or (args.slo_p99_ms and step["overall"].get("p99_ms", 0) > args.slo_p99_ms))
+        step["saturated"] = bool(saturated)
+        if saturated:
+            break
+        saturation = max(saturation, achieved)
+
+    if args.replay_timing:
+        arrivals = [(entry["t"] - log[0]["t"]) / args.speed for entry in log]
+        samples, elapsed = run_open_loop(client, log, arrivals)
+        steps.append(report(samples, elapsed, mode="replay", speed=args.speed))
+
+    return {"saturation_throughput_qps": saturation, "steps": steps}
+
+
+def parse_list(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay chat traffic against a local server")
+    parser.add_argument("--url", help="target an already running server instead of starting gunicorn")
+    parser.add_argument("--workers", type=parse_list, default=[2], help="gunicorn worker counts to compare")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument("--log", help="JSONL traffic log to replay (default: synthetic)")
+    parser.add_argument("--requests", type=int, default=2000, help="synthetic log length")
+    parser.add_argument("--concurrency", type=parse_list, default=[], help="closed-loop user counts, e.g. 1,8,32")
+    parser.add_argument("--rates", type=parse_list, default=[], help="open-loop arrival rates per second")
+    parser.add_argument("--replay-timing", action="store_true", help="replay the log at its recorded pace")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up for --replay-timing")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per closed or open-loop step")
+    parser.add_argument("--slo-p99-ms", type=float, help="open-loop steps above this p99 count as saturated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if not args.concurrency and not args.rates and not args.replay_timing:
+        args.concurrency = [1, 4, 16]
+
+    results = []
+    targets = [None] if args.url else args.workers
+    for workers in targets:
+        server = None
+        if workers is None:
+            base_url = args.url.rstrip("/")
+        else:
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            print(f"🚀 gunicorn with {workers} workers on {base_url}", file=sys.stderr)
+            server = start_server(workers, port, args.threads)
+        try:
+            client = HttpClient(base_url)
+            log = load_log(args.log) if args.log else synthetic_log(args.requests, video_ids_of(client), args.seed)
+            result = run_suite(client, log, args)
+            if server is not None:
+                result["worker_memory"] = worker_memory(server)
+        finally:
+            if server is not None:
+                stop_server(server)
+        results.append(dict(result, workers=workers, threads=args.threads if workers else None))
+
+    output = json.dumps({"url": args.url, "log": args.log, "duration": args.duration, "runs": results}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Wrote {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
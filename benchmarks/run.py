@@ -0,0 +1,177 @@
+"""
+Retrieval benchmark runner
+Each corpus size runs in a fresh subprocess that builds a synthetic corpus,
+loads it into the app and replays the fixed workload through
+find_relevant_topics, find_video_content and generate_ai_response.
+Throughput, p50/p95/p99 latency and peak RSS are written as JSON.
+
+Usage:
+    python benchmarks/run.py                                   # sizes 10,100,1000,10000
+    python benchmarks/run.py --sizes 10,1000000 --queries 500 --output results.json
+    python benchmarks/run.py --baseline results-main.json      # compare with an earlier run
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+# Untimed calls before measuring, so lazy setup is not counted
+WARMUP_QUERIES = 20
+
+
+def summarize(latencies, elapsed):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "calls": len(latencies),
+        "throughput_qps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(float(latencies_ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 4),
+    }
+
+
+def run_size(documents, queries, seed):
+    """Benchmark one corpus size in this process and return its result dict"""
+    # Build indexes from the synthetic corpus only: no snapshot, content database or stored transcripts
+    os.environ["INDEX_SNAPSHOT"] = ""
+    os.environ["CONTENT_DB"] = ""
+    os.environ["TRANSCRIPT_STORE"] = tempfile.mkdtemp(prefix="bench-store-")
+    os.environ.pop("METRICS_DIR", None)
+    sys.path.insert(0, REPO_DIR)
+    import app
+    from synthetic import generate_corpus
+    from workload import build_workload
+
+    started = time.perf_counter()
+    knowledge_base, video_transcripts = generate_corpus(documents, seed)
+    generate_seconds = time.perf_counter() - started
+
+    app.KNOWLEDGE_BASE.clear()
+    app.KNOWLEDGE_BASE.update(knowledge_base)
+    app.VIDEO_TRANSCRIPTS.clear()
+    app.VIDEO_TRANSCRIPTS.update(video_transcripts)
+    started = time.perf_counter()
+    app.reload_content()
+    build_seconds = time.perf_counter() - started
+
+    workload = build_workload(knowledge_base, video_transcripts, queries, seed)
+    functions = {
+        "find_relevant_topics": lambda query, video_id: app.find_relevant_topics(query),
+        "find_video_content": lambda query, video_id: app.find_video_content(query, video_id),
+        "generate_ai_response": lambda query, video_id: app.generate_ai_response(query, video_id=video_id),
+    }
+    results = {}
+    for name, function in functions.items():
+        for _, query, video_id in workload[:WARMUP_QUERIES]:
+            function(query, video_id)
+        latencies = []
+        run_started = time.perf_counter()
+        for _, query, video_id in workload:
+            call_started = time.perf_counter()
+            function(query, video_id)
+            latencies.append(time.perf_counter() - call_started)
+        results[name] = summarize(latencies, time.perf_counter() - run_started)
+
+    return {
+        "documents": documents,
+        "topics": len(knowledge_base),
+        "videos": len(video_transcripts),
+        "passages": len(app.PASSAGES),
+        "generate_seconds": round(generate_seconds, 3),
+        "build_seconds": round(build_seconds, 3),
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                             / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1),
+        "results": results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """Print p50/p99 changes against a baseline report of the same sizes"""
+    previous = {run["documents"]: run["results"] for run in baseline["runs"]}
+    for run in report["runs"]:
+        if run["documents"] not in previous:
+            continue
+        for name, result in run["results"].items():
+            before = previous[run["documents"]].get(name)
+            if not before:
+                continue
+            changes = "  ".join(
+                f"{metric} {before[metric]:.3f} -> {result[metric]:.3f} ms ({result[metric] / before[metric] - 1:+.0%})"
+                for metric in ("p50_ms", "p99_ms") if before[metric])
+            print(f"  {run['documents']:>8} {name:<22} {changes}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark retrieval and response generation")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated corpus sizes in documents (default: %(default)s)")
+    parser.add_argument("--queries", type=int, default=1000, help="workload length per size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single is not None:
+        # Child process: one size, result handed back through a file since the app prints at import
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(run_size(args.single, args.queries, args.seed), f)
+        return 0
+
+    runs = []
+    for documents in (int(size) for size in args.sizes.split(",")):
+        print(f"⏱️  {documents} documents...", file=sys.stderr)
+        with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--single", str(documents),
+                            "--queries", str(args.queries), "--seed", str(args.seed),
+                            "--result-file", result_file.name],
+                           check=True, stdout=subprocess.DEVNULL)
+            runs.append(json.load(result_file))
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "queries": args.queries,
+        "seed": args.seed,
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Wrote {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""
+Fixed query workload for the benchmarks
+A seeded mix of definition, comparison, example, why/how and video questions
+over the corpus topics, so every run replays the same queries in the same order
+"""
+
+import random
+
+# Share of each question kind in the workload
+QUESTION_MIX = (
+    ("definition", 0.35),
+    ("comparison", 0.15),
+    ("example", 0.15),
+    ("why_how", 0.10),
+    ("video", 0.25),
+)
+
+TEMPLATES = {
+    "definition": ("what is {a}", "define {a}", "explain {a} please", "{a}"),
+    "comparison": ("difference between {a} and {b}", "compare {a} vs {b}", "{a} vs {b}"),
+    "example": ("give me an example of {a}", "examples of {a} in practice"),
+    "why_how": ("why is {a} unstable", "how do we measure {a}", "why does {a} fail", "how does {a} work"),
+    "video": ("what does the video say about {a}", "{a}", "explain {a} from the video"),
+}
+
+
+def build_workload(knowledge_base, video_transcripts, count=1000, seed=0):
+    """Return [(kind, query, video_id or None)] of length count"""
+    rng = random.Random(seed)
+    topic_names = sorted(key.replace("_", " ") for key in knowledge_base)
+    video_ids = sorted(video_transcripts)
+    kinds = [kind for kind, _ in QUESTION_MIX]
+    weights = [share for _, share in QUESTION_MIX]
+
+    workload = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "video" and not video_ids:
+            kind = "definition"
+        template = rng.choice(TEMPLATES[kind])
+        if kind == "video":
+            video_id = rng.choice(video_ids)
+            topic = rng.choice(video_transcripts[video_id].get("topics") or topic_names)
+            workload.append((kind, template.format(a=topic), video_id))
+        else:
+            workload.append((kind, template.format(a=rng.choice(topic_names), b=rng.choice(topic_names)), None))
+    return workload
@@ -0,0 +1,248 @@
+"""
+Response caching for the chat endpoints
+Repeated questions are answered from a bounded LRU keyed on a normalized
+form of the question instead of re-running the response engine; near-duplicate
+questions can be matched by embedding similarity in a SemanticCache
+"""
+
+import math
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from retrieval import STOPWORDS, TOKEN_PATTERN, index_terms, tokenize
+
+# Question words steer generate_ai_response to different answers, so they stay in the key
+QUESTION_WORDS = frozenset({"what", "why", "how", "can", "do", "you", "me"})
+CACHE_STOPWORDS = STOPWORDS - QUESTION_WORDS
+
+
+def normalize_query(text):
+    """Fold case, punctuation, whitespace and stopwords: 'What is an Oligopoly?' -> 'what oligopoly'"""
+    return " ".join(word for word in TOKEN_PATTERN.findall(text.lower()) if word not in CACHE_STOPWORDS)
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with a size bound, per-entry TTL and hit/miss counters
+
+    Every lookup carries the current content version; when it differs from
+    the version the entries were stored under, the whole cache is dropped.
+    """
+
+    def __init__(self, max_size=2048, ttl=3600.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key, version=None):
+        """Return the cached value, or None on a miss"""
+        with self.lock:
+            self._check_version(version)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if self.clock() >= expires_at:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version=None):
+        with self.lock:
+            self._check_version(version)
+            self.entries[key] = (value, self.clock() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# "why" and "how" ask for a different answer than "what", so they stay as features;
+# phrasings of "what is X" are dropped so "define X" and "what's X?" embed alike
+EMBEDDING_QUESTION_WORDS = frozenset({"why", "how"})
+EMBEDDING_FILLER_WORDS = frozenset({"define", "definition", "explain", "meaning", "mean", "tell", "describe", "s"})
+
+
+class QuestionEmbedder:
+    """Hashed TF-IDF vectors of questions, weighted by document frequency in the knowledge base
+
+    Terms are hashed into a fixed number of signed buckets, so memory does not
+    grow with the vocabulary; terms the knowledge base never uses get the
+    highest IDF.
+    """
+
+    def __init__(self, documents, dim=1024):
+        self.dim = dim
+        frequencies = Counter()
+        count = 0
+        for text in documents:
+            frequencies.update(set(index_terms(text)))
+            count += 1
+        self.idf = {term: math.log((1 + count) / (1 + df)) + 1 for term, df in frequencies.items()}
+        self.unknown_idf = math.log(1 + count) + 1
+
+    def features(self, text):
+        return [token for token in tokenize(text)
+                if token in EMBEDDING_QUESTION_WORDS or (token not in STOPWORDS and token not in EMBEDDING_FILLER_WORDS)]
+
+    def embed(self, text):
+        """Unit float32 vector of the question, or None when no feature is left"""
+        counts = Counter(self.features(text))
+        if not counts:
+            return None
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term, tf in counts.items():
+            digest = zlib.crc32(term.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dim] += sign * (1 + math.log(tf)) * self.idf.get(term, self.unknown_idf)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+
+class SemanticCache:
+    """Bounded nearest-neighbour answer cache over question embeddings
+
+    Entries live in a preallocated matrix; a lookup is one matrix-vector
+    product over the entries of the same scope (a video id, or None for
+    general chat), and the best match is reused when its cosine similarity
+    reaches the threshold. LRU eviction, TTL and version invalidation work
+    like ResponseCache.
+    """
+
+    def __init__(self, dim=1024, max_size=2048, threshold=0.9, ttl=3600.0, clock=time.monotonic):
+        self.dim = dim
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self.vectors = np.zeros((max_size, dim), dtype=np.float32)
+        self.expires_at = np.zeros(max_size)
+        self.scopes = np.full(max_size, -1, dtype=np.int64)
+        self.values = [None] * max_size
+        # Slot -> None in least- to most-recently used order
+        self.recency = OrderedDict()
+        self.scope_ids = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.recency:
+                self.invalidations += 1
+            self._clear()
+            self.version = version
+
+    def _clear(self):
+        self.scopes[:] = -1
+        self.values = [None] * self.max_size
+        self.recency.clear()
+        self.scope_ids.clear()
+
+    def _best_match(self, vector, scope_id):
+        """(slot, similarity) of the closest live entry in the scope, or None"""
+        slots = np.flatnonzero((self.scopes == scope_id) & (self.expires_at > self.clock()))
+        if not len(slots):
+            return None
+        similarities = self.vectors[slots] @ vector
+        best = int(np.argmax(similarities))
+        return int(slots[best]), float(similarities[best])
+
+    def get(self, vector, scope=None, version=None):
+        """(value, similarity) of the nearest cached question above the threshold, or None"""
+        with self.lock:
+            self._check_version(version)
+            scope_id = self.scope_ids.get(scope)
+            match = self._best_match(vector, scope_id) if scope_id is not None else None
+            if match is None or match[1] < self.threshold:
+                self.misses += 1
+                return None
+            slot, similarity = match
+            self.recency.move_to_end(slot)
+            self.hits += 1
+            return self.values[slot], similarity
+
+    def put(self, vector, value, scope=None, version=None):
+        with self.lock:
+            self._check_version(version)
+            scope_id = self.scope_ids.setdefault(scope, len(self.scope_ids))
+            match = self._best_match(vector, scope_id)
+            if match is not None and match[1] >= 0.999:
+                # The same question again: refresh its entry rather than storing a twin
+                slot = match[0]
+            elif len(self.recency) < self.max_size:
+                # Slots fill in order and are only freed all at once, so the next free one is at the end
+                slot = len(self.recency)
+            else:
+                slot, _ = self.recency.popitem(last=False)
+                self.evictions += 1
+            self.vectors[slot] = vector
+            self.expires_at[slot] = self.clock() + self.ttl
+            self.scopes[slot] = scope_id
+            self.values[slot] = value
+            self.recency[slot] = None
+            self.recency.move_to_end(slot)
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.recency),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
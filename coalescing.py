@@ -0,0 +1,363 @@
+"""
+Request coalescing for the chat endpoints
+Concurrent requests for the same question share one computation: the first
+caller (the leader) runs it and everyone else waiting on the key gets its
+result. FileFlight extends this across gunicorn workers through lock files
+and a short-lived result store in a local directory.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+
+MISSING = object()
+
+
+class _Call:
+    __slots__ = ("done", "future", "result", "error", "role")
+
+    def __init__(self, future=None):
+        self.done = threading.Event()
+        self.future = future
+        self.result = None
+        self.error = None
+        self.role = "leader"
+
+
+class SingleFlight:
+    """One in-flight computation per key within a process
+
+    do() serves threads (the Flask workers) and ado() coroutines (the ASGI
+    handlers). Both return (result, role): "leader" for the caller that ran
+    it, "follower" for callers that waited on it, and "shared" when the
+    result came from another worker through the optional FileFlight.
+    """
+
+    def __init__(self, shared=None):
+        self.shared = shared
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.async_calls = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, "follower"
+
+        try:
+            if self.shared is not None:
+                call.result, call.role = self.shared.do(key, fn)
+            else:
+                call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, call.role
+
+    async def ado(self, key, fn):
+        """do() for a coroutine function fn, on the running event loop"""
+        call = self.async_calls.get(key)
+        if call is not None:
+            # shield: a cancelled follower must not cancel the leader's computation
+            return await asyncio.shield(call.future), "follower"
+
+        call = self.async_calls[key] = _Call(asyncio.get_running_loop().create_future())
+        try:
+            if self.shared is not None:
+                result, call.role = await self.shared.ado(key, fn)
+            else:
+                result = await fn()
+        except BaseException as e:
+            call.future.set_exception(e)
+            # Followers re-raise it; the leader's own raise below is the one that gets reported
+            call.future.exception()
+            raise
+        else:
+            call.future.set_result(result)
+        finally:
+            del self.async_calls[key]
+        return result, call.role
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls) + len(self.async_calls)
+
+
+class StreamAbandoned(Exception):
+    """The caller leading a shared stream stopped reading it before the end"""
+
+
+class _Broadcast:
+    __slots__ = ("items", "finished", "error", "condition")
+
+    def __init__(self, condition):
+        self.items = []
+        self.finished = False
+        self.error = None
+        self.condition = condition
+
+
+class StreamFlight:
+    """One in-flight stream per key within a process
+
+    The first caller (the leader) iterates the stream; callers that ask for
+    the same key while it runs replay the items produced so far and then
+    follow the leader's as they arrive, so the stream is produced once.
+    stream() serves threads and astream() coroutines, like SingleFlight.
+    An error in the leader's stream reaches every follower; a leader that
+    stops reading ends the followers' streams with StreamAbandoned.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = {}
+        self.async_streams = {}
+
+    def stream(self, key, produce):
+        """Yield the items of produce(), called once for all concurrent callers of key"""
+        with self.lock:
+            broadcast = self.streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self.streams[key] = _Broadcast(threading.Condition())
+        if not leader:
+            yield from self._follow(broadcast)
+            return
+
+        try:
+            for item in produce():
+                with broadcast.condition:
+                    broadcast.items.append(item)
+                    broadcast.condition.notify_all()
+                yield item
+        except GeneratorExit:
+            broadcast.error = StreamAbandoned()
+            raise
+        except BaseException as e:
+            broadcast.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.streams[key]
+            with broadcast.condition:
+                broadcast.finished = True
+                broadcast.condition.notify_all()
+
+    def _follow(self, broadcast):
+        position = 0
+        while True:
+            with broadcast.condition:
+                broadcast.condition.wait_for(lambda: position < len(broadcast.items) or broadcast.finished)
+                items = broadcast.items[position:]
+                finished = broadcast.finished
+            yield from items
+            position += len(items)
+            if finished:
+                if broadcast.error is not None:
+                    raise broadcast.error
+                return
+
+    async def astream(self, key, produce):
+        """stream() for an async generator function produce, on the running event loop"""
+        broadcast = self.async_streams.get(key)
+        if broadcast is not None:
+            async for item in self._afollow(broadcast):
+                yield item
+            return
+
+        broadcast = self.async_streams[key] = _Broadcast(asyncio.Condition())
+        try:
+            async for item in produce():
+                async with broadcast.condition:
+                    broadcast.items.append(item)
+                    broadcast.condition.notify_all()
+                yield item
+        except (GeneratorExit, asyncio.CancelledError):
+            broadcast.error = StreamAbandoned()
+            raise
+        except BaseException as e:
+            broadcast.error = e
+            raise
+        finally:
+            del self.async_streams[key]
+            broadcast.finished = True
+            async with broadcast.condition:
+                broadcast.condition.notify_all()
+
+    async def _afollow(self, broadcast):
+        position = 0
+        while True:
+            async with broadcast.condition:
+                await broadcast.condition.wait_for(lambda: position < len(broadcast.items) or broadcast.finished)
+                items = broadcast.items[position:]
+                finished = broadcast.finished
+            for item in items:
+                yield item
+            position += len(items)
+            if finished:
+                if broadcast.error is not None:
+                    raise broadcast.error
+                return
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.streams) + len(self.async_streams)
+
+
+class FileFlight:
+    """Coalesce across processes with flock()ed lock files in a local directory
+
+    Each key has its own lock file, so unrelated questions never wait on each
+    other. The process holding the lock computes the result and, when
+    publish(result) allows, publishes it as JSON; processes that had to wait
+    take the lock next and reuse a result published after they started
+    waiting, or compute their own when there is none. A waiter gives up after
+    wait_timeout seconds and computes on its own. ado() does its file I/O on
+    the default executor, so the event loop never blocks on the disk.
+    """
+
+    def __init__(self, directory, wait_timeout=30.0, poll_interval=0.005, result_ttl=60.0, publish=None):
+        self.directory = directory
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.publish = publish or (lambda result: True)
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _digest(self, key):
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def _lock_path(self, key):
+        return os.path.join(self.directory, f"lock_{self._digest(key)}.lock")
+
+    def _result_path(self, key):
+        return os.path.join(self.directory, f"result_{self._digest(key)}.json")
+
+    def _acquire(self, key):
+        """A locked descriptor of the key's lock file, or None while another process holds it"""
+        path = self._lock_path(key)
+        while True:
+            fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+            try:
+                current = os.stat(path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current == os.fstat(fd).st_ino:
+                return fd
+            # prune() unlinked the file after we opened it; lock the one now at the path
+            os.close(fd)
+
+    def _release(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _read(self, key, since):
+        """The result published for key at or after `since`, else MISSING"""
+        try:
+            with open(self._result_path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return MISSING
+        if entry.get("key") != repr(key) or entry.get("written_at", 0) < since:
+            return MISSING
+        return entry["result"]
+
+    def _write(self, key, result):
+        path = self._result_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": repr(key), "written_at": time.time(), "result": result}, f)
+        os.replace(tmp_path, path)
+        self.writes += 1
+        if self.writes % 256 == 0:
+            self.prune()
+
+    def prune(self):
+        """Delete published results and idle lock files older than result_ttl"""
+        cutoff = time.time() - self.result_ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if name.startswith("result_"):
+                    os.unlink(path)
+                elif name.startswith("lock_"):
+                    fd = os.open(path, os.O_RDWR)
+                    try:
+                        # Only a lock nobody holds; waiters that opened it notice the unlink in _acquire
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        os.unlink(path)
+                    finally:
+                        os.close(fd)
+            except OSError:
+                pass
+
+    def do(self, key, fn):
+        started = time.time()
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            fd = self._acquire(key)
+            if fd is not None:
+                break
+            if time.monotonic() >= deadline:
+                return fn(), "leader"
+            waited = True
+            time.sleep(self.poll_interval)
+        try:
+            if waited:
+                result = self._read(key, started)
+                if result is not MISSING:
+                    return result, "shared"
+            result = fn()
+            if self.publish(result):
+                self._write(key, result)
+            return result, "leader"
+        finally:
+            self._release(fd)
+
+    async def ado(self, key, fn):
+        started = time.time()
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            fd = await asyncio.to_thread(self._acquire, key)
+            if fd is not None:
+                break
+            if time.monotonic() >= deadline:
+                return await fn(), "leader"
+            waited = True
+            await asyncio.sleep(self.poll_interval)
+        try:
+            if waited:
+                result = await asyncio.to_thread(self._read, key, started)
+                if result is not MISSING:
+                    return result, "shared"
+            result = await fn()
+            if self.publish(result):
+                await asyncio.to_thread(self._write, key, result)
+            return result, "leader"
+        finally:
+            await asyncio.to_thread(self._release, fd)
@@ -0,0 +1,291 @@
+"""
+SQLite content store with FTS5 search
+Topics, transcripts, passages, quiz questions and flashcards live in one
+database file, so content can change without a redeploy. Workers open it
+read-only and memory-mapped, so every gunicorn worker reads the same pages of
+the OS page cache instead of holding its own copy, and chat retrieval runs as
+ranked FTS5 queries.
+
+Usage:
+    python content_db.py                     # writes data/content.db from the embedded content
+    python content_db.py --output /tmp/content.db
+    python content_db.py --query "why do cartels break down"
+    CONTENT_DB=data/content.db gunicorn app:app
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from corpus import Passage
+from index_snapshot import BASE_DIR
+from retrieval import PASSAGE_FIELD_WEIGHTS, TOPIC_FIELD_WEIGHTS, TRANSCRIPT_FIELD_WEIGHTS, flatten_text, index_terms
+
+DEFAULT_CONTENT_DB = os.path.join(BASE_DIR, "data", "content.db")
+
+SCHEMA_VERSION = 1
+
+# Bytes of the database file each connection memory-maps
+DEFAULT_MMAP_BYTES = 256 * 1024 * 1024
+
+# Idle connections kept per worker; busier moments open extra ones and close them after
+DEFAULT_POOL_SIZE = 4
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE topics (key TEXT PRIMARY KEY, position INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE TABLE transcripts (video_id TEXT PRIMARY KEY, position INTEGER NOT NULL, title TEXT NOT NULL,
+                          topics TEXT NOT NULL, content TEXT NOT NULL);
+CREATE TABLE passages (id INTEGER PRIMARY KEY, video_id TEXT NOT NULL, start_ms INTEGER NOT NULL,
+                       end_ms INTEGER NOT NULL, text TEXT NOT NULL);
+CREATE INDEX passages_video ON passages (video_id);
+CREATE TABLE videos (position INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE quiz_questions (position INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE flashcards (position INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE VIRTUAL TABLE topics_fts USING fts5(key UNINDEXED, title, keywords, definition, sections,
+                                           tokenize='porter unicode61');
+CREATE VIRTUAL TABLE transcripts_fts USING fts5(video_id UNINDEXED, title, topics, body,
+                                                tokenize='porter unicode61');
+CREATE VIRTUAL TABLE passages_fts USING fts5(text, content='passages', content_rowid='id',
+                                             tokenize='porter unicode61');
+"""
+
+# bm25() column weights, in column order, matching the in-process BM25 field weights
+TOPIC_WEIGHTS = (0.0, TOPIC_FIELD_WEIGHTS["title"], TOPIC_FIELD_WEIGHTS["keywords"],
+                 TOPIC_FIELD_WEIGHTS["definition"], TOPIC_FIELD_WEIGHTS["sections"])
+TRANSCRIPT_WEIGHTS = (0.0, TRANSCRIPT_FIELD_WEIGHTS["title"], TRANSCRIPT_FIELD_WEIGHTS["topics"],
+                      TRANSCRIPT_FIELD_WEIGHTS["body"])
+PASSAGE_WEIGHTS = (PASSAGE_FIELD_WEIGHTS["body"],)
+
+
+class ContentDBError(Exception):
+    """The content database is missing or was written by an incompatible version"""
+
+
+def match_expression(text):
+    """FTS5 query matching any indexed term of the text, or None when it has none"""
+    terms = dict.fromkeys(index_terms(text))
+    return " OR ".join(f'"{term}"' for term in terms) or None
+
+
+def write_content_db(path, knowledge_base, video_transcripts, videos, quiz_questions, flashcards, passages,
+                     fingerprint):
+    """Write every piece of content and its FTS indexes to a new database at path
+
+    Passages keep their position in `passages` as their id, so ids returned by
+    search_passages index the app's PassageStore directly.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = f"{path}.partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    db = sqlite3.connect(partial)
+    try:
+        with db:
+            db.executescript(SCHEMA)
+            db.executemany("INSERT INTO meta VALUES (?, ?)",
+                           [("schema_version", str(SCHEMA_VERSION)), ("fingerprint", fingerprint)])
+            for position, (topic_key, topic) in enumerate(knowledge_base.items()):
+                db.execute("INSERT INTO topics VALUES (?, ?, ?)", (topic_key, position, json.dumps(topic)))
+                sections = [value for field, value in topic.items() if field not in ("definition", "keywords")]
+                db.execute("INSERT INTO topics_fts VALUES (?, ?, ?, ?, ?)",
+                           (topic_key, topic_key.replace("_", " "), flatten_text(topic.get("keywords", [])),
+                            topic.get("definition", ""), flatten_text(sections)))
+            for position, (video_id, transcript) in enumerate(video_transcripts.items()):
+                title = transcript.get("title", "")
+                content = transcript.get("content", "").strip()
+                db.execute("INSERT INTO transcripts VALUES (?, ?, ?, ?, ?)",
+                           (video_id, position, title, json.dumps(transcript.get("topics", [])), content))
+                db.execute("INSERT INTO transcripts_fts VALUES (?, ?, ?, ?)",
+                           (video_id, title, flatten_text(transcript.get("topics", [])), content))
+            db.executemany("INSERT INTO passages VALUES (?, ?, ?, ?, ?)",
+                           ((idx, passage.video_id, passage.start_ms, passage.end_ms, passage.text)
+                            for idx, passage in enumerate(passages)))
+            db.execute("INSERT INTO passages_fts (passages_fts) VALUES ('rebuild')")
+            for table, rows in (("videos", videos), ("quiz_questions", quiz_questions), ("flashcards", flashcards)):
+                db.executemany(f"INSERT INTO {table} VALUES (?, ?)",
+                               ((position, json.dumps(row)) for position, row in enumerate(rows)))
+            db.execute("INSERT INTO topics_fts (topics_fts) VALUES ('optimize')")
+            db.execute("INSERT INTO transcripts_fts (transcripts_fts) VALUES ('optimize')")
+            db.execute("INSERT INTO passages_fts (passages_fts) VALUES ('optimize')")
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    os.replace(partial, path)
+
+
+class ContentDB:
+    """Read-only access to a content database through a per-process connection pool
+
+    Connections are opened lazily and never cross a fork: a pool inherited
+    from the gunicorn master is dropped, so each worker opens its own.
+    """
+
+    def __init__(self, path, pool_size=DEFAULT_POOL_SIZE, mmap_bytes=DEFAULT_MMAP_BYTES):
+        if not os.path.exists(path):
+            raise ContentDBError(f"{path} does not exist (run python content_db.py)")
+        self.path = path
+        self.pool_size = pool_size
+        self.mmap_bytes = mmap_bytes
+        self.lock = threading.Lock()
+        self.pid = None
+        self.idle = []
+        try:
+            version = self.meta().get("schema_version")
+        except sqlite3.DatabaseError as e:
+            raise ContentDBError(f"{path} is not a content database: {e}") from None
+        if version != str(SCHEMA_VERSION):
+            raise ContentDBError(f"{path} has schema version {version}, expected {SCHEMA_VERSION}")
+
+    def _connect(self):
+        db = sqlite3.connect(f"file:{quote(os.path.abspath(self.path))}?mode=ro", uri=True, check_same_thread=False)
+        db.execute(f"PRAGMA mmap_size = {int(self.mmap_bytes)}")
+        db.execute("PRAGMA query_only = 1")
+        return db
+
+    @contextmanager
+    def connection(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # The parent's connections belong to the parent; abandon rather than close them
+                self.pid = os.getpid()
+                self.idle = []
+            db = self.idle.pop() if self.idle else None
+        if db is None:
+            db = self._connect()
+        try:
+            yield db
+        finally:
+            with self.lock:
+                if self.pid == os.getpid() and len(self.idle) < self.pool_size:
+                    self.idle.append(db)
+                    db = None
+            if db is not None:
+                db.close()
+
+    def query(self, sql, params=()):
+        with self.connection() as db:
+            return db.execute(sql, params).fetchall()
+
+    def meta(self):
+        return dict(self.query("SELECT key, value FROM meta"))
+
+    def content(self):
+        """(knowledge_base, video_transcripts, videos, quiz_questions, flashcards) shaped like the app's literals
+
+        Transcripts carry their title and topics only: their text stays in the
+        database and is read a passage at a time through passages().
+        """
+        knowledge_base = {key: json.loads(data) for key, data in
+                          self.query("SELECT key, data FROM topics ORDER BY position")}
+        video_transcripts = {video_id: {"title": title, "topics": json.loads(topics)}
+                             for video_id, title, topics in
+                             self.query("SELECT video_id, title, topics FROM transcripts ORDER BY position")}
+        videos, quiz_questions, flashcards = (
+            [json.loads(data) for data, in self.query(f"SELECT data FROM {table} ORDER BY position")]
+            for table in ("videos", "quiz_questions", "flashcards"))
+        return knowledge_base, video_transcripts, videos, quiz_questions, flashcards
+
+    def passages(self):
+        return StoredPassages(self)
+
+    def search_topics(self, text, k=3):
+        """[(topic_key, score)] best first; scores are negated FTS5 bm25, higher is better"""
+        expression = match_expression(text)
+        if expression is None:
+            return []
+        return self.query(
+            f"SELECT key, -bm25(topics_fts, {', '.join(map(str, TOPIC_WEIGHTS))}) AS score FROM topics_fts "
+            "WHERE topics_fts MATCH ? ORDER BY score DESC LIMIT ?", (expression, k))
+
+    def search_transcripts(self, text, video_id=None, k=10):
+        """[(video_id, score)] best first, of one video or of every video"""
+        expression = match_expression(text)
+        if expression is None:
+            return []
+        sql = (f"SELECT video_id, -bm25(transcripts_fts, {', '.join(map(str, TRANSCRIPT_WEIGHTS))}) AS score "
+               "FROM transcripts_fts WHERE transcripts_fts MATCH ?")
+        params = (expression,)
+        if video_id:
+            sql += " AND video_id = ?"
+            params += (video_id,)
+        return self.query(sql + " ORDER BY score DESC LIMIT ?", params + (k,))
+
+    def search_passages(self, text, video_id=None, k=3):
+        """[(passage id, score)] best first, of one video or of every video"""
+        expression = match_expression(text)
+        if expression is None:
+            return []
+        sql = (f"SELECT passages_fts.rowid, -bm25(passages_fts, {', '.join(map(str, PASSAGE_WEIGHTS))}) AS score "
+               "FROM passages_fts")
+        params = (expression,)
+        if video_id:
+            sql += " JOIN passages ON passages.id = passages_fts.rowid WHERE passages_fts MATCH ? AND passages.video_id = ?"
+            params += (video_id,)
+        else:
+            sql += " WHERE passages_fts MATCH ?"
+        return self.query(sql + " ORDER BY score DESC LIMIT ?", params + (k,))
+
+
+class StoredPassages:
+    """The database's passages behind the PassageStore interface, read on access
+
+    Only the (start, end) id range of each video is held in memory.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.count = db.query("SELECT COUNT(*) FROM passages")[0][0]
+        self.ranges = {video_id: (start, end) for video_id, start, end in
+                       db.query("SELECT video_id, MIN(id), MAX(id) + 1 FROM passages GROUP BY video_id")}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        rows = self.db.query("SELECT video_id, start_ms, end_ms, text FROM passages WHERE id = ?", (int(idx),))
+        if not rows:
+            raise IndexError(idx)
+        return Passage(*rows[0])
+
+    def __iter__(self):
+        with self.db.connection() as db:
+            for row in db.execute("SELECT video_id, start_ms, end_ms, text FROM passages ORDER BY id"):
+                yield Passage(*row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the SQLite content store, or query it")
+    parser.add_argument("--output", default=os.environ.get("CONTENT_DB") or DEFAULT_CONTENT_DB,
+                        help="database path (default: %(default)s)")
+    parser.add_argument("--query", help="search an existing database instead of writing one")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.query:
+        db = ContentDB(args.output)
+        for kind, results in (("topic", db.search_topics(args.query, args.k)),
+                              ("passage", db.search_passages(args.query, k=args.k))):
+            for key, score in results:
+                print(f"{score:8.3f}  {kind}:{key}")
+        return 0
+
+    # Export the embedded content and full transcript store, not a database or snapshot written before
+    os.environ["CONTENT_DB"] = ""
+    os.environ["INDEX_SNAPSHOT"] = ""
+    import app
+
+    write_content_db(args.output, app.KNOWLEDGE_BASE, app.VIDEO_TRANSCRIPTS, app.YOUTUBE_VIDEOS, app.QUIZ_QUESTIONS,
+                     app.FLASHCARDS, app.PASSAGES, app.SOURCE_FINGERPRINT)
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"✅ Wrote {args.output} ({size_mb:.1f} MB, {len(app.KNOWLEDGE_BASE)} topics, {len(app.PASSAGES)} passages)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
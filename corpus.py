@@ -0,0 +1,189 @@
+"""
+Normalized corpus for the study assistant
+Lowercased text, tokens and transcript passages are prepared once at load time so
+request handling only reads precomputed views
+"""
+
+import numpy as np
+
+from retrieval import STOPWORDS, WHITESPACE_PATTERN, TextTable, flatten_text, tokenize
+
+# Speaking rate used to estimate timings for transcripts stored without segments
+WORDS_PER_SECOND = 2.5
+
+# Passage window and overlap, in words
+PASSAGE_WORDS = 80
+PASSAGE_OVERLAP_WORDS = 20
+
+
+class NormalizedText:
+    """One block of text with its lowercase form and tokens"""
+
+    __slots__ = ("text", "lower", "tokens", "terms")
+
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self.tokens = tuple(tokenize(text))
+        self.terms = tuple(token for token in self.tokens if token not in STOPWORDS)
+
+
+def estimate_segments(text, words_per_second=WORDS_PER_SECOND):
+    """Split plain transcript text into line segments with estimated timings"""
+    segments = []
+    elapsed = 0.0
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        duration = len(line.split()) / words_per_second
+        segments.append({"text": line, "start": elapsed, "duration": duration})
+        elapsed += duration
+    return segments
+
+
+class Passage:
+    """An overlapping, timestamped window of a video transcript"""
+
+    __slots__ = ("video_id", "start_ms", "end_ms", "text")
+
+    def __init__(self, video_id, start_ms, end_ms, text):
+        self.video_id = video_id
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.text = text
+
+    def to_dict(self):
+        return {
+            "video_id": self.video_id,
+            "start_ms": self.start_ms,
+            "end_ms": self.end_ms,
+            "text": self.text,
+        }
+
+
+class PassageStore:
+    """Passages of every video held in flat arrays and materialized on access
+
+    Passages of one video are contiguous; ranges maps a video id to its
+    (start, end) slice.
+    """
+
+    def __init__(self, video_ids, video_starts, start_ms, end_ms, texts):
+        self.video_ids = video_ids
+        self.video_starts = video_starts
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.texts = texts
+        self.ranges = {video_id: (int(video_starts[i]), int(video_starts[i + 1]))
+                       for i, video_id in enumerate(video_ids)}
+
+    @classmethod
+    def from_passages(cls, video_ids, passages):
+        """Pack passages that are already grouped by video in video_ids order"""
+        counts = np.zeros(len(video_ids) + 1, dtype=np.int64)
+        positions = {video_id: i for i, video_id in enumerate(video_ids)}
+        for passage in passages:
+            counts[positions[passage.video_id] + 1] += 1
+        return cls(
+            list(video_ids),
+            np.cumsum(counts),
+            np.array([passage.start_ms for passage in passages], dtype=np.int64),
+            np.array([passage.end_ms for passage in passages], dtype=np.int64),
+            TextTable.from_strings(passage.text for passage in passages),
+        )
+
+    def state(self):
+        """Arrays and JSON metadata that fully describe the store"""
+        arrays = {"video_starts": self.video_starts, "start_ms": self.start_ms, "end_ms": self.end_ms,
+                  "text_buffer": self.texts.buffer, "text_offsets": self.texts.offsets}
+        return arrays, {"video_ids": self.video_ids}
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        return cls(meta["video_ids"], arrays["video_starts"], arrays["start_ms"], arrays["end_ms"],
+                   TextTable(arrays["text_buffer"], arrays["text_offsets"]))
+
+    def __len__(self):
+        return len(self.start_ms)
+
+    def __getitem__(self, idx):
+        video_idx = int(np.searchsorted(self.video_starts, idx, side="right")) - 1
+        return Passage(self.video_ids[video_idx], int(self.start_ms[idx]), int(self.end_ms[idx]), self.texts[idx])
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+
+def chunk_segments(video_id, segments, window_words=PASSAGE_WORDS, overlap_words=PASSAGE_OVERLAP_WORDS):
+    """Group transcript segments into passages of about window_words that overlap by overlap_words"""
+    texts = [WHITESPACE_PATTERN.sub(" ", segment["text"]).strip() for segment in segments]
+    word_counts = [len(text.split()) for text in texts]
+    passages = []
+    first = 0
+    while first < len(segments):
+        last = first
+        words = 0
+        while last < len(segments) and words < window_words:
+            words += word_counts[last]
+            last += 1
+
+        start = segments[first]["start"]
+        end = segments[last - 1]["start"] + segments[last - 1].get("duration", 0)
+        text = " ".join(text for text in texts[first:last] if text)
+        passages.append(Passage(video_id, round(start * 1000), round(end * 1000), text))
+        if last >= len(segments):
+            break
+
+        # Step back over whole segments until the overlap is covered
+        next_first = last
+        carried = 0
+        while next_first - 1 > first and carried < overlap_words:
+            next_first -= 1
+            carried += word_counts[next_first]
+        first = next_first
+    return passages
+
+
+class CorpusEntry:
+    """A knowledge base topic or video transcript split into normalized fields"""
+
+    __slots__ = ("key", "fields")
+
+    def __init__(self, key, fields):
+        self.key = key
+        self.fields = {name: NormalizedText(text) for name, text in fields.items()}
+
+
+class NormalizedCorpus:
+    """Normalized views of every KNOWLEDGE_BASE topic and VIDEO_TRANSCRIPTS entry"""
+
+    def __init__(self, knowledge_base, video_transcripts):
+        self.topics = {}
+        for topic_key, topic_data in knowledge_base.items():
+            sections = [value for field, value in topic_data.items() if field not in ("definition", "keywords")]
+            self.topics[topic_key] = CorpusEntry(topic_key, {
+                "title": topic_key.replace("_", " "),
+                "keywords": flatten_text(topic_data.get("keywords", [])),
+                "definition": topic_data.get("definition", ""),
+                "sections": flatten_text(sections),
+            })
+
+        self.videos = {}
+        for video_id, video_data in video_transcripts.items():
+            self.videos[video_id] = CorpusEntry(video_id, {
+                "title": video_data.get("title", ""),
+                "topics": flatten_text(video_data.get("topics", [])),
+                "body": video_data.get("content", "").strip(),
+            })
+
+        passages = []
+        for video_id, video_data in video_transcripts.items():
+            if video_data.get("passages"):
+                # Already chunked by the ingestion pipeline
+                passages.extend(Passage(video_id, passage["start_ms"], passage["end_ms"], passage["text"])
+                                for passage in video_data["passages"])
+            else:
+                segments = video_data.get("segments") or estimate_segments(video_data.get("content", ""))
+                passages.extend(chunk_segments(video_id, segments))
+        self.passages = PassageStore.from_passages(list(video_transcripts), passages)
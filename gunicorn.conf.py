@@ -0,0 +1,28 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts in this directory
+The master imports app.py once (preload) and workers are forked from it, so
+the content and the search and vector indexes are built a single time and
+their pages are shared copy-on-write instead of duplicated per worker
+
+Set GUNICORN_PRELOAD=0 to import the app in every worker instead, e.g. to
+have a HUP reload pick up code changes.
+"""
+
+import gc
+import os
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+
+def when_ready(server):
+    # Embed the vectors /api/search needs here, once, rather than in every
+    # worker on its first semantic search
+    if preload_app:
+        import app
+        app.preload_vectors()
+
+
+def pre_fork(server, worker):
+    # Move everything the master built into the permanent generation: the
+    # workers' collections then never write GC headers into the shared pages
+    gc.freeze()
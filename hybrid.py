@@ -0,0 +1,133 @@
+"""
+Hybrid retrieval for the study assistant
+A lexical (BM25) ranker and a vector ranker run side by side, each within its
+own latency budget, and their rankings are merged by reciprocal-rank fusion.
+Fusing ranks rather than scores needs no calibration between BM25 scores and
+cosine similarities.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# Damping constant of reciprocal-rank fusion: larger values flatten the advantage of the top ranks
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, weights=None, k=RRF_K):
+    """Fuse {arm: [key, ...] best first} into [(key, score)] best first
+
+    A key scores the sum of weight / (k + rank) over the rankings that hold
+    it. Ties keep the order in which the keys were first seen.
+    """
+    fused = {}
+    for arm, keys in rankings.items():
+        weight = 1.0 if weights is None else weights.get(arm, 1.0)
+        for rank, key in enumerate(keys, 1):
+            fused[key] = fused.get(key, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+class HybridRanker:
+    """Run ranking arms in parallel and fuse the rankings that arrive in time
+
+    An arm is a function returning [(key, score)] best first, scored on its
+    own scale. Each arm gets a budget in seconds from the start of rank(); one
+    that raises or misses its budget is left out of the fusion and is
+    reported to on_arm(arm, outcome, seconds) as "error" or "timeout".
+
+    A late arm cannot be interrupted and keeps its worker until it returns,
+    so at most max_workers arms are in flight at once: while they are all
+    busy, further arms are reported as "skipped", and when no arm of a rank()
+    could start, the first one runs in the caller's thread instead.
+    """
+
+    def __init__(self, budgets, weights=None, k=RRF_K, max_workers=8, on_arm=None):
+        self.budgets = budgets
+        self.weights = weights
+        self.k = k
+        self.on_arm = on_arm
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hybrid")
+        self.lock = threading.Lock()
+        self.in_flight = 0
+
+    @staticmethod
+    def _timed(fn):
+        started = time.perf_counter()
+        return fn(), time.perf_counter() - started
+
+    def _report(self, arm, outcome, seconds):
+        if self.on_arm is not None:
+            self.on_arm(arm, outcome, seconds)
+
+    def _submit(self, fn):
+        """A future running fn on a free worker, or None while every worker is taken"""
+        with self.lock:
+            if self.in_flight >= self.max_workers:
+                return None
+            self.in_flight += 1
+        # Arms run in copies of the caller's context, so they see its context variables
+        future = self.executor.submit(contextvars.copy_context().run, self._timed, fn)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _fuse(self, rankings):
+        """[(key, fused score, {arm: the arm's own score})] best first"""
+        scores = {}
+        for arm, ranked in rankings.items():
+            for key, score in ranked:
+                scores.setdefault(key, {})[arm] = score
+        fused = reciprocal_rank_fusion({arm: [key for key, _ in ranked] for arm, ranked in rankings.items()},
+                                       self.weights, self.k)
+        return [(key, fused_score, scores[key]) for key, fused_score in fused]
+
+    def rank(self, arms):
+        """Fused [(key, fused score, {arm: score})] of {arm: function}; a single arm runs inline without a budget"""
+        if len(arms) == 1:
+            (arm, fn), = arms.items()
+            ranked, seconds = self._timed(fn)
+            self._report(arm, "ok", seconds)
+            return self._fuse({arm: ranked})
+
+        started = time.perf_counter()
+        futures = {}
+        for arm, fn in arms.items():
+            future = self._submit(fn)
+            if future is None:
+                self._report(arm, "skipped", 0.0)
+            else:
+                futures[arm] = future
+        if not futures:
+            # Every worker is held by late arms; answer from the first arm rather than not at all
+            arm, fn = next(iter(arms.items()))
+            ranked, seconds = self._timed(fn)
+            self._report(arm, "ok", seconds)
+            return self._fuse({arm: ranked})
+
+        rankings = {}
+        errors = []
+        for arm, future in futures.items():
+            remaining = started + self.budgets[arm] - time.perf_counter()
+            try:
+                rankings[arm], seconds = future.result(timeout=max(remaining, 0))
+            except FutureTimeout:
+                # Frees the worker at once if the arm has not started yet
+                future.cancel()
+                self._report(arm, "timeout", time.perf_counter() - started)
+                continue
+            except Exception as e:
+                errors.append(e)
+                self._report(arm, "error", time.perf_counter() - started)
+                continue
+            self._report(arm, "ok", seconds)
+
+        # Failing every arm is a bug worth surfacing, not an empty result
+        if errors and not rankings:
+            raise errors[0]
+        return self._fuse(rankings)
@@ -0,0 +1,245 @@
+"""
+Versioned on-disk snapshot of the prepared search indexes
+Building the indexes is an offline step; at import the app memory-maps the
+snapshot so cold-start time stays flat as the corpus grows
+
+File layout:
+    8 bytes   magic b"STUDYIDX"
+    4 bytes   format version (little-endian uint32)
+    4 bytes   header length (little-endian uint32)
+    header    UTF-8 JSON: metadata plus dtype/shape/offset of every array
+    padding   to a 64-byte boundary, then each array 64-byte aligned
+
+Usage:
+    python index_snapshot.py                 # writes data/index.snapshot
+    python index_snapshot.py --output /tmp/index.snapshot
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from corpus import NormalizedCorpus, PassageStore
+from retrieval import BM25Index, NgramIndex, build_passage_index, build_topic_index, build_transcript_index
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SNAPSHOT = os.path.join(BASE_DIR, "data", "index.snapshot")
+
+MAGIC = b"STUDYIDX"
+# Bump whenever the layout or meaning of any stored array changes
+SNAPSHOT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGNMENT = 64
+
+# Characters of each definition covered by the trigram similarity index
+DEFINITION_PREFIX = 200
+
+
+class SnapshotError(Exception):
+    """The file is not a snapshot this code can read"""
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_snapshot(path, arrays, meta):
+    """Atomically write named arrays plus JSON metadata to path"""
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"meta": meta, "arrays": layout}).encode("utf-8")
+    data_start = _aligned(PREAMBLE.size + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """Memory-map a snapshot and return (read-only array views, metadata)"""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < PREAMBLE.size:
+        raise SnapshotError(f"{path} is truncated")
+    magic, version, header_length = PREAMBLE.unpack_from(buffer)
+    if magic != MAGIC:
+        raise SnapshotError(f"{path} is not an index snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"{path} has format version {version}, expected {SNAPSHOT_VERSION}")
+
+    header = json.loads(buffer[PREAMBLE.size:PREAMBLE.size + header_length].decode("utf-8"))
+    data_start = _aligned(PREAMBLE.size + header_length)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        if count == 0:
+            arrays[name] = np.empty(spec["shape"], dtype=dtype)
+        else:
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                         offset=data_start + spec["offset"]).reshape(spec["shape"])
+    return arrays, header["meta"]
+
+
+def share_arrays(arrays):
+    """Copy named arrays into one anonymous shared mapping and return read-only views
+
+    The mapping is separate from the Python heap, so refcount and GC writes
+    never land on its pages: after a fork every worker reads the same physical
+    pages, as with a memory-mapped snapshot.
+    """
+    layout = {}
+    size = 0
+    for name, array in arrays.items():
+        layout[name] = size
+        size = _aligned(size + array.nbytes)
+    buffer = mmap.mmap(-1, max(size, ALIGNMENT))
+    shared = {}
+    for name, array in arrays.items():
+        if array.size == 0:
+            view = np.empty(array.shape, dtype=array.dtype)
+        else:
+            view = np.frombuffer(buffer, dtype=array.dtype, count=array.size, offset=layout[name]).reshape(array.shape)
+            view[...] = array
+        view.flags.writeable = False
+        shared[name] = view
+    return shared
+
+
+def content_fingerprint(knowledge_base, video_transcripts, transcript_store):
+    """Hash of the embedded content plus the transcript store listing
+
+    Stored transcripts contribute their file names, sizes and modification
+    times only, so checking a snapshot for staleness never has to read the
+    store, yet a re-ingested transcript of the same size still counts as new.
+    """
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    digest.update(json.dumps([knowledge_base, video_transcripts], sort_keys=True).encode("utf-8"))
+    if os.path.isdir(transcript_store):
+        for entry in sorted(os.scandir(transcript_store), key=lambda entry: entry.name):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SearchIndexes:
+    """Every prepared index the request path reads, built or loaded together"""
+
+    def __init__(self, topic_index, transcript_index, passage_index, definition_index, passages, videos):
+        self.topic_index = topic_index
+        self.transcript_index = transcript_index
+        self.passage_index = passage_index
+        self.definition_index = definition_index
+        self.passages = passages
+        # {video_id: {"title", "topics"}} so stored transcripts need not be read at boot
+        self.videos = videos
+
+    def _components(self):
+        return {
+            "topics": self.topic_index,
+            "transcripts": self.transcript_index,
+            "passage_index": self.passage_index,
+            "definitions": self.definition_index,
+            "passages": self.passages,
+        }
+
+    @classmethod
+    def build(cls, knowledge_base, video_transcripts):
+        corpus = NormalizedCorpus(knowledge_base, video_transcripts)
+        return cls(
+            build_topic_index(corpus.topics),
+            build_transcript_index(corpus.videos),
+            build_passage_index(corpus.passages),
+            NgramIndex(entry.fields["definition"].lower[:DEFINITION_PREFIX] for entry in corpus.topics.values()),
+            corpus.passages,
+            {video_id: {"title": video.get("title", ""), "topics": video.get("topics", [])}
+             for video_id, video in video_transcripts.items()},
+        )
+
+    def state(self):
+        """Arrays and JSON metadata that fully describe every index"""
+        arrays = {}
+        components = {}
+        for name, component in self._components().items():
+            component_arrays, components[name] = component.state()
+            for array_name, array in component_arrays.items():
+                arrays[f"{name}/{array_name}"] = array
+        return arrays, {"components": components, "videos": self.videos}
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        def component(name, component_cls):
+            prefix = f"{name}/"
+            component_arrays = {key[len(prefix):]: array for key, array in arrays.items() if key.startswith(prefix)}
+            return component_cls.from_state(component_arrays, meta["components"][name])
+
+        return cls(
+            component("topics", BM25Index),
+            component("transcripts", BM25Index),
+            component("passage_index", BM25Index),
+            component("definitions", NgramIndex),
+            component("passages", PassageStore),
+            meta["videos"],
+        )
+
+    def share(self):
+        """The same indexes over one read-only shared mapping, for a preloading server to fork"""
+        arrays, meta = self.state()
+        return self.from_state(share_arrays(arrays), meta)
+
+    def save(self, path, fingerprint):
+        arrays, meta = self.state()
+        write_snapshot(path, arrays, {"fingerprint": fingerprint, **meta})
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        """Load a snapshot; returns None when it was built from different content"""
+        arrays, meta = read_snapshot(path)
+        if fingerprint is not None and meta["fingerprint"] != fingerprint:
+            return None
+        return cls.from_state(arrays, meta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the search index snapshot")
+    parser.add_argument("--output", default=os.environ.get("INDEX_SNAPSHOT") or DEFAULT_SNAPSHOT,
+                        help="snapshot path (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    # Make the app build its indexes from source instead of loading a snapshot or
+    # ranking through a content database, which the snapshot does not serve
+    os.environ["INDEX_SNAPSHOT"] = ""
+    os.environ["CONTENT_DB"] = ""
+    import app
+
+    if app.SEARCH.topic_index is None:
+        print("❌ The app was loaded with CONTENT_DB set; unset it to build an index snapshot")
+        return 1
+    app.SEARCH.save(args.output, app.SOURCE_FINGERPRINT)
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"✅ Wrote {args.output} ({size_mb:.1f} MB, {len(app.SEARCH.passages)} passages, "
+          f"{len(app.SEARCH.topic_index)} topics)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Offline transcript ingestion
+Fetches transcripts through a bounded worker pool, normalizes and chunks
+them, and writes one JSON record per video to the store the app loads at boot
+
+Usage:
+    python ingest.py Ec19ljjvlCI Z_S0VA4jKes
+    python ingest.py --ids-file course.txt --workers 16
+    python ingest.py --fixtures fixtures/ Ec19ljjvlCI
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from corpus import chunk_segments
+from retrieval import WHITESPACE_PATTERN
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE = os.path.join(BASE_DIR, "data", "transcripts")
+
+
+class PermanentFetchError(Exception):
+    """The transcript can never be fetched (disabled, missing, private video)"""
+
+
+# =============================================================================
+# TRANSPORTS
+# =============================================================================
+
+class YouTubeTransport:
+    """Fetch transcripts from YouTube with youtube-transcript-api"""
+
+    def __init__(self, languages=("en",)):
+        self.languages = tuple(languages)
+        # requests sessions are not guaranteed thread-safe, so each worker gets its own client
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            from youtube_transcript_api import YouTubeTranscriptApi
+            self._local.client = YouTubeTranscriptApi()
+        return self._local.client
+
+    def fetch(self, video_id):
+        from youtube_transcript_api import (
+            AgeRestricted, InvalidVideoId, NoTranscriptFound, TranscriptsDisabled,
+            VideoUnavailable, VideoUnplayable,
+        )
+        try:
+            transcript = self._client().fetch(video_id, languages=self.languages)
+        except (AgeRestricted, InvalidVideoId, NoTranscriptFound, TranscriptsDisabled,
+                VideoUnavailable, VideoUnplayable) as e:
+            raise PermanentFetchError(str(e).strip().splitlines()[0]) from e
+        return {"segments": transcript.to_raw_data()}
+
+
+class FixtureTransport:
+    """Read transcripts from local <video_id>.json files, with no network access
+
+    A fixture is either a list of {"text", "start", "duration"} segments or an
+    object with "segments" and optional "title" and "topics".
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, video_id):
+        path = os.path.join(self.directory, f"{video_id}.json")
+        if not os.path.exists(path):
+            raise PermanentFetchError(f"No fixture at {path}")
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return {"segments": data} if isinstance(data, list) else data
+
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+def fetch_with_retries(transport, video_id, retries=3, backoff=1.0):
+    """Fetch one transcript, retrying transient failures with jittered exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return transport.fetch(video_id)
+        except PermanentFetchError:
+            raise
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def normalize_segments(segments):
+    """Collapse whitespace, drop empty segments and order by start time"""
+    normalized = []
+    for segment in segments:
+        text = WHITESPACE_PATTERN.sub(" ", segment.get("text", "")).strip()
+        if text:
+            normalized.append({
+                "text": text,
+                "start": float(segment.get("start", 0.0)),
+                "duration": float(segment.get("duration", 0.0)),
+            })
+    normalized.sort(key=lambda segment: segment["start"])
+    return normalized
+
+
+def build_record(video_id, fetched, title=None, topics=None):
+    """Turn a fetched transcript into a VIDEO_TRANSCRIPTS-shaped store record"""
+    segments = normalize_segments(fetched.get("segments", []))
+    return {
+        "video_id": video_id,
+        "title": title or fetched.get("title") or video_id,
+        "topics": topics or fetched.get("topics", []),
+        "content": "\n".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "passages": [passage.to_dict() for passage in chunk_segments(video_id, segments)],
+    }
+
+
+def write_record(store, record):
+    """Atomically write one record as <store>/<video_id>.json"""
+    os.makedirs(store, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=store, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(store, f"{record['video_id']}.json"))
+
+
+def ingest(videos, transport, store=DEFAULT_STORE, workers=8, retries=3, backoff=1.0):
+    """Fetch, normalize, chunk and store transcripts for (video_id, title, topics) tuples
+
+    Returns (ingested video ids, {video_id: error message}).
+    """
+    def work(video_id, title, topics):
+        fetched = fetch_with_retries(transport, video_id, retries, backoff)
+        record = build_record(video_id, fetched, title, topics)
+        write_record(store, record)
+        return record
+
+    ingested = []
+    failed = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(work, *video): video[0] for video in videos}
+        for future in as_completed(futures):
+            video_id = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                failed[video_id] = f"{type(e).__name__}: {e}"
+                print(f"  ✗ {video_id}: {failed[video_id]}")
+            else:
+                ingested.append(video_id)
+                print(f"  ✓ {video_id}: {len(record['segments'])} segments, {len(record['passages'])} passages")
+    return ingested, failed
+
+
+def load_transcript_store(store=DEFAULT_STORE):
+    """Load every stored record as a {video_id: transcript} dict shaped like VIDEO_TRANSCRIPTS"""
+    transcripts = {}
+    if not os.path.isdir(store):
+        return transcripts
+    for name in sorted(os.listdir(store)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(store, name), encoding="utf-8") as f:
+            record = json.load(f)
+        video_id = record.pop("video_id")
+        transcripts[video_id] = record
+    return transcripts
+
+
+def read_ids_file(path):
+    """Parse lines of 'video_id [title]'; blank lines and # comments are skipped"""
+    videos = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            video_id, _, title = line.partition(" ")
+            videos.append((video_id, title.strip() or None, None))
+    return videos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest video transcripts into the on-disk store")
+    parser.add_argument("video_ids", nargs="*", help="YouTube video ids")
+    parser.add_argument("--ids-file", help="file with one 'video_id [title]' per line")
+    parser.add_argument("--store", default=os.environ.get("TRANSCRIPT_STORE", DEFAULT_STORE),
+                        help="output directory (default: %(default)s)")
+    parser.add_argument("--fixtures", help="read <video_id>.json fixtures from this directory instead of YouTube")
+    parser.add_argument("--languages", default="en", help="comma-separated transcript language preference")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent fetches")
+    parser.add_argument("--retries", type=int, default=3, help="retries per video for transient errors")
+    args = parser.parse_args(argv)
+
+    videos = [(video_id, None, None) for video_id in args.video_ids]
+    if args.ids_file:
+        videos.extend(read_ids_file(args.ids_file))
+    if not videos:
+        parser.error("no video ids given")
+
+    if args.fixtures:
+        transport = FixtureTransport(args.fixtures)
+    else:
+        transport = YouTubeTransport(args.languages.split(","))
+
+    print(f"📥 Ingesting {len(videos)} videos with {args.workers} workers into {args.store}")
+    started = time.perf_counter()
+    ingested, failed = ingest(videos, transport, args.store, args.workers, args.retries)
+    print(f"✅ {len(ingested)} ingested, {len(failed)} failed in {time.perf_counter() - started:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Query intent detection for the response engine
+All intent phrases, answer cues and topic keywords are compiled into one
+Aho-Corasick automaton, so a single pass over the question finds every match
+"""
+
+from collections import Counter, deque
+
+from retrieval import STOPWORDS, WHITESPACE_PATTERN, index_terms
+
+# Question intents generate_ai_response dispatches on. Phrases match whole words.
+INTENT_PATTERNS = {
+    "greeting": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"],
+    "help": ["what can you", "help me", "what do you know", "capabilities"],
+    "definition": ["what is", "define", "explain"],
+    "example": ["example"],
+    "why": ["why"],
+    "how": ["how"],
+    "comparison": ["difference", "compare", "vs"],
+}
+
+# Words that pick a canned answer inside an intent. These also match as a word
+# prefix, so "rigid" covers "rigidity" and "prisoner" covers "prisoners".
+CUE_WORDS = [
+    "oligopoly", "prisoner", "dilemma", "rigid", "stable", "unstable", "collusion", "fail",
+    "difficult", "measure", "concentration", "monopoly", "competition", "perfect",
+]
+
+# Intent phrases that also accept a word continuation ("examples", "differences")
+PREFIX_INTENTS = {"example", "define", "explain", "difference", "compare", "capabilities"}
+
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace so phrases match across spacing"""
+    return WHITESPACE_PATTERN.sub(" ", text.lower()).strip()
+
+
+class Automaton:
+    """Character-level Aho-Corasick automaton with word-boundary checks
+
+    A match must start at a word boundary. It must also end at one unless
+    the pattern was added with prefix=True.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+
+    def add(self, pattern, payload, prefix=False):
+        node = 0
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = next_node
+        self.outputs[node].append((len(pattern), prefix, payload))
+
+    def build(self):
+        """Compute failure links breadth-first and merge suffix outputs"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+        return self
+
+    def scan(self, text):
+        """Yield (start, end, payload) for every boundary-respecting match"""
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, prefix, payload in self.outputs[node]:
+                start = position - length + 1
+                end = position + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if not prefix and end < len(text) and text[end].isalnum():
+                    continue
+                yield start, end, payload
+
+
+class QueryAnalysis:
+    """Everything the single automaton pass found in one question"""
+
+    __slots__ = ("text", "terms", "intents", "cues", "topic_phrases", "video_topics", "topic_scores",
+                 "definition_similarity")
+
+    def __init__(self, text, terms):
+        self.text = text
+        self.terms = terms
+        self.intents = set()
+        self.cues = set()
+        # topic_key -> number of multi-word keyword or topic-name phrases matched
+        self.topic_phrases = Counter()
+        self.video_topics = set()
+        # Lexical topic scores, when a batch scored all of its questions together
+        self.topic_scores = None
+        self.definition_similarity = None
+
+
+class IntentClassifier:
+    """Compiles intents, cues, topic keywords and video topics into one automaton"""
+
+    def __init__(self, knowledge_base, video_transcripts):
+        self.automaton = Automaton()
+        for intent, phrases in INTENT_PATTERNS.items():
+            for phrase in phrases:
+                self.automaton.add(phrase, ("intent", intent), prefix=phrase in PREFIX_INTENTS)
+
+        for cue in CUE_WORDS:
+            self.automaton.add(cue, ("cue", cue), prefix=True)
+
+        # Multi-word phrases only: single words are already covered by the BM25 terms
+        for topic_key, topic_data in knowledge_base.items():
+            phrases = {normalize_text(keyword) for keyword in topic_data.get("keywords", [])}
+            phrases.add(topic_key.replace("_", " "))
+            for phrase in phrases:
+                if " " in phrase:
+                    self.automaton.add(phrase, ("topic", topic_key))
+
+        # A video topic matches when any of its content words appears in the question
+        for video_data in video_transcripts.values():
+            for topic in video_data.get("topics", []):
+                for word in set(normalize_text(topic).split()) - STOPWORDS:
+                    self.automaton.add(word, ("video_topic", topic), prefix=True)
+
+        self.automaton.build()
+
+    def analyze(self, query):
+        text = normalize_text(query)
+        analysis = QueryAnalysis(text, index_terms(text))
+        topic_hits = set()
+        for start, end, (kind, value) in self.automaton.scan(text):
+            if kind == "intent":
+                analysis.intents.add(value)
+            elif kind == "cue":
+                analysis.cues.add(value)
+            elif kind == "topic":
+                topic_hits.add((start, end, value))
+            else:
+                analysis.video_topics.add(value)
+        for _, _, topic_key in topic_hits:
+            analysis.topic_phrases[topic_key] += 1
+        return analysis
@@ -0,0 +1,415 @@
+"""
+LLM answer backend
+Providers sit behind one interface and keep a single pooled client each.
+LLMClient adds per-answer deadlines, jittered retries and a circuit breaker;
+when it gives up, callers fall back to the local knowledge engine.
+
+Configured from the environment:
+    LLM_PROVIDER      openai | gemini | stub (unset: local engine only)
+    LLM_MODEL         model name (defaults per provider)
+    LLM_BASE_URL      OpenAI-compatible endpoint (stub default http://127.0.0.1:8900/v1)
+    LLM_TIMEOUT       seconds per answer, across retries (default 8)
+    LLM_RETRIES       retries after the first attempt (default 2)
+    LLM_BREAKER_FAILURES / LLM_BREAKER_RESET   failures that open the circuit / seconds it stays open
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+DEFAULT_MODELS = {"openai": "gpt-4o-mini", "gemini": "gemini-1.5-flash", "stub": "stub"}
+STUB_BASE_URL = "http://127.0.0.1:8900/v1"
+
+# Pooled connections per provider client
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+
+
+class LLMError(Exception):
+    """The backend could not produce an answer"""
+
+
+class TransientLLMError(LLMError):
+    """A failure worth retrying: timeouts, rate limits, 5xx, dropped connections"""
+
+
+class DeadlineExceeded(LLMError):
+    """The per-answer deadline ran out"""
+
+
+class CircuitOpenError(LLMError):
+    """Recent calls failed; the backend is skipped until the breaker's reset timeout"""
+
+
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures -> half-open after reset_timeout
+
+    Half-open lets a single probe call through; its success closes the circuit
+    and its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """The state a call may go ahead in now ("closed" or "half_open"), None when it may not
+
+        A "half_open" call holds the probe slot and must end in record_success,
+        record_failure or release.
+        """
+        with self.lock:
+            state = self._state()
+            if state == "closed":
+                return state
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return state
+            return None
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    self.times_opened += 1
+                self.opened_at = self.clock()
+            self.probing = False
+
+    def release(self):
+        """End a probe that finished without a verdict on the backend"""
+        with self.lock:
+            self.probing = False
+
+
+# =============================================================================
+# PROVIDERS
+# =============================================================================
+
+class OpenAIProvider:
+    """OpenAI chat completions, or any compatible endpoint such as llm_stub.py
+
+    One sync and one async client are created up front and reused, so calls
+    share pooled keep-alive connections.
+    """
+
+    def __init__(self, model, api_key=None, base_url=None, name="openai"):
+        import httpx
+        import openai
+        self.openai = openai
+        self.name = name
+        self.model = model
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+        # Retries are LLMClient's job, so the SDK's own are disabled
+        options = {"api_key": api_key or os.environ.get("OPENAI_API_KEY") or "unused", "base_url": base_url,
+                   "max_retries": 0}
+        self.client = openai.OpenAI(http_client=httpx.Client(limits=limits), **options)
+        self.async_client = openai.AsyncOpenAI(http_client=httpx.AsyncClient(limits=limits), **options)
+
+    def _messages(self, system, prompt):
+        return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+    def _translate(self, error):
+        openai = self.openai
+        if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                              openai.InternalServerError)):
+            return TransientLLMError(f"{type(error).__name__}: {error}")
+        return LLMError(f"{type(error).__name__}: {error}")
+
+    def complete(self, system, prompt, timeout):
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model, messages=self._messages(system, prompt), timeout=timeout)
+        except self.openai.OpenAIError as e:
+            raise self._translate(e) from e
+        return response.choices[0].message.content or ""
+
+    def stream(self, system, prompt, timeout):
+        try:
+            for chunk in self.client.chat.completions.create(
+                    model=self.model, messages=self._messages(system, prompt), timeout=timeout, stream=True):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except self.openai.OpenAIError as e:
+            raise self._translate(e) from e
+
+    async def acomplete(self, system, prompt, timeout):
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model, messages=self._messages(system, prompt), timeout=timeout)
+        except self.openai.OpenAIError as e:
+            raise self._translate(e) from e
+        return response.choices[0].message.content or ""
+
+    async def astream(self, system, prompt, timeout):
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=self.model, messages=self._messages(system, prompt), timeout=timeout, stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except self.openai.OpenAIError as e:
+            raise self._translate(e) from e
+
+
+class GeminiProvider:
+    """Google Gemini through google-generativeai, which keeps one pooled channel per process"""
+
+    name = "gemini"
+
+    def __init__(self, model, api_key=None):
+        import google.generativeai as genai
+        from google.api_core import exceptions
+        self.genai = genai
+        self.exceptions = exceptions
+        self.model_name = model
+        genai.configure(api_key=api_key or os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY"))
+        # One model object per system prompt; the app uses a single prompt
+        self.models = {}
+
+    def _model(self, system):
+        if system not in self.models:
+            self.models[system] = self.genai.GenerativeModel(self.model_name, system_instruction=system)
+        return self.models[system]
+
+    def _translate(self, error):
+        exceptions = self.exceptions
+        if isinstance(error, (exceptions.DeadlineExceeded, exceptions.ServiceUnavailable,
+                              exceptions.ResourceExhausted, exceptions.InternalServerError)):
+            return TransientLLMError(f"{type(error).__name__}: {error}")
+        return LLMError(f"{type(error).__name__}: {error}")
+
+    def complete(self, system, prompt, timeout):
+        try:
+            return self._model(system).generate_content(prompt, request_options={"timeout": timeout}).text
+        except self.exceptions.GoogleAPIError as e:
+            raise self._translate(e) from e
+
+    def stream(self, system, prompt, timeout):
+        try:
+            for chunk in self._model(system).generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+                if chunk.text:
+                    yield chunk.text
+        except self.exceptions.GoogleAPIError as e:
+            raise self._translate(e) from e
+
+    async def acomplete(self, system, prompt, timeout):
+        try:
+            response = await self._model(system).generate_content_async(prompt, request_options={"timeout": timeout})
+        except self.exceptions.GoogleAPIError as e:
+            raise self._translate(e) from e
+        return response.text
+
+    async def astream(self, system, prompt, timeout):
+        try:
+            response = await self._model(system).generate_content_async(
+                prompt, stream=True, request_options={"timeout": timeout})
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except self.exceptions.GoogleAPIError as e:
+            raise self._translate(e) from e
+
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+class LLMClient:
+    """A provider plus per-answer deadline, jittered retries and a circuit breaker"""
+
+    def __init__(self, provider, timeout=8.0, retries=2, backoff=0.2, breaker=None, on_call=None):
+        self.provider = provider
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        # on_call(outcome, seconds) is told about every attempt, for metrics
+        self.on_call = on_call or (lambda outcome, seconds: None)
+
+    @property
+    def name(self):
+        return self.provider.name
+
+    @property
+    def model(self):
+        return getattr(self.provider, "model", None) or getattr(self.provider, "model_name", None)
+
+    def available(self):
+        """False while the circuit is open, so callers can skip straight to the fallback"""
+        return self.breaker.state != "open"
+
+    def status(self):
+        return {
+            "enabled": True,
+            "provider": self.name,
+            "model": self.model,
+            "circuit": self.breaker.state,
+            "times_opened": self.breaker.times_opened,
+            "timeout_seconds": self.timeout,
+            "retries": self.retries,
+        }
+
+    def _retry_delay(self, attempt, deadline):
+        """Full jitter, capped by the time left before the deadline"""
+        return min(random.uniform(0, self.backoff * 2 ** attempt), max(0.0, deadline - time.monotonic()))
+
+    def _attempts(self):
+        """Yield (attempt, seconds left, deadline, holds the probe slot) while retries and the deadline allow"""
+        deadline = time.monotonic() + self.timeout
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            state = self.breaker.allow()
+            if state is None:
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            yield attempt, remaining, deadline, state == "half_open"
+        raise DeadlineExceeded(f"{self.name} gave no answer within {self.timeout:.1f}s")
+
+    def _unexpected(self, error, started):
+        """An exception the provider should have mapped: counted as a non-transient failure"""
+        self._failed(error, started)
+        return LLMError(f"{self.name} failed: {type(error).__name__}: {error}")
+
+    def _failed(self, error, started):
+        if isinstance(error, TransientLLMError):
+            self.breaker.record_failure()
+            self.on_call("transient_error", time.monotonic() - started)
+            return True
+        self.breaker.release()
+        self.on_call("error", time.monotonic() - started)
+        return False
+
+    def _succeeded(self, started):
+        self.breaker.record_success()
+        self.on_call("success", time.monotonic() - started)
+
+    def complete(self, system, prompt):
+        for attempt, remaining, deadline, probe in self._attempts():
+            started = time.monotonic()
+            try:
+                answer = self.provider.complete(system, prompt, remaining)
+                self._succeeded(started)
+                return answer
+            except LLMError as e:
+                if not self._failed(e, started) or attempt == self.retries:
+                    raise
+            except Exception as e:
+                raise self._unexpected(e, started) from e
+            finally:
+                # A probe that ended without a verdict must not keep the slot
+                if probe:
+                    self.breaker.release()
+            time.sleep(self._retry_delay(attempt, deadline))
+
+    def stream(self, system, prompt):
+        """Yield answer chunks; retries happen only before the first chunk arrives"""
+        for attempt, remaining, deadline, probe in self._attempts():
+            started = time.monotonic()
+            produced = False
+            try:
+                for chunk in self.provider.stream(system, prompt, remaining):
+                    produced = True
+                    yield chunk
+                self._succeeded(started)
+                return
+            except LLMError as e:
+                if not self._failed(e, started) or produced or attempt == self.retries:
+                    raise
+            except Exception as e:
+                raise self._unexpected(e, started) from e
+            finally:
+                # Also reached when the consumer abandons the stream (GeneratorExit)
+                if probe:
+                    self.breaker.release()
+            time.sleep(self._retry_delay(attempt, deadline))
+
+    async def acomplete(self, system, prompt):
+        for attempt, remaining, deadline, probe in self._attempts():
+            started = time.monotonic()
+            try:
+                answer = await self.provider.acomplete(system, prompt, remaining)
+                self._succeeded(started)
+                return answer
+            except LLMError as e:
+                if not self._failed(e, started) or attempt == self.retries:
+                    raise
+            except Exception as e:
+                raise self._unexpected(e, started) from e
+            finally:
+                if probe:
+                    self.breaker.release()
+            await asyncio.sleep(self._retry_delay(attempt, deadline))
+
+    async def astream(self, system, prompt):
+        for attempt, remaining, deadline, probe in self._attempts():
+            started = time.monotonic()
+            produced = False
+            try:
+                async for chunk in self.provider.astream(system, prompt, remaining):
+                    produced = True
+                    yield chunk
+                self._succeeded(started)
+                return
+            except LLMError as e:
+                if not self._failed(e, started) or produced or attempt == self.retries:
+                    raise
+            except Exception as e:
+                raise self._unexpected(e, started) from e
+            finally:
+                if probe:
+                    self.breaker.release()
+            await asyncio.sleep(self._retry_delay(attempt, deadline))
+
+
+def create_provider(name, model=None, base_url=None):
+    model = model or DEFAULT_MODELS.get(name)
+    if name == "openai":
+        return OpenAIProvider(model, base_url=base_url)
+    if name == "stub":
+        return OpenAIProvider(model, api_key="stub", base_url=base_url or STUB_BASE_URL, name="stub")
+    if name == "gemini":
+        return GeminiProvider(model)
+    raise ValueError(f"Unknown LLM provider {name!r}")
+
+
+def client_from_environ(environ=os.environ, on_call=None):
+    """Build the configured LLMClient, or None when LLM_PROVIDER is unset"""
+    name = environ.get("LLM_PROVIDER", "").strip().lower()
+    if not name:
+        return None
+    provider = create_provider(name, environ.get("LLM_MODEL") or None, environ.get("LLM_BASE_URL") or None)
+    breaker = CircuitBreaker(int(environ.get("LLM_BREAKER_FAILURES", 5)), float(environ.get("LLM_BREAKER_RESET", 30)))
+    return LLMClient(provider, timeout=float(environ.get("LLM_TIMEOUT", 8)),
+                     retries=int(environ.get("LLM_RETRIES", 2)), breaker=breaker, on_call=on_call)
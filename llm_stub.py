@@ -0,0 +1,166 @@
+"""
+Local stand-in for an OpenAI-compatible LLM server
+Answers /v1/chat/completions (plain and streamed) with deterministic text
+after a configurable delay, so the LLM path can be load-tested offline.
+Standard library only; HTTP/1.1 keep-alive like a real API endpoint.
+
+Usage:
+    python llm_stub.py --port 8900 --latency 0.3 --tokens-per-second 80
+    LLM_PROVIDER=stub gunicorn app:app
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import time
+
+WORDS = (
+    "oligopoly firms interdependence pricing strategy collusion barriers entry market power "
+    "equilibrium payoff rivals demand elasticity output competition consumers welfare"
+).split()
+
+# Numbered sources in a retrieval-augmented prompt: "[1] (topic: Collusion)"
+SOURCE_PATTERN = re.compile(r"^\[(\d+)\] \(", re.MULTILINE)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+def answer_tokens(prompt, count):
+    """The same prompt always yields the same answer, citing a couple of its numbered sources"""
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    words = [rng.choice(WORDS) for _ in range(count)]
+    words[0] = words[0].capitalize()
+    sources = SOURCE_PATTERN.findall(prompt)
+    for source in rng.sample(sources, min(2, len(sources))):
+        position = rng.randrange(1, count)
+        words[position] = f"{words[position]} [{source}]"
+    return [word + " " for word in words[:-1]] + [words[-1] + "."]
+
+
+class StubServer:
+    def __init__(self, latency=0.3, tokens_per_second=80.0, tokens=60, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self.respond(writer, method, path.split("?", 1)[0], body)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, method, path, body):
+        self.requests += 1
+        if path == "/v1/models" and method == "GET":
+            return await self.send_json(writer, 200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        if path != "/v1/chat/completions":
+            return await self.send_json(writer, 404, {"error": {"message": f"No route {path}"}})
+        if method != "POST":
+            return await self.send_json(writer, 405, {"error": {"message": "POST only"}})
+        try:
+            request = json.loads(body)
+            prompt = "\n".join(message["content"] for message in request["messages"])
+        except (ValueError, KeyError, TypeError):
+            return await self.send_json(writer, 400, {"error": {"message": "Malformed request"}})
+
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < self.failure_rate:
+            return await self.send_json(writer, 503, {"error": {"message": "Injected failure", "type": "server_error"}})
+
+        model = request.get("model", "stub")
+        tokens = answer_tokens(prompt, self.tokens)
+        completion_id = f"chatcmpl-stub{self.requests}"
+        if request.get("stream"):
+            return await self.send_stream(writer, completion_id, model, tokens)
+
+        await asyncio.sleep(len(tokens) / self.tokens_per_second)
+        await self.send_json(writer, 200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(tokens),
+                      "total_tokens": len(prompt.split()) + len(tokens)},
+        })
+
+    async def send_json(self, writer, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def send_stream(self, writer, completion_id, model, tokens):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+
+        async def event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            await writer.drain()
+
+        created = int(time.time())
+        for idx, token in enumerate(tokens):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            delta = {"role": "assistant", "content": token} if idx == 0 else {"content": token}
+            await event(json.dumps({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                    "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}))
+        await event(json.dumps({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        await event("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def serve(server, host, port):
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"🤖 LLM stub listening on http://{host}:{port}/v1")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of calls answered with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = StubServer(args.latency, args.tokens_per_second, args.answer_tokens, args.failure_rate, args.seed)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
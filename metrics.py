@@ -0,0 +1,242 @@
+"""
+Prometheus metrics for the Flask app
+Each process keeps its counters in a memory-mapped file under METRICS_DIR;
+a scrape served by any gunicorn worker sums the files of every worker.
+Without METRICS_DIR the values stay in process memory.
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+
+# Upper bounds of the latency buckets in seconds; requests here take well under a second
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_USED = struct.Struct("<Q")
+_KEY_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+_INITIAL_FILE_SIZE = 1 << 20
+
+
+class MmapValues:
+    """Append-only key -> float64 table in a memory-mapped file
+
+    Layout: 8-byte used length, then entries of [uint32 key length][UTF-8 key
+    padded to 8 bytes][float64 value]. An entry is written in full before the
+    used length covers it, so readers in other processes never see half of one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a+b")
+        if os.path.getsize(path) == 0:
+            self.file.truncate(_INITIAL_FILE_SIZE)
+        self.buffer = mmap.mmap(self.file.fileno(), 0)
+        self.used = _USED.unpack_from(self.buffer)[0] or _USED.size
+        self.positions = {key: position for key, position, _ in _entries(self.buffer, self.used)}
+
+    def _append(self, key):
+        encoded = key.encode("utf-8")
+        padded = _KEY_LENGTH.size + len(encoded) + (-(_KEY_LENGTH.size + len(encoded)) % 8)
+        end = self.used + padded + _VALUE.size
+        if end > len(self.buffer):
+            size = len(self.buffer)
+            while size < end:
+                size *= 2
+            self.buffer.close()
+            self.file.truncate(size)
+            self.buffer = mmap.mmap(self.file.fileno(), 0)
+        _KEY_LENGTH.pack_into(self.buffer, self.used, len(encoded))
+        self.buffer[self.used + _KEY_LENGTH.size:self.used + _KEY_LENGTH.size + len(encoded)] = encoded
+        _VALUE.pack_into(self.buffer, self.used + padded, 0.0)
+        self.positions[key] = self.used + padded
+        self.used = end
+        _USED.pack_into(self.buffer, 0, self.used)
+
+    def inc(self, key, amount):
+        position = self.positions.get(key)
+        if position is None:
+            self._append(key)
+            position = self.positions[key]
+        _VALUE.pack_into(self.buffer, position, _VALUE.unpack_from(self.buffer, position)[0] + amount)
+
+
+def _entries(buffer, used):
+    """Yield (key, value position, value) for every complete entry
+
+    used is clamped to the buffer, and an entry running past it ends the
+    scan, so a file another worker is growing never reads out of bounds.
+    """
+    used = min(used, len(buffer))
+    position = _USED.size
+    while position + _KEY_LENGTH.size <= used:
+        length = _KEY_LENGTH.unpack_from(buffer, position)[0]
+        if not length:
+            # Zeroed space that no entry has been written to yet
+            break
+        value_position = position + _KEY_LENGTH.size + length + (-(_KEY_LENGTH.size + length) % 8)
+        if value_position + _VALUE.size > used:
+            break
+        key = bytes(buffer[position + _KEY_LENGTH.size:position + _KEY_LENGTH.size + length]).decode("utf-8")
+        yield key, value_position, _VALUE.unpack_from(buffer, value_position)[0]
+        position = value_position + _VALUE.size
+
+
+def read_values_file(path):
+    """Read a worker's values file without keeping it open"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < _USED.size:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            used = _USED.unpack_from(buffer)[0]
+            return [(key, value) for key, _, value in _entries(buffer, used)]
+
+
+class Counter:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def inc(self, amount=1.0, **labels):
+        self.registry.inc(self.name, labels, amount)
+
+
+class Histogram:
+    def __init__(self, registry, name, buckets):
+        self.registry = registry
+        self.name = name
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        # Stored per bucket; the exposition makes the counts cumulative
+        le = next((bound for bound in self.buckets if value <= bound), "+Inf")
+        self.registry.inc(self.name, dict(labels, le=str(le)), 1.0, "bucket")
+        self.registry.inc(self.name, labels, value, "sum")
+        self.registry.inc(self.name, labels, 1.0, "count")
+
+
+class MetricsRegistry:
+    """Counters and histograms aggregated across every process sharing a directory"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.metrics = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.pid = None
+        self.values = None
+        self.local = {}
+
+    def counter(self, name, help_text):
+        self.metrics[name] = ("counter", help_text, None)
+        return Counter(self, name)
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS):
+        self.metrics[name] = ("histogram", help_text, tuple(buckets))
+        return Histogram(self, name, buckets)
+
+    def gauge_function(self, name, help_text, function):
+        """Gauge computed at scrape time from the aggregated samples"""
+        self.gauges[name] = (help_text, function)
+
+    def _store(self):
+        # A forked worker must not write into its parent's file
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            os.makedirs(self.directory, exist_ok=True)
+            self.values = MmapValues(os.path.join(self.directory, f"metrics_{self.pid}.db"))
+        return self.values
+
+    def inc(self, name, labels, amount, suffix=""):
+        key = json.dumps([name, suffix, sorted(labels.items())])
+        with self.lock:
+            if self.directory:
+                self._store().inc(key, amount)
+            else:
+                self.local[key] = self.local.get(key, 0.0) + amount
+
+    def samples(self):
+        """{(name, suffix, labels tuple): value} summed over every process"""
+        if self.directory:
+            with self.lock:
+                self._store()
+            items = []
+            for path in glob.glob(os.path.join(self.directory, "metrics_*.db")):
+                try:
+                    items.extend(read_values_file(path))
+                except (OSError, ValueError, struct.error):
+                    continue
+        else:
+            with self.lock:
+                items = list(self.local.items())
+        totals = {}
+        for key, value in items:
+            name, suffix, labels = json.loads(key)
+            sample = (name, suffix, tuple(tuple(label) for label in labels))
+            totals[sample] = totals.get(sample, 0.0) + value
+        return totals
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        samples = self.samples()
+        by_name = {}
+        for (name, suffix, labels), value in samples.items():
+            by_name.setdefault(name, []).append((suffix, labels, value))
+
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            entries = by_name.get(name, [])
+            if kind == "counter":
+                for _, labels, value in sorted(entries):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            else:
+                lines.extend(_render_histogram(name, buckets, entries))
+        for name, (help_text, function) in sorted(self.gauges.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(function(samples).items()):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(name, buckets, entries):
+    series = {}
+    for suffix, labels, value in entries:
+        if suffix == "bucket":
+            le = dict(labels)["le"]
+            base = tuple(label for label in labels if label[0] != "le")
+            series.setdefault(base, {}).setdefault("buckets", {})[le] = value
+        else:
+            series.setdefault(labels, {})[suffix] = value
+
+    lines = []
+    for labels, values in sorted(series.items()):
+        cumulative = 0.0
+        for bound in buckets + ("+Inf",):
+            cumulative += values.get("buckets", {}).get(str(bound), 0.0)
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {_format_value(cumulative)}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values.get('sum', 0.0))}")
+        lines.append(f"{name}_count{_format_labels(labels)} {_format_value(values.get('count', 0.0))}")
+    return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value))
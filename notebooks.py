@@ -0,0 +1,253 @@
+"""
+Notebooks: one course's study material with its own search indexes
+The built-in course is always resident. Every other notebook is a directory
+under NOTEBOOK_DIR that is loaded and indexed on first use and kept in a
+bounded LRU, so memory stays flat however many courses exist on disk.
+
+Notebook directory layout:
+    notebook.json     {"title", "knowledge_base", "video_transcripts", "videos", "quiz_questions", "flashcards"}
+    transcripts/      records written by python ingest.py --store <notebook>/transcripts
+    index.snapshot    search indexes, written on first load and reused while fresh
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from coalescing import SingleFlight
+from index_snapshot import BASE_DIR, SearchIndexes, SnapshotError, content_fingerprint
+from ingest import load_transcript_store
+from intents import IntentClassifier
+from rag import SYSTEM_PROMPT_TEMPLATE
+from retrieval import flatten_text
+from vector_index import VectorStore
+
+DEFAULT_NOTEBOOK_DIR = os.path.join(BASE_DIR, "data", "notebooks")
+
+# Notebook ids double as directory names, so nothing that could leave NOTEBOOK_DIR
+NOTEBOOK_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+_active_notebook = contextvars.ContextVar("active_notebook", default=None)
+
+
+class NotebookNotFound(LookupError):
+    """No notebook with this id exists"""
+
+
+class NotebookInvalid(ValueError):
+    """A notebook's notebook.json cannot be read as a notebook"""
+
+
+def active_notebook():
+    """The notebook activated for the current request, or None outside notebook routes"""
+    return _active_notebook.get()
+
+
+def activate(notebook):
+    _active_notebook.set(notebook)
+    return notebook
+
+
+def deactivate():
+    _active_notebook.set(None)
+
+
+def video_listing(videos, video_transcripts):
+    """The videos list plus an entry for every transcript that has none"""
+    listed = {video["id"] for video in videos}
+    return list(videos) + [{
+        "id": video_id,
+        "title": transcript["title"],
+        "description": f"Covers {', '.join(transcript['topics'])}." if transcript["topics"] else "",
+        "thumbnail": f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
+    } for video_id, transcript in video_transcripts.items() if video_id not in listed]
+
+
+def study_items(knowledge_base, flashcards, quiz_questions, passages):
+    """Every study item the vector index embeds, by kind"""
+    return {
+        "topic": [(f"topic:{topic_key}", f"{topic_key.replace('_', ' ')}. {flatten_text(topic)}")
+                  for topic_key, topic in knowledge_base.items()],
+        "flashcard": [(f"flashcard:{idx}", f"{card['term']}. {card['definition']}") for idx, card in enumerate(flashcards)],
+        "quiz": [(f"quiz:{question['id']}", f"{question['question']} {question['answer']}. {question['explanation']}")
+                 for question in quiz_questions],
+        "passage": [(f"passage:{idx}", passage.text) for idx, passage in enumerate(passages)],
+    }
+
+
+class Notebook:
+    """A course's content plus every index the request path reads for it
+
+    The vector store is embedded on first use unless one, or a function that
+    loads one, is passed in.
+    cache_scope keeps the cached answers of different notebooks, and of
+    different versions of one notebook, apart.
+    """
+
+    def __init__(self, notebook_id, title, knowledge_base, video_transcripts, videos, quiz_questions, flashcards,
+                 search, fingerprint, intent_classifier=None, vectors=None, vector_embedder="lsa", system_prompt=None,
+                 content_db=None):
+        self.id = notebook_id
+        self.title = title
+        self.knowledge_base = knowledge_base
+        self.video_transcripts = video_transcripts
+        self.videos = videos
+        self.quiz_questions = quiz_questions
+        self.flashcards = flashcards
+        self.search = search
+        self.fingerprint = fingerprint
+        self.intent_classifier = intent_classifier or IntentClassifier(knowledge_base, video_transcripts)
+        self.vector_embedder = vector_embedder
+        self.system_prompt = system_prompt or SYSTEM_PROMPT_TEMPLATE.format(course=title)
+        # A content_db.ContentDB to rank lexically with FTS5 instead of the in-process BM25 indexes
+        self.content_db = content_db
+        self.vectors_lock = threading.Lock()
+        self._vectors = None
+        if callable(vectors):
+            self.load_vectors = vectors
+        elif vectors is not None:
+            self._vectors = vectors
+
+    @classmethod
+    def load(cls, directory, notebook_id, vector_embedder="lsa"):
+        """Read a notebook directory, from its index snapshot when that is fresh"""
+        try:
+            with open(os.path.join(directory, "notebook.json"), encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise NotebookNotFound(notebook_id) from None
+        except ValueError as e:
+            raise NotebookInvalid(f"{notebook_id}: notebook.json is not valid JSON ({e})") from e
+        if not isinstance(data, dict):
+            raise NotebookInvalid(f"{notebook_id}: notebook.json must hold an object")
+
+        knowledge_base = data.get("knowledge_base", {})
+        video_transcripts = data.get("video_transcripts", {})
+        store = os.path.join(directory, "transcripts")
+        fingerprint = content_fingerprint(knowledge_base, video_transcripts, store)
+        snapshot = os.path.join(directory, "index.snapshot")
+        search = None
+        if os.path.exists(snapshot):
+            try:
+                search = SearchIndexes.load(snapshot, fingerprint)
+            except SnapshotError as e:
+                print(f"⚠️ Ignoring notebook snapshot {snapshot}: {e}")
+
+        if search is None:
+            video_transcripts.update(load_transcript_store(store))
+            search = SearchIndexes.build(knowledge_base, video_transcripts)
+            try:
+                search.save(snapshot, fingerprint)
+            except OSError as e:
+                print(f"⚠️ Could not write notebook snapshot {snapshot}: {e}")
+        else:
+            # Stored transcripts are served from the snapshot; only their metadata is needed here
+            for video_id, video_meta in search.videos.items():
+                video_transcripts[video_id] = {**video_transcripts.get(video_id, {"content": ""}), **video_meta}
+
+        return cls(notebook_id, data.get("title", notebook_id), knowledge_base, video_transcripts,
+                   video_listing(data.get("videos", []), video_transcripts),
+                   data.get("quiz_questions", []), data.get("flashcards", []), search, fingerprint,
+                   vector_embedder=vector_embedder)
+
+    @property
+    def topic_index(self):
+        return self.search.topic_index
+
+    @property
+    def transcript_index(self):
+        return self.search.transcript_index
+
+    @property
+    def passage_index(self):
+        return self.search.passage_index
+
+    @property
+    def definition_index(self):
+        return self.search.definition_index
+
+    @property
+    def passages(self):
+        return self.search.passages
+
+    @property
+    def cache_scope(self):
+        return (self.id, self.fingerprint)
+
+    def load_vectors(self):
+        return VectorStore.build(study_items(self.knowledge_base, self.flashcards, self.quiz_questions, self.passages),
+                                 self.vector_embedder)
+
+    @property
+    def vectors(self):
+        """The vector store, loaded by the first caller while concurrent ones wait for it"""
+        if self._vectors is None:
+            with self.vectors_lock:
+                if self._vectors is None:
+                    self._vectors = self.load_vectors()
+        return self._vectors
+
+
+class NotebookStore:
+    """The notebooks under a directory, loaded on first use and kept in an LRU of `capacity`
+
+    Concurrent first requests for one notebook share a single load. An
+    evicted notebook stays usable by the requests already holding it and is
+    loaded again, from its snapshot, when next asked for.
+    """
+
+    def __init__(self, directory, capacity=16, vector_embedder="lsa"):
+        self.directory = directory
+        self.capacity = capacity
+        self.vector_embedder = vector_embedder
+        self.resident = OrderedDict()
+        self.lock = threading.Lock()
+        self.flight = SingleFlight()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def path(self, notebook_id):
+        if not NOTEBOOK_ID_PATTERN.match(notebook_id):
+            raise NotebookNotFound(notebook_id)
+        return os.path.join(self.directory, notebook_id)
+
+    def ids(self):
+        """Ids of every notebook on disk"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if NOTEBOOK_ID_PATTERN.match(name) and os.path.isfile(os.path.join(self.directory, name, "notebook.json")))
+
+    def get(self, notebook_id):
+        """The notebook with this id, loading it if needed; NotebookNotFound if there is none"""
+        with self.lock:
+            notebook = self.resident.get(notebook_id)
+            if notebook is not None:
+                self.resident.move_to_end(notebook_id)
+                self.hits += 1
+                return notebook
+        notebook, _ = self.flight.do(notebook_id, lambda: self._load(notebook_id))
+        return notebook
+
+    def _load(self, notebook_id):
+        with self.lock:
+            # Loaded by another caller between our miss and this flight
+            if notebook_id in self.resident:
+                return self.resident[notebook_id]
+        notebook = Notebook.load(self.path(notebook_id), notebook_id, self.vector_embedder)
+        with self.lock:
+            self.resident[notebook_id] = notebook
+            self.loads += 1
+            while len(self.resident) > self.capacity:
+                self.resident.popitem(last=False)
+                self.evictions += 1
+        return notebook
+
+    def stats(self):
+        with self.lock:
+            return {"resident": list(self.resident), "capacity": self.capacity,
+                    "hits": self.hits, "loads": self.loads, "evictions": self.evictions}
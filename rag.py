@@ -0,0 +1,130 @@
+"""
+Retrieval-augmented prompts for the LLM backend
+Ranked topics and transcript passages become numbered sources, packed into a
+token budget; the model cites them as [n] and the cited ones are returned to
+the client as topic ids and video timestamps
+"""
+
+import math
+import re
+
+from retrieval import flatten_text
+
+# Rough size of a token in characters, for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# A source is truncated to fit the budget only if at least this many tokens are left
+MIN_TRUNCATED_TOKENS = 40
+
+CITATION_PATTERN = re.compile(r"\[(\d+)\]")
+
+SYSTEM_PROMPT_TEMPLATE = (
+    "You are a study assistant for a course on {course}. "
+    "Answer the student's question using only the numbered sources provided, and cite them inline as [1], [2]. "
+    "If the sources do not cover the question, say so. Keep answers short and use markdown."
+)
+
+SYSTEM_PROMPT = SYSTEM_PROMPT_TEMPLATE.format(course="oligopoly and game theory")
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def format_timestamp(ms):
+    """Format milliseconds as m:ss or h:mm:ss"""
+    minutes, seconds = divmod(ms // 1000, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class Source:
+    """One retrieved topic or transcript passage offered to the model"""
+
+    __slots__ = ("kind", "ref", "title", "text", "start_ms", "end_ms")
+
+    def __init__(self, kind, ref, title, text, start_ms=None, end_ms=None):
+        self.kind = kind
+        self.ref = ref
+        self.title = title
+        self.text = text
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+    @classmethod
+    def from_topic(cls, topic_key, topic):
+        # Definition first, so truncation keeps the most useful part; keywords add nothing for the model
+        fields = [topic.get("definition", "")]
+        fields.extend(flatten_text(value) for name, value in topic.items() if name not in ("definition", "keywords"))
+        return cls("topic", topic_key, topic_key.replace("_", " ").title(), " ".join(field for field in fields if field))
+
+    @classmethod
+    def from_passage(cls, passage, title):
+        return cls("video", passage.video_id, title, passage.text, passage.start_ms, passage.end_ms)
+
+    def heading(self):
+        if self.kind == "video":
+            return f"video: {self.title} at {format_timestamp(self.start_ms)}"
+        return f"topic: {self.title}"
+
+    def to_citation(self, number, api_root="/api"):
+        citation = {"id": number, "type": self.kind, "title": self.title}
+        if self.kind == "video":
+            citation.update(video_id=self.ref, start_ms=self.start_ms, end_ms=self.end_ms,
+                            timestamp=format_timestamp(self.start_ms),
+                            url=f"https://www.youtube.com/watch?v={self.ref}&t={self.start_ms // 1000}s")
+        else:
+            citation.update(topic_id=self.ref, url=f"{api_root}/topic/{self.ref}")
+        return citation
+
+
+def interleave(*ranked_lists):
+    """Merge ranked lists by rank (a1, b1, a2, b2, ...), since their scores are not comparable"""
+    merged = []
+    for rank in range(max((len(items) for items in ranked_lists), default=0)):
+        merged.extend(items[rank] for items in ranked_lists if rank < len(items))
+    return merged
+
+
+def truncate_to_tokens(text, tokens):
+    """Cut text at a word boundary to about `tokens` tokens"""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit - 1)
+    return text[:cut if cut > 0 else limit - 1] + "…"
+
+
+def pack_context(sources, token_budget):
+    """Sources in order until the budget is spent; the first one that does not fit may be truncated"""
+    packed = []
+    remaining = token_budget
+    for source in sources:
+        cost = estimate_tokens(source.text) + estimate_tokens(source.heading()) + 2
+        if cost <= remaining:
+            packed.append(source)
+            remaining -= cost
+        elif remaining - estimate_tokens(source.heading()) - 2 >= MIN_TRUNCATED_TOKENS:
+            text = truncate_to_tokens(source.text, remaining - estimate_tokens(source.heading()) - 2)
+            packed.append(Source(source.kind, source.ref, source.title, text, source.start_ms, source.end_ms))
+            break
+        else:
+            break
+    return packed
+
+
+def build_prompt(question, sources):
+    blocks = [f"[{number}] ({source.heading()})\n{source.text}" for number, source in enumerate(sources, 1)]
+    context = "\n\n".join(blocks) or "(no matching sources)"
+    return f"Sources:\n\n{context}\n\nQuestion: {question}"
+
+
+def citations(answer, sources, api_root="/api"):
+    """Citations of the sources the answer refers to, or of every source when it cites none
+
+    Topic citations link to api_root/topic/<id>, the topic route of the notebook that answered.
+    """
+    cited = sorted({int(number) for number in CITATION_PATTERN.findall(answer)
+                    if 1 <= int(number) <= len(sources)})
+    numbers = cited or range(1, len(sources) + 1)
+    return [sources[number - 1].to_citation(number, api_root) for number in numbers]
@@ -0,0 +1,365 @@
+"""
+Retrieval indexes for the study assistant
+Lookup structures are built once at startup so chat requests never scan the whole corpus
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from functools import cached_property
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Common words that carry no topical signal
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be because been before being between both but by
+can could did do does doing don for from had has have having he her here him his how i if in
+into is it its just me more most my no nor not now of off on once only or other our out over
+own same she should so some such than that the their them then there these they this those
+through to too under until up very was we were what when where which while who whom why will
+with would you your
+""".split())
+
+
+def normalize_token(token):
+    """Fold simple plurals so 'cartels' and 'cartel' share a posting"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Split text into lowercase, plural-folded word tokens"""
+    return [normalize_token(token) for token in TOKEN_PATTERN.findall(text.lower())]
+
+
+def index_terms(text):
+    """Tokenize text for indexing, dropping stopwords"""
+    return [token for token in tokenize(text) if token not in STOPWORDS]
+
+
+def flatten_text(value):
+    """Join nested string/list field values into one block of text"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return " ".join(flatten_text(item) for item in value)
+    if isinstance(value, dict):
+        return " ".join(flatten_text(item) for item in value.values())
+    return ""
+
+
+def gather_ranges(starts, lengths):
+    """Concatenate the index ranges [start, start + length) without a Python loop"""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return shifts + np.arange(total, dtype=np.int64)
+
+
+class Vocabulary:
+    """Sorted byte-string vocabulary where a term's id is its position
+
+    Lookups are a vectorized binary search, so the vocabulary can live in a
+    flat (optionally memory-mapped) array instead of a dict of Python strings.
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+
+    @classmethod
+    def from_sorted(cls, terms):
+        encoded = [term.encode("utf-8") for term in terms]
+        return cls(np.array(encoded, dtype=bytes) if encoded else np.empty(0, dtype="S1"))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def lookup(self, terms):
+        """Ids of the given terms, -1 for terms not in the vocabulary"""
+        ids = np.full(len(terms), -1, dtype=np.int64)
+        if not len(self.terms) or not terms:
+            return ids
+        width = self.terms.dtype.itemsize
+        encoded = [term.encode("utf-8") for term in terms]
+        # Longer keys would be truncated by the fixed-width cast and could match falsely
+        fits = np.fromiter((len(key) <= width for key in encoded), dtype=bool, count=len(encoded))
+        keys = np.array([key if ok else b"" for key, ok in zip(encoded, fits)], dtype=self.terms.dtype)
+        positions = np.minimum(np.searchsorted(self.terms, keys), len(self.terms) - 1)
+        found = fits & (self.terms[positions] == keys)
+        ids[found] = positions[found]
+        return ids
+
+
+class TextTable:
+    """Many strings packed into one UTF-8 buffer with offsets"""
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(chunk) for chunk in encoded])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        return self.buffer[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode("utf-8")
+
+
+class BM25Index:
+    """Multi-field BM25 ranking engine
+
+    Every field keeps its own length normalization and document frequencies,
+    so a term that is common in prose can still be decisive in a title. Each
+    (field, term) pair is a row of a term-major CSR matrix whose values are
+    the final field_weight * idf * saturated-tf contributions; scoring a query
+    is a single sparse matrix-vector product over the query's own postings.
+    """
+
+    def __init__(self, doc_keys, documents, field_weights, k1=1.2, b=0.75):
+        self.doc_keys = doc_keys if isinstance(doc_keys, range) else list(doc_keys)
+        self.field_weights = dict(field_weights)
+        self.k1 = k1
+        n_docs = len(self.doc_keys)
+        field_b = b if isinstance(b, dict) else {field: b for field in self.field_weights}
+
+        # Postings per (field, term) with raw frequencies, plus field lengths
+        postings = defaultdict(list)
+        field_lengths = {field: np.zeros(n_docs, dtype=np.float32) for field in self.field_weights}
+        for doc_idx, fields in enumerate(documents):
+            for field in self.field_weights:
+                tokens = fields.get(field, ())
+                field_lengths[field][doc_idx] = len(tokens)
+                for term, count in Counter(tokens).items():
+                    postings[f"{field}:{term}"].append((doc_idx, count))
+
+        keys = sorted(postings)
+        self.vocabulary = Vocabulary.from_sorted(keys)
+        self.indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        indices = []
+        data = []
+        for term_id, key in enumerate(keys):
+            field = key.split(":", 1)[0]
+            lengths = field_lengths[field]
+            avg_length = max(float(lengths.mean()), 1.0)
+            weight = self.field_weights[field]
+            b_field = field_b[field]
+            doc_freq = len(postings[key])
+            idf = math.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            for doc_idx, count in postings[key]:
+                norm = 1 - b_field + b_field * lengths[doc_idx] / avg_length
+                tf = count / norm
+                indices.append(doc_idx)
+                data.append(weight * idf * tf * (k1 + 1) / (k1 + tf))
+            self.indptr[term_id + 1] = len(indices)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float32)
+
+    def state(self):
+        """Arrays and JSON metadata that fully describe the index"""
+        arrays = {"vocabulary": self.vocabulary.terms, "indptr": self.indptr,
+                  "indices": self.indices, "data": self.data}
+        doc_keys = None if isinstance(self.doc_keys, range) else self.doc_keys
+        meta = {"doc_keys": doc_keys, "doc_count": len(self.doc_keys),
+                "field_weights": self.field_weights, "k1": self.k1}
+        return arrays, meta
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        index = cls.__new__(cls)
+        index.doc_keys = range(meta["doc_count"]) if meta["doc_keys"] is None else meta["doc_keys"]
+        index.field_weights = meta["field_weights"]
+        index.k1 = meta["k1"]
+        index.vocabulary = Vocabulary(arrays["vocabulary"])
+        index.indptr = arrays["indptr"]
+        index.indices = arrays["indices"]
+        index.data = arrays["data"]
+        return index
+
+    def __len__(self):
+        return len(self.doc_keys)
+
+    @cached_property
+    def doc_positions(self):
+        return {key: doc_idx for doc_idx, key in enumerate(self.doc_keys)}
+
+    def query_vector(self, query_terms):
+        """Map query terms to (row ids, query term frequencies) across every field"""
+        counts = Counter(query_terms)
+        keys = [f"{field}:{term}" for term in counts for field in self.field_weights]
+        weights = np.repeat(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)),
+                            len(self.field_weights))
+        term_ids = self.vocabulary.lookup(keys)
+        found = term_ids >= 0
+        return term_ids[found], weights[found]
+
+    def score(self, query_terms):
+        """Score every document against the query terms"""
+        term_ids, weights = self.query_vector(query_terms)
+        starts = self.indptr[term_ids]
+        lengths = self.indptr[term_ids + 1] - starts
+        positions = gather_ranges(starts, lengths)
+        contributions = self.data[positions] * np.repeat(weights, lengths)
+        return np.bincount(self.indices[positions], weights=contributions,
+                           minlength=len(self.doc_keys)).astype(np.float32)
+
+    def score_many(self, queries):
+        """Score every document against each query's terms, as one (queries, documents) matrix
+
+        The postings of all queries are gathered together and summed by a
+        single bincount over (query, document) cells, so a batch of questions
+        costs one pass over the index rather than one per question.
+        """
+        rows = []
+        keys = []
+        weights = []
+        for row, query_terms in enumerate(queries):
+            for term, count in Counter(query_terms).items():
+                for field in self.field_weights:
+                    rows.append(row)
+                    keys.append(f"{field}:{term}")
+                    weights.append(count)
+        term_ids = self.vocabulary.lookup(keys)
+        found = term_ids >= 0
+        term_ids = term_ids[found]
+        starts = self.indptr[term_ids]
+        lengths = self.indptr[term_ids + 1] - starts
+        positions = gather_ranges(starts, lengths)
+        n_docs = len(self.doc_keys)
+        cells = np.repeat(np.asarray(rows, dtype=np.int64)[found], lengths) * n_docs + self.indices[positions]
+        contributions = self.data[positions] * np.repeat(np.asarray(weights, dtype=np.float32)[found], lengths)
+        scores = np.bincount(cells, weights=contributions, minlength=len(queries) * n_docs)
+        return scores.reshape(len(queries), n_docs).astype(np.float32)
+
+    def top_k(self, scores, k):
+        """Return [(doc_idx, score)] for the k best positive scores, best first"""
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            best = np.argpartition(scores[candidates], -k)[-k:]
+            candidates = candidates[best]
+        # Highest score first, earlier documents win ties
+        order = np.lexsort((candidates, -scores[candidates]))
+        return [(int(doc_idx), float(scores[doc_idx])) for doc_idx in candidates[order]]
+
+
+def char_ngrams(text, n=3):
+    """Distinct character n-grams of whitespace-collapsed, space-padded text"""
+    padded = f" {WHITESPACE_PATTERN.sub(' ', text).strip()} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NgramIndex:
+    """Character n-gram similarity index
+
+    Approximates difflib's SequenceMatcher ratio (2 * matches / total length)
+    with the Dice coefficient over distinct trigrams, computed for every
+    document at once from an n-gram -> document CSR matrix. The lowercased
+    texts are kept so the few top candidates can be rescored exactly.
+    """
+
+    def __init__(self, texts, n=3):
+        self.n = n
+        texts = [text.lower() for text in texts]
+        self.texts = TextTable.from_strings(texts)
+
+        postings = defaultdict(list)
+        self.gram_counts = np.zeros(len(texts), dtype=np.float32)
+        for doc_idx, text in enumerate(texts):
+            grams = char_ngrams(text, n)
+            self.gram_counts[doc_idx] = len(grams)
+            for gram in grams:
+                postings[gram].append(doc_idx)
+
+        grams = sorted(postings)
+        self.vocabulary = Vocabulary.from_sorted(grams)
+        self.indptr = np.zeros(len(grams) + 1, dtype=np.int64)
+        indices = []
+        for gram_id, gram in enumerate(grams):
+            indices.extend(postings[gram])
+            self.indptr[gram_id + 1] = len(indices)
+        self.indices = np.asarray(indices, dtype=np.int32)
+
+    def state(self):
+        """Arrays and JSON metadata that fully describe the index"""
+        arrays = {"vocabulary": self.vocabulary.terms, "indptr": self.indptr, "indices": self.indices,
+                  "gram_counts": self.gram_counts, "text_buffer": self.texts.buffer,
+                  "text_offsets": self.texts.offsets}
+        return arrays, {"n": self.n}
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        index = cls.__new__(cls)
+        index.n = meta["n"]
+        index.texts = TextTable(arrays["text_buffer"], arrays["text_offsets"])
+        index.gram_counts = arrays["gram_counts"]
+        index.vocabulary = Vocabulary(arrays["vocabulary"])
+        index.indptr = arrays["indptr"]
+        index.indices = arrays["indices"]
+        return index
+
+    def similarity(self, query):
+        """Approximate similarity of the query to every document, in [0, 1]"""
+        grams = char_ngrams(query.lower(), self.n)
+        gram_ids = self.vocabulary.lookup(list(grams))
+        gram_ids = gram_ids[gram_ids >= 0]
+        starts = self.indptr[gram_ids]
+        positions = gather_ranges(starts, self.indptr[gram_ids + 1] - starts)
+        overlap = np.bincount(self.indices[positions], minlength=len(self.texts)).astype(np.float32)
+        return 2 * overlap / np.maximum(len(grams) + self.gram_counts, 1)
+
+    def similarity_many(self, queries):
+        """similarity() of each query to every document, as one (queries, documents) matrix"""
+        grams = [char_ngrams(query.lower(), self.n) for query in queries]
+        sizes = np.array([len(query_grams) for query_grams in grams], dtype=np.int64)
+        gram_ids = self.vocabulary.lookup([gram for query_grams in grams for gram in query_grams])
+        found = gram_ids >= 0
+        gram_ids = gram_ids[found]
+        starts = self.indptr[gram_ids]
+        lengths = self.indptr[gram_ids + 1] - starts
+        positions = gather_ranges(starts, lengths)
+        n_docs = len(self.texts)
+        rows = np.repeat(np.arange(len(queries), dtype=np.int64), sizes)[found]
+        cells = np.repeat(rows, lengths) * n_docs + self.indices[positions]
+        overlap = np.bincount(cells, minlength=len(queries) * n_docs).reshape(len(queries), n_docs).astype(np.float32)
+        return 2 * overlap / np.maximum(sizes[:, None].astype(np.float32) + self.gram_counts, 1)
+
+    def exact_similarity(self, query, doc_idx):
+        """SequenceMatcher ratio between the query and one document"""
+        return SequenceMatcher(None, query.lower(), self.texts[doc_idx]).ratio()
+
+
+# Topic names outrank keywords, which outrank prose
+TOPIC_FIELD_WEIGHTS = {"title": 3.0, "keywords": 2.0, "definition": 1.0, "sections": 0.5}
+TRANSCRIPT_FIELD_WEIGHTS = {"title": 2.0, "topics": 2.0, "body": 1.0}
+PASSAGE_FIELD_WEIGHTS = {"body": 1.0}
+
+
+def build_topic_index(topics):
+    """Build a BM25 index over normalized knowledge base topics"""
+    documents = [{field: entry.fields[field].terms for field in TOPIC_FIELD_WEIGHTS} for entry in topics.values()]
+    return BM25Index(topics.keys(), documents, TOPIC_FIELD_WEIGHTS)
+
+
+def build_transcript_index(videos):
+    """Build a BM25 index over normalized video transcripts"""
+    documents = [{field: entry.fields[field].terms for field in TRANSCRIPT_FIELD_WEIGHTS} for entry in videos.values()]
+    return BM25Index(videos.keys(), documents, TRANSCRIPT_FIELD_WEIGHTS)
+
+
+def build_passage_index(passages):
+    """Build a BM25 index over transcript passages, keyed by passage position"""
+    documents = [{"body": index_terms(passage.text)} for passage in passages]
+    return BM25Index(range(len(passages)), documents, PASSAGE_FIELD_WEIGHTS)
@@ -199,20 +199,31 @@ async function sendMessage() {
     addChatMessage('<i class="fas fa-spinner fa-spin"></i> Thinking...', 'bot', loadingId);
     
     try {
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ message: message })
         });
         
-        const data = await response.json();
-        removeChatMessage(loadingId);
-        
-        if (data.response) {
-            addChatMessage(data.response, 'bot');
-        } else if (data.error) {
-            addChatMessage('Sorry, there was an error: ' + data.error, 'bot');
+        if (!response.ok || !response.body) {
+            const data = await response.json();
+            removeChatMessage(loadingId);
+            addChatMessage('Sorry, there was an error: ' + (data.error || response.statusText), 'bot');
+            return;
         }
+        
+        // Render the answer as its chunks arrive; the loading bubble becomes the reply
+        let answer = '';
+        await readEventStream(response, (event, data) => {
+            if (event === 'chunk') {
+                answer += data.text;
+                updateChatMessage(loadingId, answer);
+            } else if (event === 'done' && data.citations && data.citations.length) {
+                updateChatMessage(loadingId, answer + '\n\n' + formatCitations(data.citations));
+            } else if (event === 'error') {
+                updateChatMessage(loadingId, 'Sorry, there was an error: ' + data.error);
+            }
+        });
     } catch (error) {
         console.error('Chat error:', error);
         removeChatMessage(loadingId);
@@ -223,6 +234,13 @@ async function sendMessage() {
     }
 }
 
+function formatCitations(citations) {
+    const sources = citations.map(citation => citation.type === 'video'
+        ? `[${citation.id}] ${citation.title} (${citation.timestamp})`
+        : `[${citation.id}] ${citation.title}`);
+    return '**Sources:** ' + sources.join(' · ');
+}
+
 function addChatMessage(text, sender, id = null) {
     const messagesContainer = document.getElementById('chat-messages');
     if (!messagesContainer) return;
@@ -250,6 +268,48 @@ function addChatMessage(text, sender, id = null) {
     }
 }
 
+function updateChatMessage(id, text) {
+    const message = document.getElementById(id);
+    if (!message) return;
+    
+    message.querySelector('.message-content').innerHTML = formatMessage(text);
+    
+    const chatContainer = document.getElementById('chat-container');
+    if (chatContainer) {
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    }
+}
+
+async function readEventStream(response, onEvent) {
+    // Parse a text/event-stream body and call onEvent(event, data) for each event
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            const dataLines = [];
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trimStart());
+                }
+            }
+            if (dataLines.length) onEvent(event, JSON.parse(dataLines.join('\n')));
+        }
+    }
+}
+
 function removeChatMessage(id) {
     const message = document.getElementById(id);
     if (message) message.remove();
@@ -329,6 +389,9 @@ async function askVideoQuestion(videoId) {
         
         if (data.response) {
             answerDiv.innerHTML = `<div class="response">${formatMessage(data.response)}</div>`;
+            if (data.passages && data.passages.length) {
+                answerDiv.innerHTML += renderPassageLinks(videoId, data.passages);
+            }
         } else if (data.answer) {
             answerDiv.innerHTML = `<div class="response">${formatMessage(data.answer)}</div>`;
         } else if (data.error) {
@@ -345,6 +408,30 @@ async function askVideoQuestion(videoId) {
     }
 }
 
+function formatTimestamp(ms) {
+    const totalSeconds = Math.floor(ms / 1000);
+    const hours = Math.floor(totalSeconds / 3600);
+    const minutes = Math.floor((totalSeconds % 3600) / 60);
+    const seconds = String(totalSeconds % 60).padStart(2, '0');
+    return hours ? `${hours}:${String(minutes).padStart(2, '0')}:${seconds}` : `${minutes}:${seconds}`;
+}
+
+function renderPassageLinks(videoId, passages) {
+    const links = passages.map(passage => `
+        <button class="passage-seek" onclick="seekVideo('${videoId}', ${passage.start_ms})" title="${escapeHtml(passage.text).replace(/"/g, '&quot;')}">
+            <i class="fas fa-play"></i> ${formatTimestamp(passage.start_ms)}
+        </button>
+    `).join('');
+    return `<div class="passage-links"><span>Jump to:</span>${links}</div>`;
+}
+
+function seekVideo(videoId, startMs) {
+    // Reload the embed at the passage start; the plain iframe has no JS player API
+    const player = document.getElementById(`video-player-${videoId}`);
+    if (!player) return;
+    player.src = `https://www.youtube.com/embed/${videoId}?start=${Math.floor(startMs / 1000)}&autoplay=1`;
+}
+
 // ============== QUIZ FUNCTIONS ==============
 async function loadQuizData() {
     try {
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Build indexes from the embedded content rather than any snapshot on disk
+os.environ.setdefault("INDEX_SNAPSHOT", "")
+os.environ.setdefault("VECTOR_SNAPSHOT", "")
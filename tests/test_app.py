@@ -0,0 +1,92 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import app as study_app
+import asgi
+
+VIDEO_ID = next(iter(study_app.VIDEO_TRANSCRIPTS))
+
+
+@pytest.fixture
+def client():
+    return study_app.app.test_client()
+
+
+@pytest.mark.parametrize("top_k, passages", [(None, 3), (1, 1), ("2", 2), (0, 1), (500, study_app.MAX_VIDEO_PASSAGES)])
+def test_video_question_clamps_top_k(client, top_k, passages):
+    body = {"question": "what is an oligopoly"}
+    if top_k is not None:
+        body["top_k"] = top_k
+    response = client.post(f"/api/video/{VIDEO_ID}/ask", json=body)
+    assert response.status_code == 200
+    start, end = study_app.PASSAGES.ranges[VIDEO_ID]
+    assert len(response.get_json()["passages"]) == min(passages, end - start)
+
+
+@pytest.mark.parametrize("top_k", ["x", 2.5, True, [3], {"k": 3}])
+def test_video_question_rejects_non_integer_top_k(client, top_k):
+    response = client.post(f"/api/video/{VIDEO_ID}/ask", json={"question": "what is an oligopoly", "top_k": top_k})
+    assert response.status_code == 400
+    assert "top_k" in response.get_json()["error"]
+
+
+def test_async_video_question_rejects_non_integer_top_k():
+    scope = {"method": "POST", "path": f"/api/video/{VIDEO_ID}/ask", "headers": [], "query_string": b""}
+    body = json.dumps({"question": "what is an oligopoly", "top_k": "x"}).encode()
+    request = asgi.Request(scope, body, {"video_id": VIDEO_ID}, time.monotonic())
+    status, payload = asyncio.run(asgi.ask_video_question(request))
+    assert status == 400 and "top_k" in payload["error"]
+
+
+def test_chat_answers_from_the_knowledge_base(client):
+    response = client.post("/api/chat", json={"message": "What is a Nash equilibrium?"})
+    assert response.status_code == 200
+    assert "Nash Equilibrium" in response.get_json()["response"]
+
+
+def test_async_retrieval_does_not_block_the_event_loop(monkeypatch):
+    def slow_vector_arm(query, kind, keys=None):
+        time.sleep(0.3)
+        return []
+
+    monkeypatch.setattr(study_app, "RETRIEVAL_ARMS", ["lexical", "vector"])
+    monkeypatch.setattr(study_app, "vector_matches", slow_vector_arm)
+    monkeypatch.setitem(study_app.RETRIEVAL_BUDGETS, "vector", 0.2)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        answer = await study_app.answer_question_async("How does a cartel keep its members from cheating today?")
+        ticking.cancel()
+        return answer, ticks
+
+    (answer, cacheable), ticks = asyncio.run(run())
+    assert answer["response"] and cacheable
+    # The vector arm's 200 ms budget was spent off the loop
+    assert ticks >= 10
+
+
+def test_reloaded_indexes_are_shared_and_search_vectors_preload(monkeypatch):
+    monkeypatch.setattr(study_app, "DEFAULT_NOTEBOOK", study_app.DEFAULT_NOTEBOOK)
+    study_app.reload_content()
+    arrays, _ = study_app.SEARCH.state()
+    assert arrays and not any(array.flags.writeable for array in arrays.values())
+
+    assert study_app.DEFAULT_NOTEBOOK._vectors is None
+    monkeypatch.setattr(study_app, "SEMANTIC_SEARCH", False)
+    study_app.preload_vectors()
+    assert study_app.DEFAULT_NOTEBOOK._vectors is None
+    assert study_app.app.test_client().get("/api/search?q=cartel").status_code == 404
+    monkeypatch.setattr(study_app, "SEMANTIC_SEARCH", True)
+    study_app.preload_vectors()
+    assert not study_app.DEFAULT_NOTEBOOK.vectors.vectors.flags.writeable
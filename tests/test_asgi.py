@@ -0,0 +1,92 @@
+import asyncio
+import json
+import threading
+
+import app as study_app
+import asgi
+from notebooks import NotebookStore
+
+
+def call(application, method, path, body=None):
+    """Run one request through an ASGI app; returns (status, headers, [body chunks])"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": [(b"content-type", b"application/json")]}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": payload}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start = messages[0]
+    chunks = [message["body"] for message in messages[1:] if message["body"]]
+    return start["status"], dict(start["headers"]), chunks
+
+
+def test_notebook_chat_is_served_by_the_async_handler(monkeypatch):
+    handled = []
+    original = asgi.StudyApplication.in_notebook
+
+    async def in_notebook(self, notebook_id, handler, request):
+        handled.append((notebook_id, handler.__name__))
+        return await original(self, notebook_id, handler, request)
+
+    monkeypatch.setattr(asgi.StudyApplication, "in_notebook", in_notebook)
+    status, _, chunks = call(asgi.application, "POST", f"/api/notebooks/{study_app.BUILTIN_NOTEBOOK_ID}/chat",
+                             {"message": "What is a Nash equilibrium?"})
+    assert status == 200
+    assert "Nash Equilibrium" in json.loads(b"".join(chunks))["response"]
+    assert handled == [(study_app.BUILTIN_NOTEBOOK_ID, "chat")]
+
+
+def test_unknown_notebook_is_a_json_404():
+    status, _, chunks = call(asgi.application, "POST", "/api/notebooks/no-such-course/chat", {"message": "hi"})
+    assert status == 404
+    assert json.loads(b"".join(chunks)) == {"error": "Notebook not found"}
+
+
+def test_malformed_notebook_is_a_json_500(tmp_path, monkeypatch):
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "notebook.json").write_text("{")
+    monkeypatch.setattr(study_app, "NOTEBOOKS", NotebookStore(str(tmp_path)))
+    status, _, chunks = call(asgi.application, "POST", "/api/notebooks/broken/chat", {"message": "hi"})
+    assert status == 500
+    assert json.loads(b"".join(chunks)) == {"error": study_app.NOTEBOOK_INVALID_MESSAGE}
+
+
+def test_bridge_sends_each_chunk_as_the_app_yields_it():
+    released = threading.Event()
+
+    def streaming_app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "application/x-ndjson")])
+        yield b"first\n"
+        # Only reached once the first line has been sent on
+        assert released.wait(5)
+        yield b"second\n"
+
+    bridge = asgi.WsgiBridge(streaming_app, max_threads=2)
+    scope = {"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+        if message.get("body") == b"first\n":
+            released.set()
+
+    asyncio.run(bridge(scope, receive, send))
+    assert [message.get("body") for message in sent[1:]] == [b"first\n", b"second\n", b""]
+
+
+def test_traffic_log_records_the_same_endpoints_as_flask(monkeypatch, tmp_path):
+    log = tmp_path / "traffic.jsonl"
+    monkeypatch.setattr(study_app, "TRAFFIC_LOG", str(log))
+    call(asgi.application, "POST", "/api/chat", {"message": "What is an oligopoly?"})
+    call(asgi.application, "POST", "/api/chat/stream", {"message": "What is an oligopoly?"})
+    entries = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [entry["path"] for entry in entries] == ["/api/chat"]
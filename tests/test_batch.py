@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import app as study_app
+
+VIDEO_ID = next(iter(study_app.VIDEO_TRANSCRIPTS))
+QUESTIONS = ["What is an oligopoly?", "Explain the prisoner's dilemma", "What is a Nash equilibrium?"]
+
+
+@pytest.fixture
+def client():
+    study_app.RESPONSE_CACHE.clear()
+    return study_app.app.test_client()
+
+
+def test_results_come_back_in_request_order(client):
+    response = client.post("/api/chat/batch", json={"questions": QUESTIONS})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert [result["question"] for result in results] == QUESTIONS
+
+
+def test_batch_answers_match_single_chat_answers(client):
+    results = client.post("/api/chat/batch", json={"questions": QUESTIONS}).get_json()["results"]
+    study_app.RESPONSE_CACHE.clear()
+    for result in results:
+        single = client.post("/api/chat", json={"message": result["question"]}).get_json()
+        assert result["response"] == single["response"]
+
+
+def test_duplicate_questions_are_answered_once(client, monkeypatch):
+    calls = []
+    answer_question = study_app.answer_question
+
+    def counting(query, video_id=None, analysis=None):
+        calls.append((query, video_id))
+        return answer_question(query, video_id, analysis)
+
+    monkeypatch.setattr(study_app, "answer_question", counting)
+    questions = [QUESTIONS[0], {"question": QUESTIONS[0], "video_id": VIDEO_ID}, QUESTIONS[0]]
+    results = client.post("/api/chat/batch", json={"questions": questions}).get_json()["results"]
+    assert sorted(calls, key=repr) == sorted([(QUESTIONS[0], None), (QUESTIONS[0], VIDEO_ID)], key=repr)
+    assert results[0]["response"] == results[2]["response"]
+    assert [result["video_id"] for result in results] == [None, VIDEO_ID, None]
+
+
+@pytest.mark.parametrize("questions", [[], "what is a cartel", [{"question": ""}],
+                                       [{"question": "what is a cartel", "video_id": "no-such-video"}]])
+def test_malformed_batches_are_rejected(client, questions):
+    response = client.post("/api/chat/batch", json={"questions": questions})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_streamed_batch_is_one_json_object_per_line(client):
+    response = client.post("/api/chat/batch", json={"questions": QUESTIONS + [QUESTIONS[1]], "stream": True})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    body = response.get_data(as_text=True)
+    assert body.endswith("\n")
+    results = [json.loads(line) for line in body.splitlines()]
+    assert sorted(result["index"] for result in results) == [0, 1, 2, 3]
+    assert all(result["question"] == (QUESTIONS + [QUESTIONS[1]])[result["index"]] for result in results)
@@ -0,0 +1,82 @@
+from caching import QuestionEmbedder, ResponseCache, SemanticCache, normalize_query
+
+DOCUMENTS = ["An oligopoly is a market dominated by a few firms", "A monopoly has a single seller"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_query_folds_case_punctuation_and_stopwords():
+    assert normalize_query("What is an  Oligopoly?") == normalize_query("what is oligopoly") == "what oligopoly"
+    assert normalize_query("Why oligopoly?") != normalize_query("What oligopoly?")
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl=10, clock=clock)
+    cache.put("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_new_content_version_drops_every_entry():
+    cache = ResponseCache()
+    cache.put("a", 1, version="v1")
+    assert cache.get("a", version="v1") == 1
+    assert cache.get("a", version="v2") is None
+    stats = cache.stats()
+    assert (stats["size"], stats["invalidations"], stats["hits"], stats["misses"]) == (0, 1, 1, 1)
+
+
+def test_rephrased_question_hits_the_semantic_cache():
+    embedder = QuestionEmbedder(DOCUMENTS, dim=256)
+    cache = SemanticCache(dim=256, max_size=4, threshold=0.9)
+    cache.put(embedder.embed("What is an oligopoly?"), "answer")
+    value, similarity = cache.get(embedder.embed("define oligopoly"))
+    assert value == "answer" and similarity >= 0.9
+    assert cache.get(embedder.embed("Why is an oligopoly unstable?")) is None
+
+
+def test_semantic_cache_keeps_scopes_apart_and_evicts_least_recently_used():
+    embedder = QuestionEmbedder(DOCUMENTS, dim=256)
+    cache = SemanticCache(dim=256, max_size=2)
+    oligopoly, monopoly, firms = (embedder.embed(text) for text in ("oligopoly", "monopoly", "few firms"))
+    cache.put(oligopoly, "general")
+    assert cache.get(oligopoly, scope="video1") is None
+
+    cache.put(monopoly, "monopoly")
+    assert cache.get(oligopoly)[0] == "general"
+    cache.put(firms, "firms")
+    assert cache.get(monopoly) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_semantic_entries_expire_and_follow_the_content_version():
+    clock = FakeClock()
+    embedder = QuestionEmbedder(DOCUMENTS, dim=256)
+    cache = SemanticCache(dim=256, ttl=10, clock=clock)
+    vector = embedder.embed("oligopoly")
+    cache.put(vector, "answer", version="v1")
+    assert cache.get(vector, version="v2") is None
+    cache.put(vector, "answer", version="v2")
+    clock.now = 10
+    assert cache.get(vector, version="v2") is None
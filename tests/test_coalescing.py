@@ -0,0 +1,175 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from coalescing import FileFlight, SingleFlight, StreamAbandoned, StreamFlight
+
+
+def test_concurrent_threads_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("q", compute))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(role for _, role in results) == ["follower", "follower", "follower", "leader"]
+    assert {result for result, _ in results} == {"answer"}
+
+
+def test_unrelated_keys_do_not_wait_on_each_other(tmp_path):
+    flight = FileFlight(str(tmp_path), wait_timeout=5)
+    held = flight._acquire("first question")
+    try:
+        started = time.monotonic()
+        assert flight.do("second question", lambda: "second") == ("second", "leader")
+        assert time.monotonic() - started < 1
+    finally:
+        flight._release(held)
+
+
+def test_waiter_reuses_the_published_result(tmp_path):
+    flight = FileFlight(str(tmp_path), wait_timeout=5)
+    held = flight._acquire("q")
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(flight.do("q", lambda: "recomputed")))
+    waiter.start()
+    time.sleep(0.05)
+    flight._write("q", "published")
+    flight._release(held)
+    waiter.join()
+    assert results == [("published", "shared")]
+
+
+def test_unpublishable_results_stay_with_the_worker(tmp_path):
+    flight = FileFlight(str(tmp_path), publish=lambda result: result[1])
+    assert flight.do("q", lambda: ("fallback", False)) == (("fallback", False), "leader")
+    assert not any(name.startswith("result_") for name in os.listdir(tmp_path))
+
+    flight.do("q", lambda: ("answer", True))
+    assert any(name.startswith("result_") for name in os.listdir(tmp_path))
+
+
+def test_ado_keeps_the_event_loop_free_while_waiting(tmp_path):
+    flight = FileFlight(str(tmp_path), wait_timeout=5)
+    held = flight._acquire("q")
+
+    async def compute():
+        return "answer"
+
+    async def main():
+        ticks = 0
+        task = asyncio.create_task(flight.ado("q", compute))
+        while ticks < 5:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not task.done()
+        await asyncio.to_thread(flight._release, held)
+        return await task
+
+    assert asyncio.run(main()) == ("answer", "leader")
+
+
+def test_prune_removes_stale_results_and_idle_locks(tmp_path):
+    flight = FileFlight(str(tmp_path), result_ttl=60)
+    flight.do("idle", lambda: "answer")
+    held = flight._acquire("busy")
+    stale = time.time() - 120
+    for name in os.listdir(tmp_path):
+        os.utime(tmp_path / name, (stale, stale))
+
+    flight.prune()
+    assert os.listdir(tmp_path) == [os.path.basename(flight._lock_path("busy"))]
+    flight._release(held)
+
+
+def test_concurrent_streams_share_one_producer():
+    flight = StreamFlight()
+    release = threading.Event()
+    calls = []
+
+    def produce():
+        calls.append(1)
+        yield "a"
+        release.wait(5)
+        yield "b"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(list(flight.stream("q", produce)))) for _ in range(3)]
+    threads[0].start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [["a", "b"]] * 3
+    assert flight.in_flight() == 0
+
+
+def test_stream_error_reaches_followers():
+    flight = StreamFlight()
+    release = threading.Event()
+
+    def produce():
+        yield "a"
+        release.wait(5)
+        raise ValueError("broken")
+
+    leader = flight.stream("q", produce)
+    assert next(leader) == "a"
+    follower = flight.stream("q", produce)
+    assert next(follower) == "a"
+    release.set()
+    with pytest.raises(ValueError):
+        next(leader)
+    with pytest.raises(ValueError):
+        next(follower)
+
+
+def test_async_streams_share_one_producer_and_end_when_the_leader_is_abandoned():
+    flight = StreamFlight()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        for item in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield item
+
+    async def collect():
+        return [item async for item in flight.astream("q", produce)]
+
+    async def main():
+        shared = await asyncio.gather(collect(), collect())
+        leader = flight.astream("q", produce)
+        assert await leader.__anext__() == "a"
+        follower = asyncio.create_task(collect())
+        await asyncio.sleep(0)
+        await leader.aclose()
+        with pytest.raises(StreamAbandoned):
+            await follower
+        return shared
+
+    assert asyncio.run(main()) == [["a", "b", "c"]] * 2
+    assert len(calls) == 2
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from content_db import ContentDB, ContentDBError, write_content_db
+from corpus import NormalizedCorpus
+
+KNOWLEDGE_BASE = {
+    "collusion": {"definition": "Collusion is when firms agree to fix prices and act like a cartel.",
+                  "keywords": ["cartel", "agreement"]},
+    "game_theory": {"definition": "Game theory studies strategic decisions between players.",
+                    "keywords": ["strategy", "payoff"]},
+}
+VIDEO_TRANSCRIPTS = {
+    "vid1": {"title": "Cartels", "topics": ["collusion"],
+             "passages": [{"start_ms": 0, "end_ms": 5000, "text": "A cartel restricts output to raise prices."},
+                          {"start_ms": 5000, "end_ms": 9000, "text": "Members are tempted to cheat on the agreement."}]},
+    "vid2": {"title": "Games", "topics": ["game theory"],
+             "passages": [{"start_ms": 0, "end_ms": 4000, "text": "Each player picks the strategy with the best payoff."}]},
+}
+FLASHCARDS = [{"term": "Cartel", "definition": "A formal collusive agreement"}]
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "content.db")
+    passages = NormalizedCorpus(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS).passages
+    write_content_db(path, KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS, [], [], FLASHCARDS, passages, "fingerprint")
+    return ContentDB(path, pool_size=1)
+
+
+def test_content_round_trips_without_transcript_text(db):
+    knowledge_base, video_transcripts, videos, quiz_questions, flashcards = db.content()
+    assert knowledge_base == KNOWLEDGE_BASE
+    assert video_transcripts == {"vid1": {"title": "Cartels", "topics": ["collusion"]},
+                                 "vid2": {"title": "Games", "topics": ["game theory"]}}
+    assert flashcards == FLASHCARDS
+    assert db.meta()["fingerprint"] == "fingerprint"
+
+
+def test_fts_ranking_prefers_keyword_and_title_matches(db):
+    assert db.search_topics("what is a cartel", k=1)[0][0] == "collusion"
+    assert [video_id for video_id, _ in db.search_transcripts("what is game theory")] == ["vid2"]
+    assert db.search_topics("the of and") == []
+
+
+def test_passage_search_can_be_restricted_to_one_video(db):
+    assert [idx for idx, _ in db.search_passages("cheat on the agreement")][0] == 1
+    assert db.search_passages("strategy", video_id="vid1") == []
+
+
+def test_stored_passages_match_the_passage_store(db):
+    passages = db.passages()
+    expected = NormalizedCorpus(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS).passages
+    assert len(passages) == len(expected) == 3
+    assert passages.ranges == expected.ranges == {"vid1": (0, 2), "vid2": (2, 3)}
+    assert passages[2].to_dict() == expected[2].to_dict()
+    assert [passage.text for passage in passages] == [passage.text for passage in expected]
+    with pytest.raises(IndexError):
+        passages[3]
+
+
+def test_incompatible_files_are_rejected(tmp_path):
+    with pytest.raises(ContentDBError):
+        ContentDB(str(tmp_path / "missing.db"))
+    path = str(tmp_path / "other.db")
+    sqlite3.connect(path).execute("CREATE TABLE meta (key TEXT, value TEXT)").connection.commit()
+    with pytest.raises(ContentDBError):
+        ContentDB(path)
@@ -0,0 +1,55 @@
+from corpus import NormalizedCorpus, NormalizedText, PassageStore, chunk_segments, estimate_segments
+
+
+def segments(count, words=10, seconds=4.0):
+    return [{"text": " ".join(f"w{idx}_{word}" for word in range(words)), "start": idx * seconds, "duration": seconds}
+            for idx in range(count)]
+
+
+def test_normalized_text_folds_case_and_plurals_and_drops_stopwords():
+    text = NormalizedText("The Cartels  restrict OUTPUT")
+    assert text.lower == "the cartels  restrict output"
+    assert text.tokens == ("the", "cartel", "restrict", "output")
+    assert text.terms == ("cartel", "restrict", "output")
+
+
+def test_estimated_segments_follow_the_speaking_rate():
+    assert estimate_segments("five words in this line\n\n  two words ") == [
+        {"text": "five words in this line", "start": 0.0, "duration": 2.0},
+        {"text": "two words", "start": 2.0, "duration": 0.8},
+    ]
+
+
+def test_passages_cover_every_segment_with_overlap_and_timestamps():
+    passages = chunk_segments("vid", segments(20), window_words=40, overlap_words=10)
+    assert passages[0].start_ms == 0 and passages[0].end_ms == 16000
+    assert passages[0].text.split()[0] == "w0_0"
+    assert passages[-1].text.split()[-1] == "w19_9"
+    for previous, current in zip(passages, passages[1:]):
+        # Each passage starts one segment before the previous one ended
+        assert current.start_ms == previous.end_ms - 4000
+        assert len(current.text.split()) <= 40
+
+
+def test_short_transcript_is_one_passage():
+    passages = chunk_segments("vid", segments(2))
+    assert len(passages) == 1
+    assert (passages[0].start_ms, passages[0].end_ms) == (0, 8000)
+
+
+def test_passage_store_keeps_each_video_contiguous_and_round_trips():
+    corpus = NormalizedCorpus({}, {
+        "a": {"title": "A", "segments": segments(30)},
+        "b": {"title": "B", "passages": [{"start_ms": 5, "end_ms": 9, "text": "ingested passage"}]},
+        "c": {"title": "C", "content": ""},
+    })
+    store = corpus.passages
+    start, end = store.ranges["b"]
+    assert end - start == 1
+    assert store[start].to_dict() == {"video_id": "b", "start_ms": 5, "end_ms": 9, "text": "ingested passage"}
+    assert store.ranges["c"][0] == store.ranges["c"][1]
+    assert all(store[idx].video_id == "a" for idx in range(*store.ranges["a"]))
+
+    restored = PassageStore.from_state(*store.state())
+    assert [passage.to_dict() for passage in restored] == [passage.to_dict() for passage in store]
+    assert restored.ranges == store.ranges
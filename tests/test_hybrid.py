@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+import app as study_app
+from hybrid import HybridRanker, reciprocal_rank_fusion
+
+
+def test_keys_ranked_by_both_arms_beat_keys_ranked_by_one():
+    fused = reciprocal_rank_fusion({"lexical": ["a", "b", "c"], "vector": ["c", "a"]}, k=60)
+    assert [key for key, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[2][1] == pytest.approx(1 / 62)
+
+
+def test_weights_and_ties():
+    assert [key for key, _ in reciprocal_rank_fusion({"lexical": ["a"], "vector": ["b"]})] == ["a", "b"]
+    weighted = reciprocal_rank_fusion({"lexical": ["a"], "vector": ["b"]}, weights={"vector": 2.0})
+    assert [key for key, _ in weighted] == ["b", "a"]
+
+
+def test_rank_keeps_each_arms_own_scores():
+    ranker = HybridRanker({"lexical": 1, "vector": 1})
+    fused = ranker.rank({"lexical": lambda: [("a", 7.5), ("b", 2.0)], "vector": lambda: [("b", 0.9)]})
+    assert [(key, scores) for key, _, scores in fused] == [("b", {"lexical": 2.0, "vector": 0.9}),
+                                                           ("a", {"lexical": 7.5})]
+
+
+def test_late_arms_are_left_out_and_saturated_arms_skipped():
+    outcomes = []
+    ranker = HybridRanker({"fast": 1, "slow": 0.05}, max_workers=1,
+                          on_arm=lambda arm, outcome, seconds: outcomes.append((arm, outcome)))
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return [("late", 1.0)]
+
+    try:
+        # The slow arm holds the only worker, so the fast arm cannot start
+        assert ranker.rank({"slow": slow, "fast": lambda: [("a", 1.0)]}) == []
+        assert outcomes == [("fast", "skipped"), ("slow", "timeout")]
+        # With the pool still saturated, the first arm answers inline
+        outcomes.clear()
+        assert [key for key, _, _ in ranker.rank({"fast": lambda: [("a", 1.0)], "slow": slow})] == ["a"]
+        assert outcomes == [("fast", "skipped"), ("slow", "skipped"), ("fast", "ok")]
+    finally:
+        release.set()
+    while ranker.in_flight:
+        time.sleep(0.001)
+
+
+def test_a_failing_arm_is_dropped_unless_every_arm_fails():
+    def broken():
+        raise ValueError("broken")
+
+    ranker = HybridRanker({"lexical": 1, "vector": 1})
+    assert [key for key, _, _ in ranker.rank({"lexical": lambda: [("a", 1.0)], "vector": broken})] == ["a"]
+    with pytest.raises(ValueError):
+        ranker.rank({"lexical": broken, "vector": broken})
+
+
+def test_hybrid_passages_keep_relevance_apart_from_the_fused_score(monkeypatch):
+    monkeypatch.setattr(study_app, "RETRIEVAL_ARMS", ["lexical", "vector"])
+    monkeypatch.setattr(study_app, "vector_matches", lambda query, kind, keys=None: [])
+    video_id = next(iter(study_app.PASSAGES.ranges))
+    found = study_app.find_passages("cartel prices", video_id, 3)
+    assert found
+    for passage, scores, fused in found:
+        result = study_app.passage_result(passage, scores, fused)
+        assert result["score"] == scores["lexical"] > 0
+        assert result["rrf_score"] == fused < result["score"]
+        assert "similarity" not in result
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+import app as study_app
+import index_snapshot
+from index_snapshot import SearchIndexes, SnapshotError, content_fingerprint, read_snapshot, write_snapshot
+
+KNOWLEDGE_BASE = {
+    "oligopoly": {"definition": "A market dominated by a few firms", "keywords": ["few sellers", "cartel"]},
+    "monopoly": {"definition": "A market with a single seller", "keywords": ["single seller"]},
+}
+VIDEO_TRANSCRIPTS = {"abc123": {"title": "Cartels", "topics": ["collusion"],
+                                "content": "Firms in a cartel agree to restrict output and raise prices."}}
+
+
+def test_arrays_and_metadata_round_trip(tmp_path):
+    path = str(tmp_path / "test.snapshot")
+    arrays = {"floats": np.arange(6, dtype=np.float32).reshape(2, 3), "empty": np.empty(0, dtype=np.int64),
+              "terms": np.array([b"cartel", b"firm"])}
+    write_snapshot(path, arrays, {"answer": 42})
+    loaded, meta = read_snapshot(path)
+    assert meta == {"answer": 42}
+    for name, array in arrays.items():
+        assert loaded[name].dtype == array.dtype and np.array_equal(loaded[name], array)
+
+
+def test_search_indexes_load_only_for_their_fingerprint(tmp_path):
+    path = str(tmp_path / "index.snapshot")
+    search = SearchIndexes.build(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS)
+    search.save(path, "fingerprint")
+    assert SearchIndexes.load(path, "other") is None
+
+    loaded = SearchIndexes.load(path, "fingerprint")
+    terms = ["cartel", "price"]
+    assert np.array_equal(loaded.topic_index.score(terms), search.topic_index.score(terms))
+    assert np.array_equal(loaded.passage_index.score(terms), search.passage_index.score(terms))
+    assert [passage.text for passage in loaded.passages] == [passage.text for passage in search.passages]
+    assert loaded.videos == {"abc123": {"title": "Cartels", "topics": ["collusion"]}}
+
+
+@pytest.mark.parametrize("corrupt, message", [
+    (lambda data: data[:4], "truncated"),
+    (lambda data: b"NOTANIDX" + data[8:], "not an index snapshot"),
+    (lambda data: data[:8] + (index_snapshot.SNAPSHOT_VERSION + 1).to_bytes(4, "little") + data[12:], "format version"),
+])
+def test_unreadable_snapshots_raise_snapshot_error(tmp_path, corrupt, message):
+    path = tmp_path / "index.snapshot"
+    write_snapshot(str(path), {"values": np.ones(3)}, {})
+    path.write_bytes(corrupt(path.read_bytes()))
+    with pytest.raises(SnapshotError, match=message):
+        read_snapshot(str(path))
+
+
+def test_reingested_transcript_of_the_same_size_changes_the_fingerprint(tmp_path):
+    record = tmp_path / "abc123.json"
+    record.write_text('{"content": "first"}')
+    before = content_fingerprint(KNOWLEDGE_BASE, {}, str(tmp_path))
+    record.write_text('{"content": "again"}')
+    stat = record.stat()
+    os.utime(record, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert content_fingerprint(KNOWLEDGE_BASE, {}, str(tmp_path)) != before
+
+
+def test_main_refuses_to_snapshot_a_content_db_app(monkeypatch, tmp_path):
+    monkeypatch.setenv("INDEX_SNAPSHOT", "")
+    monkeypatch.setenv("CONTENT_DB", "")
+    monkeypatch.setattr(study_app, "SEARCH", SearchIndexes(None, None, None, None, study_app.PASSAGES, {}))
+    output = tmp_path / "index.snapshot"
+    assert index_snapshot.main(["--output", str(output)]) == 1
+    assert not output.exists()
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+import ingest
+from ingest import (FixtureTransport, PermanentFetchError, build_record, fetch_with_retries, load_transcript_store,
+                    normalize_segments, read_ids_file, write_record)
+
+SEGMENTS = [
+    {"text": "  prices  rise\n", "start": 4, "duration": 2},
+    {"text": "firms in a cartel", "start": 0, "duration": 4},
+    {"text": "   ", "start": 6, "duration": 1},
+]
+
+
+class FlakyTransport:
+    def __init__(self, failures, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def fetch(self, video_id):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("try again")
+        return {"segments": SEGMENTS}
+
+
+def test_segments_are_cleaned_and_ordered():
+    assert normalize_segments(SEGMENTS) == [
+        {"text": "firms in a cartel", "start": 0.0, "duration": 4.0},
+        {"text": "prices rise", "start": 4.0, "duration": 2.0},
+    ]
+
+
+def test_record_carries_content_segments_and_passages():
+    record = build_record("vid", {"segments": SEGMENTS, "title": "Cartels", "topics": ["collusion"]})
+    assert record["video_id"] == "vid"
+    assert (record["title"], record["topics"]) == ("Cartels", ["collusion"])
+    assert record["content"] == "firms in a cartel\nprices rise"
+    assert record["passages"] == [{"video_id": "vid", "start_ms": 0, "end_ms": 6000,
+                                   "text": "firms in a cartel prices rise"}]
+    assert build_record("vid", {"segments": SEGMENTS}, title="Given")["title"] == "Given"
+    assert build_record("vid", {})["title"] == "vid"
+
+
+def test_transient_errors_are_retried_and_permanent_ones_are_not(monkeypatch):
+    monkeypatch.setattr(ingest.time, "sleep", lambda seconds: None)
+    transport = FlakyTransport(failures=2)
+    assert fetch_with_retries(transport, "vid", retries=2)["segments"] == SEGMENTS
+    assert transport.calls == 3
+
+    with pytest.raises(ConnectionError):
+        fetch_with_retries(FlakyTransport(failures=5), "vid", retries=1)
+    permanent = FlakyTransport(failures=1, error=PermanentFetchError)
+    with pytest.raises(PermanentFetchError):
+        fetch_with_retries(permanent, "vid", retries=3)
+    assert permanent.calls == 1
+
+
+def test_written_records_load_back_like_video_transcripts(tmp_path):
+    store = str(tmp_path / "store")
+    record = build_record("vid", {"segments": SEGMENTS})
+    write_record(store, record)
+    write_record(store, dict(record, title="Replaced"))
+    (tmp_path / "store" / "notes.txt").write_text("ignored")
+
+    loaded = load_transcript_store(store)
+    assert list(loaded) == ["vid"]
+    assert loaded["vid"]["title"] == "Replaced"
+    assert loaded["vid"]["passages"] == record["passages"]
+    assert "video_id" not in loaded["vid"]
+    assert load_transcript_store(str(tmp_path / "missing")) == {}
+
+
+def test_ingest_stores_fixtures_and_reports_failures(tmp_path):
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    (fixtures / "listed.json").write_text(json.dumps(SEGMENTS))
+    (fixtures / "object.json").write_text(json.dumps({"segments": SEGMENTS, "title": "From fixture"}))
+    store = str(tmp_path / "store")
+
+    ingested, failed = ingest.ingest([("listed", "Given title", None), ("object", None, None), ("absent", None, None)],
+                                     FixtureTransport(str(fixtures)), store, workers=2, retries=0)
+    assert sorted(ingested) == ["listed", "object"]
+    assert list(failed) == ["absent"] and failed["absent"].startswith("PermanentFetchError")
+    loaded = load_transcript_store(store)
+    assert (loaded["listed"]["title"], loaded["object"]["title"]) == ("Given title", "From fixture")
+
+
+def test_ids_file_skips_blank_lines_and_comments(tmp_path):
+    path = tmp_path / "ids.txt"
+    path.write_text("# course\nabc Intro to cartels\n\n  def  \n")
+    assert read_ids_file(str(path)) == [("abc", "Intro to cartels", None), ("def", None, None)]
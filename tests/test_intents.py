@@ -0,0 +1,49 @@
+from intents import Automaton, IntentClassifier
+
+KNOWLEDGE_BASE = {
+    "game_theory": {"definition": "The study of strategic decisions", "keywords": ["Nash equilibrium", "payoff"]},
+    "oligopoly": {"definition": "A market dominated by a few firms", "keywords": ["kinked demand curve"]},
+}
+VIDEO_TRANSCRIPTS = {"abc123": {"title": "Cartels", "topics": ["Price Collusion"], "content": ""}}
+
+
+def matches(automaton, text):
+    return [(text[start:end], payload) for start, end, payload in automaton.scan(text)]
+
+
+def test_automaton_finds_overlapping_patterns_in_one_pass():
+    automaton = Automaton()
+    for pattern in ("he", "she", "hers"):
+        automaton.add(pattern, pattern, prefix=True)
+    automaton.build()
+    assert sorted(payload for _, payload in matches(automaton, "she hers")) == ["he", "hers", "she"]
+
+
+def test_automaton_respects_word_boundaries():
+    automaton = Automaton()
+    automaton.add("hi", "whole")
+    automaton.add("rigid", "prefix", prefix=True)
+    automaton.build()
+    assert matches(automaton, "this is high") == []
+    assert matches(automaton, "hi, rigidity") == [("hi", "whole"), ("rigid", "prefix")]
+
+
+def test_classifier_detects_intents_and_cues():
+    analysis = IntentClassifier(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS).analyze("Hey,  what is the Prisoners dilemma? Examples?")
+    assert analysis.intents == {"greeting", "definition", "example"}
+    assert analysis.cues == {"prisoner", "dilemma"}
+
+
+def test_classifier_does_not_match_intents_inside_words():
+    analysis = IntentClassifier(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS).analyze("Which firms show the highest concentration")
+    assert "greeting" not in analysis.intents
+    assert "how" not in analysis.intents
+    assert analysis.cues == {"concentration"}
+
+
+def test_classifier_counts_multi_word_topic_phrases_and_video_topics():
+    classifier = IntentClassifier(KNOWLEDGE_BASE, VIDEO_TRANSCRIPTS)
+    analysis = classifier.analyze("Is a Nash equilibrium on the kinked demand curve, or is game theory about collusion?")
+    assert analysis.topic_phrases == {"game_theory": 2, "oligopoly": 1}
+    assert analysis.video_topics == {"Price Collusion"}
+    assert "payoff" not in analysis.text
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from llm import CircuitBreaker, CircuitOpenError, LLMClient, LLMError, TransientLLMError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProvider:
+    """Answers with each queued outcome in turn: a string, or an exception to raise"""
+
+    name = "fake"
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "answer"
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def complete(self, system, prompt, timeout):
+        return self._next()
+
+    def stream(self, system, prompt, timeout):
+        answer = self._next()
+        yield from answer.split()
+
+    async def acomplete(self, system, prompt, timeout):
+        return self._next()
+
+    async def astream(self, system, prompt, timeout):
+        for word in self._next().split():
+            yield word
+
+
+def half_open_client(*outcomes, retries=0):
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.state == "half_open"
+    return LLMClient(FakeProvider(*outcomes), retries=retries, backoff=0, breaker=breaker)
+
+
+def test_breaker_opens_after_threshold_and_probe_closes_it():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow() is None
+    clock.now = 5
+    assert breaker.allow() == "half_open"
+    # Only one probe at a time
+    assert breaker.allow() is None
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_transient_errors_are_retried():
+    client = LLMClient(FakeProvider(TransientLLMError("503"), "ok"), retries=1, backoff=0)
+    assert client.complete("system", "prompt") == "ok"
+    assert client.provider.calls == 2
+
+
+def test_failed_probe_reopens_the_circuit():
+    client = half_open_client(TransientLLMError("503"))
+    with pytest.raises(TransientLLMError):
+        client.complete("system", "prompt")
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.complete("system", "prompt")
+
+
+def test_unexpected_provider_error_is_mapped_and_releases_the_probe():
+    client = half_open_client(RuntimeError("sdk bug"))
+    with pytest.raises(LLMError, match="sdk bug"):
+        client.complete("system", "prompt")
+    assert not client.breaker.probing
+    assert client.complete("system", "prompt") == "answer"
+    assert client.breaker.state == "closed"
+
+
+def test_abandoned_stream_releases_the_probe():
+    client = half_open_client("several words of answer")
+    chunks = client.stream("system", "prompt")
+    assert next(chunks) == "several"
+    chunks.close()
+    assert not client.breaker.probing
+    assert client.breaker.allow() == "half_open"
+
+
+def test_async_paths_map_unexpected_errors_and_release_the_probe():
+    client = half_open_client(RuntimeError("sdk bug"), ValueError("bad chunk"))
+
+    async def consume():
+        with pytest.raises(LLMError):
+            await client.acomplete("system", "prompt")
+        assert not client.breaker.probing
+        with pytest.raises(LLMError):
+            async for _ in client.astream("system", "prompt"):
+                pass
+        assert not client.breaker.probing
+        return [chunk async for chunk in client.astream("system", "prompt")]
+
+    assert asyncio.run(consume()) == ["answer"]
+    assert client.breaker.state == "closed"
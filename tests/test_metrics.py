@@ -0,0 +1,44 @@
+import json
+import os
+
+from metrics import MetricsRegistry, MmapValues, read_values_file
+
+
+def key(name, **labels):
+    return json.dumps([name, "", sorted(labels.items())])
+
+
+def test_samples_sum_the_files_of_every_worker(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    requests = registry.counter("requests_total", "Requests")
+    requests.inc(route="/api/chat")
+    requests.inc(2, route="/api/chat")
+    MmapValues(str(tmp_path / "metrics_99999.db")).inc(key("requests_total", route="/api/chat"), 4)
+    assert registry.samples()[("requests_total", "", (("route", "/api/chat"),))] == 7
+    assert 'requests_total{route="/api/chat"} 7' in registry.render()
+
+
+def test_values_survive_reopening_and_growth(tmp_path):
+    path = str(tmp_path / "metrics_1.db")
+    values = MmapValues(path)
+    for idx in range(40000):
+        values.inc(key("series", idx=str(idx)), 1.0)
+    assert os.path.getsize(path) > 1 << 20
+    reopened = MmapValues(path)
+    reopened.inc(key("series", idx="0"), 1.0)
+    assert dict(read_values_file(path))[key("series", idx="0")] == 2.0
+
+
+def test_a_file_caught_mid_write_is_read_up_to_its_last_whole_entry(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    registry.counter("requests_total", "Requests").inc(route="/")
+    path = tmp_path / "metrics_99999.db"
+    MmapValues(str(path)).inc(key("requests_total", route="/"), 1)
+    # A used length past the end of the file, as while another worker grows it
+    with open(path, "r+b") as f:
+        f.write((1 << 40).to_bytes(8, "little"))
+    assert registry.samples()[("requests_total", "", (("route", "/"),))] == 2
+    # Truncated to just the header and part of the first key
+    with open(path, "r+b") as f:
+        f.truncate(12)
+    assert registry.samples()[("requests_total", "", (("route", "/"),))] == 1
@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+
+import pytest
+
+import app as study_app
+from notebooks import NotebookInvalid, NotebookNotFound, NotebookStore
+
+
+def write_notebook(directory, notebook_id, topic):
+    path = directory / notebook_id
+    path.mkdir()
+    (path / "notebook.json").write_text(json.dumps({
+        "title": notebook_id.title(),
+        "knowledge_base": {topic: {"definition": f"{topic} is a topic of {notebook_id}", "keywords": [topic]}},
+        "video_transcripts": {},
+        "flashcards": [{"term": topic, "definition": f"the {topic} card"}],
+    }))
+
+
+@pytest.fixture
+def store(tmp_path):
+    write_notebook(tmp_path, "biology", "cell")
+    write_notebook(tmp_path, "chemistry", "atom")
+    return NotebookStore(str(tmp_path), capacity=1, vector_embedder="hashing")
+
+
+def test_least_recently_used_notebook_is_evicted(store):
+    assert store.ids() == ["biology", "chemistry"]
+    biology = store.get("biology")
+    assert store.get("biology") is biology
+    store.get("chemistry")
+    assert store.get("biology") is not biology
+    stats = store.stats()
+    assert (stats["hits"], stats["loads"], stats["evictions"]) == (1, 3, 2)
+    assert stats["resident"] == ["biology"]
+
+
+def test_unknown_and_unsafe_ids_are_not_found(store):
+    for notebook_id in ("physics", "../biology", "Biology"):
+        with pytest.raises(NotebookNotFound):
+            store.get(notebook_id)
+
+
+@pytest.mark.parametrize("content", ['{"title": "Broken"', '["not", "an", "object"]'])
+def test_malformed_notebook_is_a_json_500(store, tmp_path, monkeypatch, content):
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "notebook.json").write_text(content)
+    with pytest.raises(NotebookInvalid):
+        store.get("broken")
+
+    monkeypatch.setattr(study_app, "NOTEBOOKS", store)
+    response = study_app.app.test_client().get("/api/notebooks/broken/topics")
+    assert response.status_code == 500
+    assert response.get_json() == {"error": study_app.NOTEBOOK_INVALID_MESSAGE}
+
+
+def test_concurrent_first_uses_embed_the_notebook_once(store):
+    notebook = store.get("biology")
+    builds = []
+    build = notebook.load_vectors
+
+    def slow_build():
+        builds.append(1)
+        time.sleep(0.05)
+        return build()
+
+    notebook.load_vectors = slow_build
+    threads = [threading.Thread(target=lambda: notebook.vectors) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert notebook.vectors.search("cell", ["topic"], k=1)[0][0] == "topic:cell"
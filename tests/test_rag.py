@@ -0,0 +1,25 @@
+from rag import Source, citations, pack_context
+
+
+def sources():
+    return [Source.from_topic("collusion", {"definition": "Firms agree to fix prices.", "keywords": ["cartel"]}),
+            Source("video", "abc123", "Cartels", "OPEC restricts output.", 65000, 90000)]
+
+
+def test_citations_keep_only_cited_sources():
+    cited = citations("Cartels restrict output [2].", sources())
+    assert [citation["id"] for citation in cited] == [2]
+    assert cited[0]["url"] == "https://www.youtube.com/watch?v=abc123&t=65s"
+    assert cited[0]["timestamp"] == "1:05"
+
+
+def test_topic_citations_link_under_the_answering_notebook():
+    assert citations("[1]", sources())[0]["url"] == "/api/topic/collusion"
+    assert citations("[1]", sources(), "/api/notebooks/biology")[0]["url"] == "/api/notebooks/biology/topic/collusion"
+
+
+def test_pack_context_truncates_the_first_source_that_does_not_fit():
+    long_source = Source("topic", "long", "Long", "word " * 400)
+    packed = pack_context([sources()[0], long_source, sources()[1]], 100)
+    assert [source.ref for source in packed] == ["collusion", "long"]
+    assert packed[1].text.endswith("…")
@@ -0,0 +1,92 @@
+from difflib import SequenceMatcher
+
+import numpy as np
+import pytest
+
+from corpus import NormalizedCorpus
+from retrieval import BM25Index, NgramIndex, build_topic_index, char_ngrams
+
+DEFINITIONS = [
+    "A market structure dominated by a small number of large firms",
+    "A market with a single seller and no close substitutes",
+    "A strategic situation where two players each choose to cooperate or defect",
+    "Many firms sell identical products and none can set the price",
+]
+
+
+def test_char_ngrams_are_padded_and_whitespace_collapsed():
+    assert char_ngrams("ab  c") == {" ab", "ab ", "b c", " c "}
+
+
+@pytest.mark.parametrize("query", ["a market with one seller", "players choosing to cooperate", "identical products"])
+def test_ngram_similarity_ranks_like_sequence_matcher(query):
+    index = NgramIndex(DEFINITIONS)
+    similarity = index.similarity(query)
+    exact = [SequenceMatcher(None, query.lower(), text.lower()).ratio() for text in DEFINITIONS]
+    assert int(np.argmax(similarity)) == int(np.argmax(exact))
+    assert np.all((similarity >= 0) & (similarity <= 1))
+
+
+def test_ngram_similarity_of_identical_text_is_one():
+    index = NgramIndex(DEFINITIONS)
+    assert index.similarity(DEFINITIONS[1].upper())[1] == pytest.approx(1.0)
+    assert index.exact_similarity(DEFINITIONS[1].upper(), 1) == pytest.approx(1.0)
+
+
+def test_ngram_index_survives_a_state_round_trip():
+    index = NgramIndex(DEFINITIONS)
+    restored = NgramIndex.from_state(*index.state())
+    assert np.array_equal(restored.similarity("single seller"), index.similarity("single seller"))
+    assert restored.texts[2] == DEFINITIONS[2].lower()
+
+
+def test_unknown_ngrams_score_zero():
+    assert not NgramIndex(DEFINITIONS).similarity("zzqx").any()
+
+
+def test_bm25_title_field_outranks_prose():
+    index = BM25Index(["prose", "titled"], [
+        {"title": ["market"], "body": ["oligopoly"]},
+        {"title": ["oligopoly"], "body": ["market"]},
+    ], {"title": 3.0, "body": 1.0})
+    scores = index.score(["oligopoly"])
+    assert [index.doc_keys[doc_idx] for doc_idx, _ in index.top_k(scores, 2)] == ["titled", "prose"]
+
+
+def test_bm25_top_k_drops_non_matching_documents_and_breaks_ties_by_position():
+    index = BM25Index(range(3), [{"body": ["cartel"]}, {"body": ["price"]}, {"body": ["cartel"]}], {"body": 1.0})
+    assert [doc_idx for doc_idx, _ in index.top_k(index.score(["cartel"]), 5)] == [0, 2]
+    assert index.top_k(index.score(["unknown"]), 5) == []
+
+
+def test_topic_index_finds_topic_by_keyword_and_round_trips():
+    corpus = NormalizedCorpus({
+        "oligopoly": {"definition": "A market dominated by a few firms", "keywords": ["few sellers", "cartel"]},
+        "monopoly": {"definition": "A market with a single seller", "keywords": ["single seller"]},
+    }, {})
+    index = build_topic_index(corpus.topics)
+    restored = BM25Index.from_state(*index.state())
+    for candidate in (index, restored):
+        best, _ = candidate.top_k(candidate.score(["cartel"]), 1)[0]
+        assert candidate.doc_keys[best] == "oligopoly"
+
+
+def test_batch_scores_match_scoring_each_query_alone():
+    corpus = NormalizedCorpus({
+        "oligopoly": {"definition": "A market dominated by a few firms", "keywords": ["few sellers", "cartel"]},
+        "monopoly": {"definition": "A market with a single seller", "keywords": ["single seller"]},
+    }, {})
+    index = build_topic_index(corpus.topics)
+    queries = [["cartel", "market"], [], ["unknown"], ["seller", "seller", "market"]]
+    batch = index.score_many(queries)
+    assert batch.shape == (len(queries), len(index))
+    for row, query_terms in enumerate(queries):
+        assert np.array_equal(batch[row], index.score(query_terms))
+
+
+def test_batch_similarity_matches_each_query_alone():
+    index = NgramIndex(DEFINITIONS)
+    queries = ["a market with one seller", "", "zzqx", "identical products"]
+    batch = index.similarity_many(queries)
+    for row, query in enumerate(queries):
+        assert np.array_equal(batch[row], index.similarity(query))
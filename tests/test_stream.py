@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+
+import pytest
+
+import app as study_app
+from llm import LLMClient
+
+
+def parse_events(body):
+    """[(event, data)] of an SSE body, after its opening comment"""
+    opening, *blocks = body.split("\n\n")
+    assert opening == ": stream open"
+    assert blocks[-1] == ""
+    events = []
+    for block in blocks[:-1]:
+        event_line, data_line = block.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+class GatedProvider:
+    """Streams its answer word by word, holding the rest back until released"""
+
+    name = "gated"
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+        self.released = threading.Event()
+
+    def stream(self, system, prompt, timeout):
+        self.calls += 1
+        first, *rest = self.answer.split(" ")
+        yield first
+        assert self.released.wait(5)
+        for word in rest:
+            yield f" {word}"
+
+
+@pytest.fixture
+def client():
+    study_app.RESPONSE_CACHE.clear()
+    return study_app.app.test_client()
+
+
+def test_events_are_framed_and_end_with_done(client):
+    response = client.post("/api/chat/stream", json={"message": "What is a Nash equilibrium?"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = parse_events(response.get_data(as_text=True))
+    assert [event for event, _ in events[:-1]] == ["chunk"] * (len(events) - 1)
+    assert events[-1] == ("done", {"citations": []})
+    streamed = "".join(data["text"] for _, data in events[:-1])
+    assert streamed == client.post("/api/chat", json={"message": "What is a Nash equilibrium?"}).get_json()["response"]
+
+
+def test_missing_message_is_a_400(client):
+    assert client.post("/api/chat/stream", json={}).status_code == 400
+
+
+def test_failure_mid_stream_ends_with_a_generic_error_event(client, monkeypatch):
+    def failing_events(query, video_id=None):
+        yield "chunk", {"text": "Partial"}
+        raise RuntimeError("secret backend detail")
+
+    monkeypatch.setattr(study_app, "answer_events", failing_events)
+    body = client.post("/api/chat/stream", json={"message": "What is an oligopoly?"}).get_data(as_text=True)
+    events = parse_events(body)
+    assert events == [("chunk", {"text": "Partial"}), ("error", {"error": study_app.STREAM_ERROR_MESSAGE})]
+    assert "secret" not in body
+
+
+def test_concurrent_identical_streams_share_one_llm_call(client, monkeypatch):
+    provider = GatedProvider("Firms in an oligopoly watch each other")
+    monkeypatch.setattr(study_app, "LLM", LLMClient(provider, retries=0))
+    bodies = []
+
+    def stream():
+        bodies.append(study_app.app.test_client().post(
+            "/api/chat/stream", json={"message": "Why do oligopolies watch rivals?"}).get_data(as_text=True))
+
+    leader = threading.Thread(target=stream)
+    leader.start()
+    while study_app.STREAM_FLIGHT.in_flight() == 0:
+        time.sleep(0.001)
+    follower = threading.Thread(target=stream)
+    follower.start()
+    time.sleep(0.05)
+    provider.released.set()
+    leader.join()
+    follower.join()
+
+    assert provider.calls == 1
+    assert bodies[0] == bodies[1]
+    events = parse_events(bodies[0])
+    assert "".join(data["text"] for event, data in events if event == "chunk") == provider.answer
+    assert events[-1][0] == "done"
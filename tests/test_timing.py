@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+import app as study_app
+from timing import LatencyHistogram, RequestTimer, StageMetrics, activate, deactivate, stage
+
+
+def test_percentiles_interpolate_within_buckets_and_stay_below_the_max():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(float(ms))
+    summary = histogram.summary()
+    assert summary["count"] == 100 and summary["mean_ms"] == 50.5 and summary["max_ms"] == 100.0
+    # Buckets are 25% wide, so estimates land within a bucket of the true value
+    assert 40 <= summary["p50_ms"] <= 62.5
+    assert 76 <= summary["p95_ms"] <= summary["p99_ms"] <= 100
+    assert LatencyHistogram().summary()["p99_ms"] == 0.0
+
+
+def test_stages_record_only_into_the_active_timer():
+    with stage("ignored"):
+        pass
+    timer = activate(RequestTimer())
+    try:
+        with stage("parse"):
+            with stage("intent"):
+                pass
+    finally:
+        deactivate()
+    with stage("after"):
+        pass
+    spans = timer.finish()
+    assert [name for name, _ in spans] == ["intent", "parse", "total"]
+    assert all(ms >= 0 for _, ms in spans)
+    assert timer.server_timing().startswith("intent;dur=")
+
+
+def test_concurrent_tasks_keep_their_own_timers():
+    async def request(name):
+        timer = activate(RequestTimer())
+        with stage(name):
+            await asyncio.sleep(0.01)
+        return timer.spans
+
+    async def main():
+        return await asyncio.gather(request("first"), request("second"))
+
+    assert [[name for name, _ in spans] for spans in asyncio.run(main())] == [["first"], ["second"]]
+
+
+def test_stage_metrics_group_by_endpoint_and_stage():
+    metrics = StageMetrics()
+    metrics.record("chat", [("parse", 1.0), ("total", 3.0)])
+    metrics.record("chat", [("parse", 2.0), ("total", 5.0)])
+    metrics.record("ask_video_question", [("total", 4.0)])
+    summary = metrics.summary()
+    assert list(summary) == ["ask_video_question", "chat"]
+    assert summary["chat"]["parse"]["count"] == 2 and summary["chat"]["total"]["max_ms"] == 5.0
+    metrics.reset()
+    assert metrics.summary() == {}
+
+
+@pytest.fixture
+def client():
+    study_app.STAGE_METRICS.reset()
+    study_app.RESPONSE_CACHE.clear()
+    return study_app.app.test_client()
+
+
+def test_chat_stages_are_served_and_echoed_on_request(client):
+    plain = client.post("/api/chat", json={"message": "What is a cartel?"})
+    assert "Server-Timing" not in plain.headers
+    timed = client.post("/api/chat", json={"message": "What is a monopoly?"}, headers={"X-Debug-Timing": "1"})
+    assert "total;dur=" in timed.headers["Server-Timing"]
+    client.get("/api/topics")
+
+    stages = client.get("/api/metrics/stages").get_json()["stages"]
+    assert list(stages) == ["chat"]
+    assert {"parse", "intent", "find_relevant_topics", "assembly", "total"} <= set(stages["chat"])
+    assert "find_video_content" not in stages["chat"]
+    assert stages["chat"]["total"]["count"] == 2
@@ -0,0 +1,63 @@
+import numpy as np
+
+import vector_index
+from vector_index import VectorIndex, VectorStore
+
+ITEMS = {
+    "topic": [("topic:collusion", "collusion firms agree to fix prices like a cartel"),
+              ("topic:game_theory", "game theory studies strategic decisions between players")],
+    "flashcard": [("flashcard:0", "cartel a formal agreement among firms to restrict output"),
+                  ("flashcard:1", "payoff matrix lists the outcome of each strategy pair")],
+}
+
+
+def test_search_finds_the_item_sharing_the_most_meaning():
+    store = VectorStore.build(ITEMS, "hashing")
+    key, _ = store.search("cartel agreement between firms", ["flashcard"], k=1)[0]
+    assert key == "flashcard:0"
+
+
+def test_saved_and_shared_stores_search_like_the_original(tmp_path):
+    store = VectorStore.build(ITEMS, "lsa")
+    path = str(tmp_path / "vectors.snapshot")
+    store.save(path, "fingerprint")
+    assert VectorStore.load(path, "other") is None
+    expected = store.search("strategic players", k=4)
+    for copy in (VectorStore.load(path, "fingerprint"), store.share()):
+        assert [key for key, _ in copy.search("strategic players", k=4)] == [key for key, _ in expected]
+        assert not copy.vectors.flags.writeable
+
+
+def test_keys_are_found_through_the_shared_key_order(tmp_path):
+    store = VectorStore.build(ITEMS, "hashing")
+    path = str(tmp_path / "vectors.snapshot")
+    store.save(path, "fingerprint")
+    for copy in (store, store.share(), VectorStore.load(path, "fingerprint")):
+        assert [copy.keys[copy.row(key)] for key, _ in ITEMS["flashcard"]] == ["flashcard:0", "flashcard:1"]
+        assert copy.row("flashcard:9") is None and copy.row("") is None
+        assert not hasattr(copy, "rows")
+    matches = store.search_among("cartel agreement", ["flashcard:1", "flashcard:0", "flashcard:9"], k=5)
+    assert [key for key, _ in matches] == ["flashcard:0", "flashcard:1"]
+
+
+def test_ivf_search_matches_exact_search_for_probed_lists():
+    vectors = np.random.default_rng(0).standard_normal((400, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index, order = VectorIndex.build(vectors, lists=4, nprobe=4)
+    row, score = index.search(vectors[order[7]], k=1)[0]
+    assert row == 7 and abs(score - 1.0) < 1e-5
+
+
+def test_query_terms_do_not_grow_the_feature_cache_without_bound(monkeypatch):
+    monkeypatch.setattr(vector_index, "TERM_FEATURE_CACHE_SIZE", 8)
+    embedder = vector_index.HashingEmbedder(dim=64)
+    embedder.embed([f"term{idx}" for idx in range(100)])
+    assert embedder._features.cache_info().currsize == 8
+
+
+def test_search_with_only_empty_probed_lists_returns_nothing():
+    vectors = np.eye(4, dtype=np.float32)
+    centroids = np.eye(4, dtype=np.float32)
+    # Every row sits in list 3, which the single probe never reaches for this query
+    index = VectorIndex(vectors, centroids, np.array([0, 0, 0, 0, 4]), nprobe=1)
+    assert index.search(np.array([1, 0, 0, 0], dtype=np.float32)) == []
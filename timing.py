@@ -0,0 +1,132 @@
+"""
+Per-stage latency instrumentation for the chat pipeline
+A request activates a RequestTimer; stage() spans anywhere below it record
+into that timer, and finished requests feed process-wide histograms
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in milliseconds, 25% apart from 10us to about 80s
+BUCKET_BOUNDS_MS = tuple(0.01 * 1.25 ** i for i in range(72))
+
+_active_timer = contextvars.ContextVar("active_timer", default=None)
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets, so recording is O(log buckets) and memory is constant"""
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, q):
+        """Estimate the q-th percentile (0-100) by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[bucket - 1] if bucket else 0.0
+                upper = self.bounds[bucket] if bucket < len(self.bounds) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(estimate, self.max)
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 4),
+            "p95_ms": round(self.percentile(95), 4),
+            "p99_ms": round(self.percentile(99), 4),
+            "max_ms": round(self.max, 4),
+        }
+
+
+class StageMetrics:
+    """Thread-safe histograms keyed on (endpoint, stage)"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, spans):
+        with self.lock:
+            for stage_name, ms in spans:
+                histogram = self.histograms.get((endpoint, stage_name))
+                if histogram is None:
+                    histogram = self.histograms[(endpoint, stage_name)] = LatencyHistogram()
+                histogram.record(ms)
+
+    def summary(self):
+        """{endpoint: {stage: count/mean/p50/p95/p99/max}}"""
+        with self.lock:
+            result = {}
+            for (endpoint, stage_name), histogram in sorted(self.histograms.items()):
+                result.setdefault(endpoint, {})[stage_name] = histogram.summary()
+            return result
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+
+class RequestTimer:
+    """Spans recorded while handling one request, in completion order"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, (time.perf_counter() - started) * 1000))
+
+    def finish(self):
+        """Close the request with a 'total' span covering everything since it started"""
+        self.spans.append(("total", (time.perf_counter() - self.started) * 1000))
+        return self.spans
+
+    def server_timing(self):
+        """Spans formatted as a Server-Timing header, which browser dev tools display"""
+        return ", ".join(f"{name};dur={ms:.3f}" for name, ms in self.spans)
+
+
+def activate(timer):
+    """Make timer the one stage() records into for the current thread or task"""
+    _active_timer.set(timer)
+    return timer
+
+
+def deactivate():
+    _active_timer.set(None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block into the active request timer; a no-op outside timed requests"""
+    timer = _active_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
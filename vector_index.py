@@ -0,0 +1,459 @@
+"""
+Dense vector index over the study material
+Topics, flashcards, quiz questions and transcript passages are embedded into
+one contiguous float32 matrix and searched by cosine similarity: exactly for
+small corpora, through an inverted-file (IVF) index once a kind has many rows.
+Stores are saved in the index_snapshot container and memory-mapped on load
+
+Usage:
+    python vector_index.py                    # writes data/vectors.snapshot
+    python vector_index.py --query "why don't firms just agree on prices"
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import math
+import os
+import sys
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from index_snapshot import BASE_DIR, read_snapshot, share_arrays, write_snapshot
+from retrieval import TextTable, index_terms
+
+DEFAULT_VECTOR_SNAPSHOT = os.path.join(BASE_DIR, "data", "vectors.snapshot")
+
+# Kinds of item in a store, in row order
+KINDS = ("topic", "flashcard", "quiz", "passage")
+
+# A kind with at least this many rows gets an IVF index; smaller ones are searched exactly
+IVF_MIN_ROWS = 4096
+
+# Texts embedded per batch, bounding the dense hashed matrix held at once
+EMBED_BATCH = 2048
+
+# Terms whose hashed features each embedder keeps; queries bring new terms forever, so this is bounded
+TERM_FEATURE_CACHE_SIZE = 65536
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# =============================================================================
+# EMBEDDERS
+# =============================================================================
+
+class HashingEmbedder:
+    """Signed feature hashing of words and their character trigrams, weighted by IDF
+
+    Trigrams let inflections share features ("agree" / "agreement"), and
+    hashing keeps the dimension fixed however large the vocabulary grows.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim=2048, idf=None):
+        self.dim = dim
+        self.idf = idf if idf is not None else np.ones(dim, dtype=np.float32)
+        # term -> (buckets, signed weights), for the most recently seen terms
+        self._features = lru_cache(maxsize=TERM_FEATURE_CACHE_SIZE)(self.term_features)
+
+    def term_features(self, term):
+        """(buckets, signed weights) of the word and its trigrams"""
+        padded = f"<{term}>"
+        names = [term] + [padded[start:start + 3] for start in range(len(padded) - 2)]
+        digests = [zlib.crc32(name.encode("utf-8")) for name in names]
+        # Trigrams count half as much as the whole word
+        weights = [1.0] + [0.5] * (len(names) - 1)
+        return (
+            np.array([digest % self.dim for digest in digests], dtype=np.int64),
+            np.array([weight if digest & 0x80000000 else -weight for digest, weight in zip(digests, weights)],
+                     dtype=np.float32),
+        )
+
+    def hashed(self, texts):
+        """Unweighted hashed rows of texts, with sublinear term frequency"""
+        lengths, columns, values = [], [], []
+        for text in texts:
+            length = 0
+            for term, tf in Counter(index_terms(text)).items():
+                buckets, signed = self._features(term)
+                columns.append(buckets)
+                values.append(signed if tf == 1 else signed * (1 + math.log(tf)))
+                length += len(buckets)
+            lengths.append(length)
+        if not columns:
+            return np.zeros((len(texts), self.dim), dtype=np.float32)
+        # One bincount over flat (row, bucket) cells sums colliding features
+        cells = np.repeat(np.arange(len(texts)) * self.dim, lengths) + np.concatenate(columns)
+        flat = np.bincount(cells, weights=np.concatenate(values), minlength=len(texts) * self.dim)
+        return flat.astype(np.float32).reshape(len(texts), self.dim)
+
+    def fit(self, texts):
+        """Learn per-bucket IDF from a corpus"""
+        texts = list(texts)
+        document_frequency = np.zeros(self.dim, dtype=np.float64)
+        for start in range(0, len(texts), EMBED_BATCH):
+            document_frequency += (self.hashed(texts[start:start + EMBED_BATCH]) != 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+
+    def embed(self, texts):
+        """Unit float32 rows, one per text"""
+        return _normalize_rows(self.hashed(texts) * self.idf)
+
+    def state(self):
+        return {"idf": self.idf}, {"dim": self.dim}
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        return cls(meta["dim"], arrays["idf"])
+
+
+def top_singular_directions(matrix, count, seed=0, power_iterations=4):
+    """The `count` leading right singular vectors of matrix, as rows
+
+    Small matrices get an exact SVD; larger ones a randomized range finder
+    (Halko et al.), which only decomposes a (count + 16)-column sketch.
+    """
+    if min(matrix.shape) <= 4 * count:
+        return np.linalg.svd(matrix, full_matrices=False)[2][:count]
+    sketch = matrix @ np.random.default_rng(seed).standard_normal((matrix.shape[1], count + 16)).astype(np.float32)
+    for _ in range(power_iterations):
+        sketch = matrix @ (matrix.T @ np.linalg.qr(sketch)[0])
+    basis = np.linalg.qr(sketch)[0]
+    return np.linalg.svd(basis.T @ matrix, full_matrices=False)[2][:count]
+
+
+class LsaEmbedder:
+    """Latent semantic analysis: hashed TF-IDF projected onto the corpus's top singular directions
+
+    Words that occur in the same documents end up on shared directions, so a
+    question can land near a topic it shares few words with.
+    """
+
+    name = "lsa"
+
+    # Rows used to find the singular directions; the rest of the corpus is only projected
+    FIT_SAMPLE = 8000
+
+    def __init__(self, base, projection):
+        self.base = base
+        self.projection = projection
+        self.dim = projection.shape[0]
+
+    @classmethod
+    def fit(cls, texts, dim=None, base_dim=2048, seed=0):
+        """Fit on a corpus; dim defaults to a quarter of its size, between 8 and 128"""
+        texts = list(texts)
+        # Too many directions on a small corpus just reproduce its words and lose the generalization
+        dim = dim or min(128, max(8, len(texts) // 4))
+        base = HashingEmbedder(base_dim).fit(texts)
+        if len(texts) > cls.FIT_SAMPLE:
+            sample = np.random.default_rng(seed).choice(len(texts), cls.FIT_SAMPLE, replace=False)
+            texts = [texts[idx] for idx in sample]
+        return cls(base, np.ascontiguousarray(top_singular_directions(base.embed(texts), dim, seed), dtype=np.float32))
+
+    def embed(self, texts):
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), EMBED_BATCH):
+            matrix[start:start + EMBED_BATCH] = self.base.embed(texts[start:start + EMBED_BATCH]) @ self.projection.T
+        return _normalize_rows(matrix)
+
+    def state(self):
+        return {"idf": self.base.idf, "projection": self.projection}, {"base_dim": self.base.dim}
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        return cls(HashingEmbedder(meta["base_dim"], arrays["idf"]), arrays["projection"])
+
+
+class SentenceTransformerEmbedder:
+    """A local sentence-transformers model (optional dependency)"""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    @classmethod
+    def fit(cls, texts, model_name="all-MiniLM-L6-v2"):
+        return cls(model_name)
+
+    def embed(self, texts):
+        return np.asarray(self.model.encode(list(texts), normalize_embeddings=True), dtype=np.float32)
+
+    def state(self):
+        return {}, {"model_name": self.model_name}
+
+    @classmethod
+    def from_state(cls, arrays, meta):
+        return cls(meta["model_name"])
+
+
+EMBEDDERS = {cls.name: cls for cls in (HashingEmbedder, LsaEmbedder, SentenceTransformerEmbedder)}
+
+
+def fit_embedder(spec, texts):
+    """Fit the embedder named by spec: "lsa", "hashing" or "sentence-transformers[:model]" """
+    name, _, option = spec.partition(":")
+    if name == "lsa":
+        return LsaEmbedder.fit(texts)
+    if name == "hashing":
+        return HashingEmbedder().fit(texts)
+    if name == "sentence-transformers":
+        return SentenceTransformerEmbedder.fit(texts, *([option] if option else []))
+    raise ValueError(f"Unknown embedder {spec!r}")
+
+
+# =============================================================================
+# INDEXES
+# =============================================================================
+
+def spherical_kmeans(vectors, lists, iterations=10, seed=0, sample=None):
+    """Unit centroids of `lists` clusters, trained on up to `sample` rows"""
+    rng = np.random.default_rng(seed)
+    sample = sample or lists * 64
+    training = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+    centroids = training[rng.choice(len(training), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(training @ centroids.T, axis=1)
+        for cluster in range(lists):
+            members = training[assignment == cluster]
+            # An empty cluster restarts from a random training row
+            centroids[cluster] = members.sum(axis=0) if len(members) else training[rng.integers(len(training))]
+        centroids = _normalize_rows(centroids)
+    return centroids.astype(np.float32)
+
+
+class VectorIndex:
+    """Unit vectors searched by inner product, exactly or through an IVF index
+
+    With centroids, the rows are grouped by nearest centroid (list i holds
+    rows list_offsets[i]:list_offsets[i + 1]) and a search scans only the
+    nprobe lists whose centroids are closest to the query.
+    """
+
+    def __init__(self, vectors, centroids=None, list_offsets=None, nprobe=8):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, lists=None, nprobe=None):
+        """(index, row order): rows must be stored in the returned order for the index to use them"""
+        order = np.arange(len(vectors))
+        if lists is None:
+            lists = int(np.sqrt(len(vectors))) if len(vectors) >= IVF_MIN_ROWS else 0
+        if not lists:
+            return cls(vectors), order
+
+        centroids = spherical_kmeans(vectors, lists)
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=lists))
+        return cls(vectors[order], centroids, list_offsets, nprobe or max(8, lists // 8)), order
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def exact(self):
+        return self.centroids is None
+
+    def search(self, query, k=10):
+        """(row, score) pairs of the k best rows, best first"""
+        if not len(self.vectors):
+            return []
+        if self.exact:
+            rows = None
+            scores = self.vectors @ query
+        else:
+            nearest = np.argsort(self.centroids @ query)[::-1][:self.nprobe]
+            rows = np.concatenate([np.arange(self.list_offsets[idx], self.list_offsets[idx + 1]) for idx in nearest])
+            scores = self.vectors[rows] @ query
+        k = min(k, len(scores))
+        # Every probed list can be empty
+        if not k:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(rows[idx] if rows is not None else idx), float(scores[idx])) for idx in best]
+
+
+class VectorStore:
+    """Embedded study items of every kind in one matrix, with a VectorIndex per kind
+
+    Rows are grouped by kind (segments maps kind -> [start, end)), so each
+    kind's index searches a view of the shared matrix. Items are named by
+    keys such as "topic:collusion" or "passage:42"; key_order lists the rows
+    in key order, so a key's row is found by binary search over shared
+    arrays rather than through a per-process dict.
+    """
+
+    def __init__(self, embedder, vectors, keys, segments, indexes, key_order=None):
+        self.embedder = embedder
+        self.vectors = vectors
+        self.keys = keys
+        self.segments = segments
+        self.indexes = indexes
+        if key_order is None:
+            key_order = np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int64)
+        self.key_order = key_order
+
+    @classmethod
+    def build(cls, items, embedder_spec="lsa"):
+        """Embed items, a {kind: [(key, text), ...]} mapping"""
+        kinds = [kind for kind in KINDS if items.get(kind)]
+        embedder = fit_embedder(embedder_spec, [text for kind in kinds for _, text in items[kind]])
+        blocks, keys, segments, indexes = [], [], {}, {}
+        start = 0
+        for kind in kinds:
+            vectors = embedder.embed([text for _, text in items[kind]])
+            index, order = VectorIndex.build(vectors)
+            blocks.append(index.vectors)
+            keys.extend(items[kind][idx][0] for idx in order)
+            segments[kind] = (start, start + len(order))
+            indexes[kind] = index
+            start += len(order)
+
+        vectors = np.concatenate(blocks) if blocks else np.zeros((0, embedder.dim), dtype=np.float32)
+        # Re-point every index at its slice of the one shared matrix
+        for kind, (begin, end) in segments.items():
+            indexes[kind].vectors = vectors[begin:end]
+        return cls(embedder, vectors, TextTable.from_strings(keys), segments, indexes)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def embed_query(self, text):
+        return self.embedder.embed([text])[0]
+
+    def search(self, text, kinds=KINDS, k=10):
+        """(key, score) of the k items most similar to text among the given kinds, best first"""
+        query = self.embed_query(text)
+        results = []
+        for kind in kinds:
+            if kind in self.indexes:
+                begin = self.segments[kind][0]
+                results.extend((self.keys[begin + row], score) for row, score in self.indexes[kind].search(query, k))
+        results.sort(key=lambda item: -item[1])
+        return results[:k]
+
+    def row(self, key):
+        """Row of a key, or None when the store has no such item"""
+        pos = bisect.bisect_left(self.key_order, key, key=self.keys.__getitem__)
+        if pos < len(self.key_order) and self.keys[self.key_order[pos]] == key:
+            return int(self.key_order[pos])
+        return None
+
+    def search_among(self, text, keys, k=10):
+        """(key, score) of the k items most similar to text among the given keys, by exact scan"""
+        rows = np.array([row for row in map(self.row, keys) if row is not None], dtype=np.int64)
+        if not len(rows):
+            return []
+        scores = self.vectors[rows] @ self.embed_query(text)
+        k = min(k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.keys[rows[idx]], float(scores[idx])) for idx in best]
+
+    def state(self):
+        """Arrays and JSON metadata that fully describe the store"""
+        embedder_arrays, embedder_meta = self.embedder.state()
+        arrays = {"vectors": self.vectors, "key_buffer": self.keys.buffer, "key_offsets": self.keys.offsets,
+                  "key_order": self.key_order}
+        arrays.update({f"embedder/{name}": array for name, array in embedder_arrays.items()})
+        indexes = {}
+        for kind, index in self.indexes.items():
+            indexes[kind] = {"nprobe": index.nprobe}
+            if not index.exact:
+                arrays[f"{kind}/centroids"] = index.centroids
+                arrays[f"{kind}/list_offsets"] = index.list_offsets
+        return arrays, {
+            "embedder": {"name": self.embedder.name, **embedder_meta},
+            "segments": self.segments,
+            "indexes": indexes,
+        }
+
+    @classmethod
+    def from_state(cls, arrays, meta, embedder=None):
+        """A store over the given arrays; embedder, when given, is used instead of one rebuilt from them"""
+        if embedder is None:
+            embedder_arrays = {name[len("embedder/"):]: array for name, array in arrays.items() if name.startswith("embedder/")}
+            embedder = EMBEDDERS[meta["embedder"]["name"]].from_state(embedder_arrays, meta["embedder"])
+        vectors = arrays["vectors"]
+        segments = {kind: tuple(bounds) for kind, bounds in meta["segments"].items()}
+        indexes = {kind: VectorIndex(vectors[begin:end], arrays.get(f"{kind}/centroids"),
+                                     arrays.get(f"{kind}/list_offsets"), meta["indexes"][kind]["nprobe"])
+                   for kind, (begin, end) in segments.items()}
+        return cls(embedder, vectors, TextTable(arrays["key_buffer"], arrays["key_offsets"]), segments, indexes,
+                   arrays.get("key_order"))
+
+    def share(self):
+        """The same store over one read-only shared mapping, for a preloading server to fork"""
+        arrays, meta = self.state()
+        # A model-backed embedder has no arrays to share and is not worth loading twice
+        embedder = None if any(name.startswith("embedder/") for name in arrays) else self.embedder
+        return self.from_state(share_arrays(arrays), meta, embedder)
+
+    def save(self, path, fingerprint):
+        arrays, meta = self.state()
+        write_snapshot(path, arrays, {"fingerprint": fingerprint, **meta})
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        """Memory-map a saved store; returns None when it was built from different content"""
+        arrays, meta = read_snapshot(path)
+        if fingerprint is not None and meta["fingerprint"] != fingerprint:
+            return None
+        return cls.from_state(arrays, meta)
+
+
+def vector_fingerprint(source_fingerprint, flashcards, quiz_questions, embedder_spec):
+    """Content fingerprint of a vector store: the search content plus flashcards, quiz and embedder"""
+    digest = hashlib.sha256(source_fingerprint.encode("utf-8"))
+    digest.update(json.dumps([flashcards, quiz_questions, embedder_spec], sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the vector index snapshot")
+    parser.add_argument("--output", default=os.environ.get("VECTOR_SNAPSHOT") or DEFAULT_VECTOR_SNAPSHOT,
+                        help="snapshot path (default: %(default)s)")
+    parser.add_argument("--query", help="print the nearest items to this question instead of writing")
+    args = parser.parse_args(argv)
+
+    # Make the app embed its content from source instead of loading a snapshot
+    os.environ["VECTOR_SNAPSHOT"] = ""
+    import app
+
+    if args.query:
+        for key, score in app.DEFAULT_NOTEBOOK.vectors.search(args.query, k=10):
+            print(f"{score:.3f}  {key}")
+        return 0
+
+    vectors = app.DEFAULT_NOTEBOOK.vectors
+    vectors.save(args.output, app.VECTOR_FINGERPRINT)
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"✅ Wrote {args.output} ({size_mb:.1f} MB, {len(vectors)} items, "
+          f"{vectors.embedder.name} embeddings of dimension {vectors.embedder.dim})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())